@@ -0,0 +1,107 @@
+"""
+Measures download throughput against a local HTTP server serving byte
+ranges from memory, so the cost of writing the parts to the disk dominates.
+
+Compares the part writer the downloads used before (the target file opened
+for every part, seek and a write for every 32 KB chunk) with the shared
+FileWriter using positional writes of the configured buffer size.
+
+Usage:
+    PYTHONPATH=. python benchmarks/download_writer.py [size in MB]
+"""
+import os
+import re
+import sys
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sevenbridges import Api
+from sevenbridges.models.enums import PartSize
+from sevenbridges.transfer import download
+from sevenbridges.transfer.download import Download
+from sevenbridges.transfer.utils import FixedPartSize, Part
+
+
+def serve(content):
+    class RangeHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            match = re.match(
+                r'bytes=(\d+)-(\d+)', self.headers.get('Range', '')
+            )
+            start, end = 0, len(content) - 1
+            if match:
+                start, end = int(match.group(1)), int(match.group(2))
+            self.send_response(206 if match else 200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            try:
+                self.wfile.write(memoryview(content)[start:end + 1])
+            except ConnectionError:
+                # Size probes close the connection without reading the body
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def per_part_open(writer, session, url, timeout, start_byte, end_byte,
+                  buffer_size):
+    fp = os.open(writer.path, os.O_CREAT | os.O_WRONLY)
+    response = session.get(
+        url=url, headers={'Range': f'bytes={start_byte}-{end_byte}'},
+        timeout=timeout, stream=True
+    )
+    part_size = response.headers.get('Content-Length')
+    os.lseek(fp, start_byte, os.SEEK_SET)
+    for chunk in response.iter_content(32 * PartSize.KB):
+        os.write(fp, chunk)
+    os.close(fp)
+    return Part(start=start_byte, size=float(part_size))
+
+
+def measure(api, url, directory, buffer_size):
+    path = os.path.join(directory, f'file_{buffer_size}.bin')
+    started = time.perf_counter()
+    Download(
+        url=url, file_path=path, api=api, buffer_size=buffer_size,
+        part_size=FixedPartSize(16 * PartSize.MB)
+    ).run()
+    elapsed = time.perf_counter() - started
+    os.remove(path)
+    return elapsed
+
+
+def main(size):
+    content = os.urandom(size * PartSize.MB)
+    server = serve(content)
+    url = f'http://127.0.0.1:{server.server_port}/file.bin'
+    api = Api(url='https://127.0.0.1', token='benchmark')
+
+    with tempfile.TemporaryDirectory() as directory:
+        original = download._download_part
+        download._download_part = per_part_open
+        try:
+            legacy = measure(api, url, directory, 32 * PartSize.KB)
+        finally:
+            download._download_part = original
+        print(f'per part open, 32 KB writes: {size / legacy:8.1f} MB/s')
+
+        for buffer_size in (PartSize.MB, 4 * PartSize.MB):
+            elapsed = measure(api, url, directory, buffer_size)
+            print(
+                f'pwrite, {buffer_size // PartSize.KB:>5} KB buffers:    '
+                f'{size / elapsed:8.1f} MB/s'
+            )
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 512)
@@ -0,0 +1,104 @@
+"""
+Measures the per item cost of building File resources from listing pages
+and of the first read of a mutable field.
+
+Construction compares the eager snapshot of unmodified data (how resources
+used to be built, every instance deep copied its data on construction),
+the default construction with copy-on-write snapshots and lazy listings
+(`Api(lazy_listings=True)`), which adopt the raw item without validating it.
+
+The read path compares a deep copy of the whole resource data on the first
+read of a list or dict field (how copy-on-write snapshots used to be taken)
+with the snapshot of the single field which is taken now.
+
+Usage:
+    PYTHONPATH=. python benchmarks/resource_materialization.py [items]
+"""
+import copy
+import sys
+import time
+import uuid
+
+from sevenbridges.models.file import File
+
+
+class LazyApi:
+    lazy_listings = True
+
+
+def file_payload(index):
+    return {
+        'href': f'https://api.sbgenomics.com/v2/files/{index}',
+        'id': uuid.uuid4().hex,
+        'name': f'sample_{index}.bam',
+        'size': 1024 * index,
+        'project': 'user/project',
+        'parent': uuid.uuid4().hex,
+        'type': 'file',
+        'created_on': '2020-01-01T10:00:00Z',
+        'modified_on': '2020-01-01T10:00:00Z',
+        'origin': {'task': uuid.uuid4().hex},
+        'storage': {'type': 'PLATFORM', 'hosted_on_locations': ['aws:us']},
+        'metadata': {
+            'sample_id': f'sample_{index}',
+            'platform': 'Illumina',
+            'paired_end': '1',
+            'reference_genome': 'HG38',
+        },
+        'tags': ['tag_a', 'tag_b'],
+    }
+
+
+def eager(items):
+    for item in items:
+        file_ = File(api=None, **item)
+        file_._old = copy.deepcopy(file_._data)
+
+
+def default(items):
+    for item in items:
+        File(api=None, **item)
+
+
+def lazy(items):
+    api = LazyApi()
+    for item in items:
+        File._listed(api, item)
+
+
+def read_full_snapshot(files):
+    for file_ in files:
+        file_._old = copy.deepcopy(file_._data)
+        file_._data['tags']
+
+
+def read_field_snapshot(files):
+    for file_ in files:
+        file_.tags
+
+
+def measure(func, items):
+    started = time.perf_counter()
+    func(items)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def build(items):
+    return [File(api=None, **item) for item in items]
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = [file_payload(i) for i in range(count)]
+
+    eager_cost = measure(eager, payload)
+    default_cost = measure(default, payload)
+    lazy_cost = measure(lazy, payload)
+    full_read_cost = measure(read_full_snapshot, build(payload))
+    field_read_cost = measure(read_field_snapshot, build(payload))
+    print(f'items: {count}')
+    print(f'eager snapshot:         {eager_cost:.2f} us/item')
+    print(f'copy-on-write snapshot: {default_cost:.2f} us/item')
+    print(f'lazy listing:           {lazy_cost:.2f} us/item')
+    print(f'first read, full copy:  {full_read_cost:.2f} us/item')
+    print(f'first read, field copy: {field_read_cost:.2f} us/item')
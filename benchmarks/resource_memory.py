@@ -0,0 +1,52 @@
+"""
+Measures memory held by synthetic File records kept in memory, e.g. for
+reconciliation jobs which load a whole project listing.
+
+Reports the traced allocations per instance for the File resources as
+built by the ResourceMeta and for the raw payload dictionaries alone, the
+difference being the overhead of the resource representation.
+
+Usage:
+    PYTHONPATH=. python benchmarks/resource_memory.py [items]
+"""
+import gc
+import sys
+import tracemalloc
+
+from sevenbridges.models.file import File
+
+
+def file_payload(index):
+    return {
+        'href': f'https://api.sbgenomics.com/v2/files/{index:024x}',
+        'id': f'{index:024x}',
+        'name': f'sample_{index}.bam',
+        'size': 1024 * index,
+        'project': 'user/project',
+        'parent': f'{index // 1000:024x}',
+        'type': 'file',
+    }
+
+
+def traced(build, count):
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    payload_size = traced(file_payload, count)
+    resource_size = traced(
+        lambda i: File(api=None, **file_payload(i)), count
+    )
+    overhead = (resource_size - payload_size) / count
+    print(f'items: {count}')
+    print(f'payload dicts:  {payload_size / 2 ** 20:.1f} MB')
+    print(f'File resources: {resource_size / 2 ** 20:.1f} MB')
+    print(f'resource overhead: {overhead:.0f} bytes/item')
@@ -12,6 +12,7 @@ import logging
 from sevenbridges.version import __version__
 
 from sevenbridges.api import Api
+from sevenbridges.async_api import AsyncExecutorApi
 from sevenbridges.config import Config
 
 from sevenbridges.models.invoice import Invoice
@@ -44,6 +45,7 @@ from sevenbridges.models.enums import (
     TaskStatus, TransferState, VolumeAccessMode, VolumeType, PartSize,
     AutomationStatus
 )
+from sevenbridges.transfer.utils import AutoPartSize, FixedPartSize
 from sevenbridges.errors import (
     SbgError, ResourceNotModified, ReadOnlyPropertyError, ValidationError,
     TaskValidationError, PaginationError, BadRequest, Unauthorized, Forbidden,
@@ -56,9 +58,10 @@ logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 __all__ = [
     # Models
-    'Api', 'AsyncJob', 'Automation', 'AutomationRun', 'AutomationMember',
-    'AutomationPackage',  'Config', 'Invoice', 'BillingGroup', 'User',
-    'Endpoints', 'Project', 'Task', 'App', 'Member', 'Permissions', 'File',
+    'Api', 'AsyncExecutorApi', 'AsyncJob', 'Automation', 'AutomationRun',
+    'AutomationMember', 'AutomationPackage',  'Config', 'Invoice',
+    'BillingGroup', 'User', 'Endpoints', 'Project', 'Task', 'App', 'Member',
+    'Permissions', 'File',
     'Export', 'Import', 'Volume', 'VolumeObject', 'Marker', 'Division', 'Team',
     'TeamMember', 'Dataset', 'DRSImportBulk', 'BulkRecord',
     # Enums
@@ -67,6 +70,8 @@ __all__ = [
     'DivisionRole', 'FileStorageType', 'ImportExportState',
     'TaskStatus', 'TransferState', 'VolumeAccessMode', 'VolumeType',
     'PartSize', 'AutomationStatus',
+    # Transfer
+    'AutoPartSize', 'FixedPartSize',
     # Errors
     'SbgError', 'ResourceNotModified', 'ReadOnlyPropertyError',
     'ValidationError', 'TaskValidationError', 'PaginationError', 'BadRequest',
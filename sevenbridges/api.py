@@ -4,6 +4,11 @@ from requests.adapters import DEFAULT_POOLSIZE
 
 from sevenbridges.errors import SbgError
 from sevenbridges.http.client import HttpClient
+from sevenbridges.meta.coalescer import GetCoalescer
+from sevenbridges.transfer.manager import TransferManager
+from sevenbridges.transfer.utils import (
+    BandwidthLimiter, ByteSemaphore, TransferWindow
+)
 
 from sevenbridges.models.app import App
 from sevenbridges.models.file import File
@@ -66,7 +71,12 @@ class Api(HttpClient):
             pool_block=True, max_parallel_requests=100,
             retry_count=RequestParameters.DEFAULT_RETRY_COUNT,
             backoff_factor=RequestParameters.DEFAULT_BACKOFF_FACTOR,
-            debug=False,
+            debug=False, cache=None, coalesce_window=None,
+            upload_max_in_flight_bytes=None,
+            transfer_window=TransferWindow.DEFAULT_SIZE,
+            adaptive_transfer_window=True, max_concurrent_transfers=8,
+            upload_bandwidth=None, download_bandwidth=None, rate_pacer=None,
+            lazy_listings=False,
     ):
         """
         Initializes api object.
@@ -89,6 +99,30 @@ class Api(HttpClient):
             connections.
         :param max_parallel_requests: Number which indicates number of parallel
             requests, only useful for multi thread applications.
+        :param cache: Optional response cache for GET requests, instance of
+            :class:`sevenbridges.http.cache.ResponseCache`.
+        :param coalesce_window: If set, concurrent single resource get calls
+            made within the window (in seconds) are sent as one bulk get
+            request, for resources with a bulk get endpoint.
+        :param upload_max_in_flight_bytes: Maximum number of bytes of file
+            parts being uploaded at the same time, shared by all uploads
+            started with this Api.
+        :param transfer_window: Number of parts of a single upload or
+            download in flight.
+        :param adaptive_transfer_window: If True, the number of parts in
+            flight adapts to the measured throughput, up to the number of
+            transfer workers.
+        :param max_concurrent_transfers: Number of uploads and downloads
+            submitted to the transfer manager running at the same time.
+        :param upload_bandwidth: Upload bandwidth limit in bytes per second
+            shared by all uploads, adjustable through `api.bandwidth`.
+        :param download_bandwidth: Download bandwidth limit in bytes per
+            second shared by all downloads and streams.
+        :param rate_pacer: Optional instance of
+            :class:`sevenbridges.http.pacer.RateLimitPacer` spacing requests
+            of all threads over the rate limit window.
+        :param lazy_listings: If True, items of listing pages keep the raw
+            response data and fields are validated only when read.
         :return: Api object instance.
         """
         if not debug and url and url.startswith('http:'):
@@ -104,9 +138,29 @@ class Api(HttpClient):
             pool_maxsize=pool_maxsize, pool_block=pool_block,
             max_parallel_requests=max_parallel_requests,
             retry_count=retry_count, backoff_factor=backoff_factor,
+            cache=cache, rate_pacer=rate_pacer,
         )
 
+        self.download_max_workers = download_max_workers
+        self.upload_max_workers = upload_max_workers
+        self.transfer_window = transfer_window
+        self.adaptive_transfer_window = adaptive_transfer_window
+        self.lazy_listings = lazy_listings
         self.download_pool = ThreadPoolExecutor(
             max_workers=download_max_workers
         )
         self.upload_pool = ThreadPoolExecutor(max_workers=upload_max_workers)
+        self.transfers = TransferManager(
+            max_transfers=max_concurrent_transfers
+        )
+        self.upload_in_flight = (
+            ByteSemaphore(upload_max_in_flight_bytes)
+            if upload_max_in_flight_bytes else None
+        )
+        self.bandwidth = BandwidthLimiter(
+            upload=upload_bandwidth, download=download_bandwidth
+        )
+        self.coalescer = (
+            GetCoalescer(self, window=coalesce_window)
+            if coalesce_window else None
+        )
@@ -0,0 +1,187 @@
+import asyncio
+import inspect
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import DEFAULT_POOLSIZE
+
+from sevenbridges.api import Api
+from sevenbridges.meta.resource import ResourceMeta
+from sevenbridges.models.enums import RequestParameters
+
+
+class AsyncResource:
+    """
+    Awaitable facade over a resource class. Every callable attribute of the
+    wrapped resource (get, query, save, delete, bulk_* ...) returns a
+    coroutine which executes the blocking call on the AsyncExecutorApi
+    thread pool.
+
+    Instance methods are invoked by passing the instance as the first
+    argument, e.g. ``await api.files.save(file)``.
+    """
+
+    def __init__(self, resource, async_api):
+        self._resource = resource
+        self._async_api = async_api
+        self._methods = {}
+
+    def __getattr__(self, item):
+        attr = getattr(self._resource, item)
+        if isinstance(attr, type) or not callable(attr):
+            return attr
+
+        if item not in self._methods:
+            self._methods[item] = self._wrap(attr)
+        return self._methods[item]
+
+    def _wrap(self, method):
+        try:
+            takes_api = 'api' in inspect.signature(method).parameters
+        except (TypeError, ValueError):
+            takes_api = False
+
+        async_api = self._async_api
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            # Pass the api explicitly instead of relying on the class level
+            # api which is shared between all Api instances.
+            if takes_api and kwargs.get('api') is None:
+                kwargs['api'] = async_api.api
+            return await async_api.run(method, *args, **kwargs)
+
+        return wrapper
+
+    def __repr__(self):
+        return f'<AsyncResource: {self._resource.__name__}>'
+
+
+class AsyncExecutorApi:
+    """
+    Executor facade making the Api awaitable. Exposes the same resource
+    classes as :class:`sevenbridges.api.Api` with awaitable methods.
+
+    This is not a native asyncio client: every call runs the blocking
+    requests based Api on a bounded thread pool with `run_in_executor`,
+    and the pool shares a bounded connection pool. Any number of
+    coroutines can await api calls while at most `max_concurrency` of them
+    hold a thread and are on the wire at the same time, so the number of
+    requests in flight is bounded by the number of threads.
+
+    Resources returned by the facade are regular resources bound to the
+    blocking Api. Accessing an attribute which is fetched lazily, or
+    calling a method of the resource directly, sends the request on the
+    event loop thread and blocks the loop. Use the awaitable methods of
+    the facade, or `run`, for anything that talks to the server.
+    """
+
+    def __init__(
+            self, url=None, token=None, oauth_token=None, config=None,
+            timeout=None, max_concurrency=32, proxies=None,
+            error_handlers=None, advance_access=False,
+            pool_connections=DEFAULT_POOLSIZE,
+            retry_count=RequestParameters.DEFAULT_RETRY_COUNT,
+            backoff_factor=RequestParameters.DEFAULT_BACKOFF_FACTOR,
+            debug=False, cache=None, coalesce_window=None, api=None,
+            rate_pacer=None,
+    ):
+        """
+        Initializes the executor facade.
+
+        :param url: Api url.
+        :param token: Secure token.
+        :param oauth_token: Oauth token.
+        :param config: Configuration profile.
+        :param timeout: Client timeout.
+        :param max_concurrency: Maximum number of requests in flight, also
+            used as the size of the connection pool.
+        :param proxies: Proxy settings if any.
+        :param error_handlers: List of error handlers - callables.
+        :param advance_access: If True advance access features will be enabled.
+        :param pool_connections: The number of urllib3 connection pools to
+            cache.
+        :param retry_count: Number of retries for failed connections.
+        :param backoff_factor: Backoff factor for retries.
+        :param debug: Allows http urls when set.
+        :param cache: Optional response cache for GET requests.
+        :param coalesce_window: Window in seconds for coalescing concurrent
+            single resource get calls into bulk get requests.
+        :param rate_pacer: Optional RateLimitPacer spacing requests over
+            the rate limit window.
+        :param api: Existing Api instance to wrap, other connection
+            parameters are ignored if provided.
+        :return: AsyncExecutorApi object instance.
+        """
+        if api is None:
+            api = Api(
+                url=url, token=token, oauth_token=oauth_token, config=config,
+                timeout=timeout, proxies=proxies,
+                error_handlers=error_handlers, advance_access=advance_access,
+                pool_connections=pool_connections,
+                pool_maxsize=max_concurrency, pool_block=True,
+                max_parallel_requests=max_concurrency,
+                retry_count=retry_count, backoff_factor=backoff_factor,
+                debug=debug, cache=cache, coalesce_window=coalesce_window,
+                rate_pacer=rate_pacer,
+            )
+        self.api = api
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix='sbg-async'
+        )
+        self._resources = {}
+
+    def __getattr__(self, item):
+        if item.startswith('_') or item == 'api':
+            raise AttributeError(item)
+        resource = getattr(self.api, item)
+        if not isinstance(resource, ResourceMeta):
+            return resource
+        if item not in self._resources:
+            self._resources[item] = AsyncResource(resource, self)
+        return self._resources[item]
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Executes blocking callable on the api executor.
+        :param func: Callable to execute.
+        :return: Result of the callable.
+        """
+        # Returns the running loop when called from a coroutine
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def iterate(self, iterable):
+        """
+        Asynchronously iterates over blocking iterables such as
+        ``Collection.all()`` or ``File.stream()``.
+        :param iterable: Iterable to consume.
+        """
+        sentinel = object()
+        iterator = await self.run(iter, iterable)
+        while True:
+            item = await self.run(next, iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+
+    def close(self):
+        """
+        Shuts down the executor and closes the connection pool.
+        """
+        self._executor.shutdown(wait=True)
+        self.api.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_event_loop().run_in_executor(None, self.close)
+
+    def __repr__(self):
+        return f'<AsyncExecutorApi({self.api.url})>'
+
+    __str__ = __repr__
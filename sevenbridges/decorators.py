@@ -1,4 +1,3 @@
-import copy
 import logging
 import functools
 from json import JSONDecodeError
@@ -6,9 +5,7 @@ from json import JSONDecodeError
 import requests
 
 from sevenbridges.errors import (
-    BadRequest, Unauthorized, Forbidden, NotFound, MethodNotAllowed,
-    RequestTimeout, Conflict, TooManyRequests, SbgError, ServerError,
-    ServiceUnavailable, NonJSONResponseError
+    SbgError, NonJSONResponseError, STATUS_ERRORS
 )
 
 logger = logging.getLogger(__name__)
@@ -27,8 +24,8 @@ def inplace_reload(method):
         if in_place and api_object:
             obj._data = api_object._data
             obj._dirty = api_object._dirty
-            obj._old = copy.deepcopy(api_object._data.data)
-            obj._data.fetched = False
+            obj.update_old()
+            obj._fetched = False
             return obj
         elif api_object:
             return api_object
@@ -71,18 +68,7 @@ def check_for_error(func):
                 return response
             if status_code == 204:
                 return
-            e = {
-                400: BadRequest,
-                401: Unauthorized,
-                403: Forbidden,
-                404: NotFound,
-                405: MethodNotAllowed,
-                408: RequestTimeout,
-                409: Conflict,
-                429: TooManyRequests,
-                500: ServerError,
-                503: ServiceUnavailable,
-            }.get(status_code, SbgError)()
+            e = STATUS_ERRORS.get(status_code, SbgError)()
             data = response.json()
             if 'message' in data:
                 e.message = data['message']
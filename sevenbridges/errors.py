@@ -163,3 +163,25 @@ class URITooLong(SbgError):
         super().__init__(
             code=code, status=414, message=message, more_info=more_info
         )
+
+
+class StorageError(SbgError):
+    """Failed request to storage made with a presigned url."""
+
+    def __init__(self, message=None, status=None):
+        super().__init__(message=message, status=status)
+
+
+# Errors raised for http status codes of failed requests
+STATUS_ERRORS = {
+    400: BadRequest,
+    401: Unauthorized,
+    403: Forbidden,
+    404: NotFound,
+    405: MethodNotAllowed,
+    408: RequestTimeout,
+    409: Conflict,
+    429: TooManyRequests,
+    500: ServerError,
+    503: ServiceUnavailable,
+}
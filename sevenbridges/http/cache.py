@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """
+    Cached GET response.
+    """
+    __slots__ = (
+        'url', 'status_code', 'headers', 'content', 'encoding', 'etag',
+        'expires'
+    )
+
+    def __init__(self, url, status_code, headers, content, encoding, etag,
+                 expires):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.etag = etag
+        self.expires = expires
+
+    @classmethod
+    def from_response(cls, response, ttl):
+        return cls(
+            url=response.url,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            content=response.content,
+            encoding=response.encoding,
+            etag=response.headers.get('ETag'),
+            expires=time.time() + ttl,
+        )
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires
+
+    def to_response(self):
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response.elapsed = timedelta(0)
+        response._content = self.content
+        return response
+
+    def to_dict(self):
+        """
+        JSON serializable form of the entry, the body is base64 encoded.
+        """
+        data = {slot: getattr(self, slot) for slot in self.__slots__}
+        data['content'] = base64.b64encode(self.content).decode('ascii')
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['content'] = base64.b64decode(data['content'])
+        return cls(**data)
+
+
+class ResponseCache(ABC):
+    """
+    Base class for the HttpClient response cache. Only idempotent GET
+    requests are cached. Entries are served until their time to live
+    expires, after that they are revalidated with `If-None-Match` if the
+    server provided an ETag. Modifying requests (POST, PATCH, PUT, DELETE)
+    invalidate cached entries of the modified href and of its parent
+    hrefs once they are sent, so actions like `/tasks/{id}/actions/run`
+    invalidate the task. Bulk and async requests invalidate all entries of
+    the resource they modify.
+
+    Backends implement `_get`, `_set`, `_invalidate`, `_invalidate_tree`
+    and `clear`.
+    """
+
+    # Path segments of bulk and async requests, followed by the resource
+    # and the action
+    BATCH_SEGMENTS = ('bulk', 'async')
+
+    DEFAULT_EXCLUDE = (
+        '/download_info', '/rate_limit', '/upload/', '/scroll',
+    )
+
+    def __init__(self, ttl=60, resource_ttl=None, exclude=DEFAULT_EXCLUDE):
+        """
+        :param ttl: Default time to live of cached responses in seconds.
+        :param resource_ttl: Time to live per resource, keyed by the first
+            segment of the resource path, e.g. {'apps': 3600, 'tasks': 0}.
+            Zero disables caching for the resource.
+        :param exclude: Url fragments which are never cached.
+        """
+        self.ttl = ttl
+        self.resource_ttl = resource_ttl or {}
+        self.exclude = exclude or ()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def ttl_for(self, resource):
+        return self.resource_ttl.get(resource, self.ttl)
+
+    def cacheable(self, url):
+        return not any(fragment in url for fragment in self.exclude)
+
+    def lookup(self, key, path):
+        """
+        Returns cached entry for the key, counting hits and misses. Stale
+        entries are returned as well, so that they can be revalidated.
+        :param key: Cache key.
+        :param path: Url of the entry without query parameters.
+        :return: CacheEntry or None.
+        """
+        entry = self._get(key, path)
+        with self._lock:
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def store(self, key, path, entry):
+        self._set(key, path, entry)
+
+    def revalidated(self, key, path, entry, ttl):
+        with self._lock:
+            self.revalidations += 1
+        entry.expires = time.time() + ttl
+        self._set(key, path, entry)
+
+    def invalidate(self, path):
+        """
+        Invalidates entries cached for the path and its parent paths.
+        :param path: Url without query parameters.
+        """
+        parts = urlsplit(path)
+        segments = parts.path.rstrip('/').split('/')
+        base = f'{parts.scheme}://{parts.netloc}' if parts.netloc else ''
+        for i in range(len(segments), 1, -1):
+            self._invalidate(base + '/'.join(segments[:i]))
+
+    def written(self, path):
+        """
+        Invalidates entries affected by a modifying request to the path,
+        the entries of the path and of its parent paths. A bulk or async
+        request invalidates all entries of the resource, bulk reads are
+        ignored.
+        :param path: Url without query parameters.
+        """
+        self.invalidate(path)
+        parts = urlsplit(path)
+        segments = parts.path.rstrip('/').split('/')
+        base = f'{parts.scheme}://{parts.netloc}' if parts.netloc else ''
+        for index, segment in enumerate(segments[:-2]):
+            if segment in self.BATCH_SEGMENTS:
+                if segments[-1] != 'get':
+                    self._invalidate_tree(base + '/'.join(
+                        segments[:index] + segments[index + 1:-1]
+                    ))
+                return
+
+    @abstractmethod
+    def clear(self):
+        """Removes all cached entries."""
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+            }
+
+    @abstractmethod
+    def _get(self, key, path):
+        """Cached entry of the key or None."""
+
+    @abstractmethod
+    def _set(self, key, path, entry):
+        """Stores the entry of the key."""
+
+    @abstractmethod
+    def _invalidate(self, path):
+        """Removes all entries of the path."""
+
+    @abstractmethod
+    def _invalidate_tree(self, path):
+        """Removes all entries of the path and of the paths below it."""
+
+
+class MemoryCache(ResponseCache):
+    """
+    In memory LRU response cache.
+    """
+
+    def __init__(self, maxsize=1024, **kwargs):
+        """
+        :param maxsize: Maximum number of cached responses.
+        """
+        super().__init__(**kwargs)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._paths = {}
+
+    def _get(self, key, path):
+        with self._lock:
+            try:
+                _, entry = self._entries[key]
+            except KeyError:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key, path, entry):
+        with self._lock:
+            self._entries[key] = (path, entry)
+            self._entries.move_to_end(key)
+            self._paths.setdefault(path, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                evicted, (evicted_path, _) = self._entries.popitem(last=False)
+                self._discard_path_key(evicted_path, evicted)
+
+    def _invalidate(self, path):
+        with self._lock:
+            for key in self._paths.pop(path, ()):
+                self._entries.pop(key, None)
+
+    def _invalidate_tree(self, path):
+        with self._lock:
+            for cached in list(self._paths):
+                if cached == path or cached.startswith(path + '/'):
+                    for key in self._paths.pop(cached):
+                        self._entries.pop(key, None)
+
+    def _discard_path_key(self, path, key):
+        keys = self._paths.get(path)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._paths[path]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache(ResponseCache):
+    """
+    On disk response cache, entries survive process restarts and can be
+    shared between processes. Entries of a single path are kept in one
+    directory so that they can be invalidated together, the directory
+    records the path so that whole resources can be invalidated.
+
+    Entries are stored as JSON, reading them never runs code, and new
+    cache directories are only accessible to their owner.
+    """
+    _PATH_FILE = '.path'
+
+    def __init__(self, directory, **kwargs):
+        """
+        :param directory: Cache directory.
+        """
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+    def _path_dir(self, path):
+        return os.path.join(self.directory, self._digest(path))
+
+    def _entry_file(self, key, path):
+        return os.path.join(self._path_dir(path), self._digest(key))
+
+    def _get(self, key, path):
+        try:
+            with open(self._entry_file(key, path), encoding='utf-8') as fp:
+                return CacheEntry.from_dict(json.load(fp))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.debug('Unable to read cache entry %s: %s', key, e)
+            return None
+
+    def _set(self, key, path, entry):
+        directory = self._path_dir(path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        path_file = os.path.join(directory, self._PATH_FILE)
+        fd, temp = tempfile.mkstemp(dir=directory)
+        try:
+            if not os.path.exists(path_file):
+                with open(path_file, 'w', encoding='utf-8') as fp:
+                    fp.write(path)
+            with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                json.dump(entry.to_dict(), fp)
+            os.replace(temp, self._entry_file(key, path))
+        except OSError as e:
+            logger.debug('Unable to write cache entry %s: %s', key, e)
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def _invalidate(self, path):
+        directory = self._path_dir(path)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _invalidate_tree(self, path):
+        for name in os.listdir(self.directory):
+            path_file = os.path.join(self.directory, name, self._PATH_FILE)
+            try:
+                with open(path_file, encoding='utf-8') as fp:
+                    cached = fp.read()
+            except OSError:
+                continue
+            if cached == path or cached.startswith(path + '/'):
+                self._invalidate(cached)
+
+    def clear(self):
+        for directory in os.listdir(self.directory):
+            full_path = os.path.join(self.directory, directory)
+            for name in os.listdir(full_path):
+                os.remove(os.path.join(full_path, name))
@@ -1,5 +1,6 @@
 import copy
 import json
+import hashlib
 import logging
 import platform
 import threading
@@ -13,7 +14,9 @@ from sevenbridges.errors import SbgError, URITooLong
 from sevenbridges.config import Config, format_proxies
 from sevenbridges.models.enums import RequestParameters
 from sevenbridges.decorators import check_for_error, throttle
+from sevenbridges.http.cache import CacheEntry
 from sevenbridges.http.error_handlers import maintenance_sleeper
+from sevenbridges.http.pacer import RateBudget
 
 logger = logging.getLogger(__name__)
 
@@ -127,7 +130,8 @@ class HttpClient:
             timeout=None, proxies=None, error_handlers=None,
             advance_access=False, pool_connections=None,
             pool_maxsize=None, pool_block=True, max_parallel_requests=None,
-            retry_count=None, backoff_factor=None
+            retry_count=None, backoff_factor=None, cache=None,
+            rate_pacer=None
     ):
 
         if (url, token, config) == (None, None, None):
@@ -198,6 +202,8 @@ class HttpClient:
                 'Advance access features enabled. '
                 'AA API calls can be subject to changes.'
             )
+        self.cache = cache
+        self.rate_pacer = rate_pacer
         self.error_handlers = [maintenance_sleeper]
         if error_handlers and isinstance(error_handlers, list):
             for handler in error_handlers:
@@ -229,6 +235,27 @@ class HttpClient:
     def request_id(self):
         return self._request_id
 
+    def rate_budget(self):
+        """
+        Returns the rate limit budget from the headers of the last
+        responses. Unlike `limit`, `remaining` and `reset_time` it makes no
+        request to the server.
+        :return: RateBudget
+        """
+        if self.rate_pacer is not None:
+            return self.rate_pacer.budget()
+        return RateBudget(
+            limit=int(self._limit) if self._limit else self._limit,
+            remaining=(
+                int(self._remaining) if self._remaining else self._remaining
+            ),
+            reset_time=(
+                datetime.fromtimestamp(float(self._reset))
+                if self._reset else self._reset
+            ),
+            wait=0,
+        )
+
     def add_error_handler(self, handler):
         if callable(handler) and handler not in self.error_handlers:
             self.error_handlers.append(handler)
@@ -237,6 +264,27 @@ class HttpClient:
         if callable(handler) and handler in self.error_handlers:
             self.error_handlers.remove(handler)
 
+    def _cache_key(self, url, params):
+        """
+        Cache key is the full request url prefixed with a digest of the
+        credentials, so that a shared cache never serves responses fetched
+        with one token to another.
+        """
+        prepared = requests.Request('GET', url, params=params).prepare()
+        credentials = (
+            self.headers.get('X-SBG-Session-Id') or
+            self.headers.get('X-SBG-Auth-Token') or
+            self.headers.get('Authorization') or ''
+        )
+        identity = hashlib.sha256(credentials.encode('utf-8')).hexdigest()
+        path = prepared.url.split('?', 1)[0]
+        return f'{identity[:16]}:{prepared.url}', path
+
+    def _cache_ttl(self, path):
+        relative = path[len(self.url):] if path.startswith(self.url) else path
+        resource = relative.lstrip('/').split('/', 1)[0]
+        return self.cache.ttl_for(resource)
+
     def _rate_limit(self):
         self._request('GET', url='/rate_limit', append_base=True)
 
@@ -273,6 +321,59 @@ class HttpClient:
             'params': params
         }
         masked_request_data = mask_secrets(request_data)
+
+        cache_key = cache_path = cached = written = None
+        if self.cache is not None and not stream:
+            if verb == 'GET' and self.cache.cacheable(url):
+                cache_key, cache_path = self._cache_key(url, params)
+                cached = self.cache.lookup(cache_key, cache_path)
+                if cached is not None and cached.fresh:
+                    logger.debug('Cached response %s', url)
+                    return cached.to_response()
+                if cached is not None and cached.etag:
+                    headers = dict(headers)
+                    headers['If-None-Match'] = cached.etag
+            elif verb in ('POST', 'PATCH', 'PUT', 'DELETE'):
+                written = url.split('?', 1)[0]
+
+        if self.rate_pacer is not None and url.startswith(self.url):
+            self.rate_pacer.acquire()
+
+        try:
+            response = self._send(
+                verb, url, headers, params, data, stream,
+                masked_request_data
+            )
+        finally:
+            # Entries cached while the request was in flight are dropped
+            # as well, whether it succeeded or not
+            if written is not None:
+                self.cache.written(written)
+
+        headers = response.headers
+        self._limit = headers.get('X-RateLimit-Limit', self._limit)
+        self._remaining = headers.get('X-RateLimit-Remaining', self._remaining)
+        self._reset = headers.get('X-RateLimit-Reset', self._reset)
+        if self.rate_pacer is not None:
+            self.rate_pacer.observe(headers)
+        self._last_response_time = response.elapsed.total_seconds()
+
+        self._request_id = headers.get('X-Request-Id', self._request_id)
+
+        if cache_key is not None:
+            ttl = self._cache_ttl(cache_path)
+            if response.status_code == 304 and cached is not None:
+                self.cache.revalidated(cache_key, cache_path, cached, ttl)
+                return cached.to_response()
+            if response.status_code == 200 and ttl > 0:
+                self.cache.store(
+                    cache_key, cache_path,
+                    CacheEntry.from_response(response, ttl)
+                )
+        return response
+
+    def _send(self, verb, url, headers, params, data, stream,
+              masked_request_data):
         if not stream:
             masked_request_data.update({'data': data})
             logger.debug(
@@ -305,14 +406,6 @@ class HttpClient:
                         response = handled_response
                 else:
                     break
-
-        headers = response.headers
-        self._limit = headers.get('X-RateLimit-Limit', self._limit)
-        self._remaining = headers.get('X-RateLimit-Remaining', self._remaining)
-        self._reset = headers.get('X-RateLimit-Reset', self._reset)
-        self._last_response_time = response.elapsed.total_seconds()
-
-        self._request_id = headers.get('X-Request-Id', self._request_id)
         return response
 
     def get(self, url, headers=None, params=None, data=None, append_base=True,
@@ -0,0 +1,149 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+RateBudget = namedtuple(
+    'RateBudget', ['limit', 'remaining', 'reset_time', 'wait']
+)
+
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitPacer:
+    """
+    Spaces requests of all threads sharing an Api so that the remaining
+    rate limit budget lasts until the limit window resets, instead of
+    spending it at once and having every thread hit 429 together.
+
+    The budget is taken from the X-RateLimit headers of the responses and
+    decremented for every request sent, so threads learn about each other
+    without waiting for responses. After an idle period a burst of requests
+    goes out without spacing. Once the budget is spent requests wait for the
+    reset and are then released one by one.
+    """
+
+    def __init__(self, burst=None, reserve=0, window=300):
+        """
+        :param burst: Number of requests sent without spacing after an idle
+            period, a tenth of the limit by default.
+        :param reserve: Number of requests of the budget left for other
+            clients using the same token.
+        :param window: Length of the rate limit window in seconds, used to
+            space the requests released after a reset.
+        """
+        self.burst = burst
+        self.reserve = reserve
+        self.window = window
+        self._limit = None
+        self._remaining = None
+        self._reset = None
+        # Reset time guessed from the window length after a reset passed
+        self._estimated = False
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f'<RateLimitPacer: limit={self._limit}, '
+            f'remaining={self._remaining}>'
+        )
+
+    def observe(self, headers):
+        """
+        Updates the budget from the X-RateLimit headers of a response.
+        :param headers: Response headers.
+        """
+        limit = _header_int(headers, 'X-RateLimit-Limit')
+        remaining = _header_int(headers, 'X-RateLimit-Remaining')
+        reset = _header_int(headers, 'X-RateLimit-Reset')
+        with self._lock:
+            if limit is not None:
+                self._limit = limit
+            if remaining is None or reset is None:
+                return
+            if self._reset is None or self._estimated or reset > self._reset:
+                self._reset = reset
+                self._remaining = remaining
+                self._estimated = False
+            elif reset == self._reset:
+                # Responses of the same window may arrive out of order
+                self._remaining = min(self._remaining, remaining)
+
+    def _roll_window(self, now):
+        if now < self._reset or not self._limit:
+            return
+        # The next window starts with the full limit, less the requests
+        # already queued for it, until a response reports it
+        periods = int((now - self._reset) // self.window) + 1
+        self._reset += periods * self.window
+        self._remaining = self._limit + min(self._remaining, 0)
+        self._estimated = True
+
+    def _schedule(self, now):
+        """
+        Returns the start of the next request slot and the interval to the
+        one after it.
+        """
+        self._roll_window(now)
+        available = self._remaining - self.reserve
+        if available > 0:
+            interval = max(self._reset - now, 0) / available
+            burst = self.burst
+            if burst is None:
+                burst = (self._limit or 0) // 10
+            return max(self._next, now - burst * interval), interval
+        interval = self.window / self._limit if self._limit else 0
+        return max(self._next, self._reset), interval
+
+    def _slot(self):
+        with self._lock:
+            if self._remaining is None:
+                return 0
+            now = time.time()
+            start, interval = self._schedule(now)
+            self._next = start + interval
+            self._remaining -= 1
+            return max(start - now, 0)
+
+    def acquire(self):
+        """
+        Waits until the next request may be sent.
+        :return: Seconds waited.
+        """
+        delay = self._slot()
+        if delay:
+            logger.debug('Pacing request for %.2fs.', delay)
+            time.sleep(delay)
+        return delay
+
+    def budget(self):
+        """
+        Returns the budget as known from the last responses, without a
+        request to the server.
+        :return: RateBudget with the limit, the requests remaining in the
+            window, the reset time and the seconds the next request would
+            be paced for.
+        """
+        with self._lock:
+            if self._remaining is None:
+                return RateBudget(self._limit, None, None, 0)
+            now = time.time()
+            start, _ = self._schedule(now)
+            return RateBudget(
+                limit=self._limit,
+                remaining=max(self._remaining, 0),
+                reset_time=datetime.fromtimestamp(self._reset),
+                wait=max(start - now, 0),
+            )
@@ -0,0 +1,102 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sevenbridges.errors import SbgError
+from sevenbridges.models.enums import RequestParameters
+
+logger = logging.getLogger(__name__)
+
+
+def _retryable(error, idempotent):
+    """
+    Whether the failed chunk can be sent again. Requests which create
+    resources are only retried if the server rejected them without
+    processing.
+    """
+    status = error.status
+    if status in (429, 503):
+        return True
+    return idempotent and (status is None or status == 408 or status >= 500)
+
+
+def _send_chunk(request, chunk, idempotent, retry_count, backoff_factor):
+    attempt = 0
+    while True:
+        try:
+            return request(chunk)
+        except SbgError as e:
+            if attempt >= retry_count or not _retryable(e, idempotent):
+                raise
+            delay = backoff_factor * 2 ** attempt
+            logger.debug(
+                'Bulk request of %s items failed: %s, retrying in %ss.',
+                len(chunk), e, delay
+            )
+            time.sleep(delay)
+            attempt += 1
+
+
+def bulk_execute(request, items, idempotent=True,
+                 limit=RequestParameters.DEFAULT_BULK_LIMIT,
+                 max_workers=RequestParameters.DEFAULT_BULK_WORKERS,
+                 retry_count=3,
+                 backoff_factor=RequestParameters.DEFAULT_BACKOFF_FACTOR):
+    """
+    Sends items of any length to a bulk endpoint. Items are split into
+    chunks of the bulk limit which are sent concurrently, results are
+    returned in the order of the items. Chunks which fail with a transient
+    error are retried, if a chunk still fails its error is raised once all
+    other chunks are done. The raised error carries the results of the
+    chunks which succeeded as `results` and the items of the chunks which
+    failed as `failed_items`.
+    :param request: Callable sending a single chunk, returns the list of
+        results for the chunk.
+    :param items: List of items.
+    :param idempotent: Whether chunks can be retried after server errors.
+    :param limit: Maximum number of items in a single request.
+    :param max_workers: Maximum number of concurrent requests.
+    :param retry_count: Number of retries of a failed chunk.
+    :param backoff_factor: Backoff factor for retries.
+    :return: List of results.
+    """
+    items = list(items)
+    chunks = [
+        items[i:i + limit] for i in range(0, len(items), limit)
+    ] or [items]
+    if len(chunks) == 1:
+        try:
+            return _send_chunk(
+                request, chunks[0], idempotent, retry_count, backoff_factor
+            )
+        except Exception as e:
+            e.results, e.failed_items = [], chunks[0]
+            raise
+
+    logger.debug(
+        'Sending %s items in %s bulk requests.', len(items), len(chunks)
+    )
+    with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(chunks))
+    ) as pool:
+        futures = [
+            pool.submit(
+                _send_chunk, request, chunk, idempotent, retry_count,
+                backoff_factor
+            )
+            for chunk in chunks
+        ]
+        results, failed_items, error = [], [], None
+        for chunk, future in zip(chunks, futures):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                error = error or e
+                failed_items.extend(chunk)
+    if error is not None:
+        logger.debug(
+            '%s of %s bulk items failed.', len(failed_items), len(items)
+        )
+        error.results, error.failed_items = results, failed_items
+        raise error
+    return results
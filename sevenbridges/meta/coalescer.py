@@ -0,0 +1,115 @@
+import logging
+import threading
+from concurrent.futures import Future
+
+from sevenbridges.errors import SbgError, STATUS_ERRORS
+from sevenbridges.meta.transformer import Transform
+from sevenbridges.models.enums import RequestParameters
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    __slots__ = ('futures', 'full')
+
+    def __init__(self):
+        self.futures = {}
+        self.full = threading.Event()
+
+
+class GetCoalescer:
+    """
+    Collects concurrent single resource get calls of resources which have
+    a bulk get endpoint and dispatches them as a single bulk request.
+
+    The first caller of a batch waits for the batch window (or until the
+    batch reaches the bulk limit) and sends the request, the other callers
+    wait for their results. A batch with a single id is fetched with the
+    regular get request.
+    """
+
+    def __init__(self, api, window=0.01,
+                 limit=RequestParameters.DEFAULT_BULK_LIMIT):
+        """
+        :param api: Api instance.
+        :param window: Time in seconds to collect calls into a batch.
+        :param limit: Maximum number of ids in a batch.
+        """
+        self.api = api
+        self.window = window
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def get(self, resource, id):
+        """
+        Fetches the resource, coalescing the request with concurrent ones.
+        :param resource: Resource class with the bulk get endpoint.
+        :param id: Resource identifier.
+        :return: Resource object.
+        """
+        id = Transform.to_resource(id)
+        with self._lock:
+            batch = self._pending.get(resource)
+            leader = batch is None
+            if leader:
+                batch = self._pending[resource] = _Batch()
+            future = batch.futures.get(id)
+            if future is None:
+                future = batch.futures[id] = Future()
+                if len(batch.futures) >= self.limit:
+                    del self._pending[resource]
+                    batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(resource) is batch:
+                    del self._pending[resource]
+            self._dispatch(resource, batch)
+        return future.result()
+
+    def _dispatch(self, resource, batch):
+        ids = list(batch.futures)
+        try:
+            if len(ids) == 1:
+                data = self.api.get(
+                    url=resource._URL['get'].format(id=ids[0])
+                ).json()
+                batch.futures[ids[0]].set_result(
+                    resource(api=self.api, **data)
+                )
+                return
+
+            logger.debug(
+                'Fetching %s %s resources in bulk.', len(ids),
+                resource.__name__
+            )
+            records = resource.bulk_get(ids, api=self.api)
+            for id, record in zip(ids, records):
+                if record.valid:
+                    batch.futures[id].set_result(record.resource)
+                else:
+                    batch.futures[id].set_exception(
+                        self._record_error(record.error)
+                    )
+        except Exception as e:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for id, future in batch.futures.items():
+            if not future.done():
+                future.set_exception(
+                    SbgError(f'Resource {id} missing from bulk response.')
+                )
+
+    @staticmethod
+    def _record_error(error):
+        e = STATUS_ERRORS.get(error.status, SbgError)()
+        e.status = error.status
+        e.code = error.code
+        e.message = error.message
+        e.more_info = error.more_info
+        return e
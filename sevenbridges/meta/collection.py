@@ -1,9 +1,32 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 from sevenbridges.errors import PaginationError, SbgError
 from sevenbridges.models.compound.volumes.volume_object import VolumeObject
 from sevenbridges.models.compound.volumes.volume_prefix import VolumePrefix
 from sevenbridges.models.link import Link, VolumeLink
 
 
+def _offset_params(href):
+    if not href:
+        return None, None
+    query = dict(parse_qsl(urlsplit(href).query))
+    try:
+        return int(query['offset']), int(query['limit'])
+    except (KeyError, ValueError):
+        return None, None
+
+
+def _with_offset(href, offset):
+    parts = urlsplit(href)
+    query = [
+        (key, str(offset) if key == 'offset' else value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
 class Collection(list):
     """
     Wrapper for SevenBridges pageable resources.
@@ -26,11 +49,20 @@ class Collection(list):
     def total(self):
         return int(self._total)
 
-    def all(self):
+    def all(self, prefetch=None):
         """
         Fetches all available items.
+        :param prefetch: Number of pages fetched in parallel. Offset
+            paginated resources compute every page offset from the total
+            and fetch up to `prefetch` pages at once, continuation token
+            resources read the next page ahead while the current one is
+            being consumed. Items are always yielded in order.
         :return: Collection object.
         """
+        if prefetch and prefetch > 1:
+            yield from self._all_prefetched(prefetch)
+            return
+
         page = self._load(self.href)
         while True:
             try:
@@ -40,6 +72,56 @@ class Collection(list):
             except PaginationError:
                 break
 
+    def _all_prefetched(self, prefetch):
+        pool = ThreadPoolExecutor(max_workers=prefetch)
+        pending = []
+        try:
+            page = self._load(self.href)
+            # Items of the current page are yielded only after the following
+            # page(s) were requested, so loading overlaps with consumption.
+            items = page._items
+
+            next_href = page._next_href()
+            offset, limit = _offset_params(next_href)
+            if offset is not None and limit:
+                # Offset pagination, every page is known up front.
+                hrefs = (
+                    _with_offset(next_href, page_offset)
+                    for page_offset in range(offset, page.total, limit)
+                )
+                for href in itertools.islice(hrefs, prefetch):
+                    pending.append(pool.submit(self._load, href))
+                yield from items
+                while pending:
+                    page = pending.pop(0).result()
+                    href = next(hrefs, None)
+                    if href is not None:
+                        pending.append(pool.submit(self._load, href))
+                    yield from page._items
+                items = ()
+
+            # Continuation token pagination (or entries added to an offset
+            # paginated listing meanwhile), next page url is only known
+            # once the current page is loaded so read one page ahead.
+            while page._next_href() is not None:
+                pending.append(pool.submit(page.next_page))
+                yield from items
+                page = pending.pop(0).result()
+                items = page._items
+            yield from items
+        except PaginationError:
+            pass
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def _next_href(self):
+        for link in self.links:
+            if link.rel.lower() == 'next':
+                return link.href
+        return None
+
     def _load(self, url):
         if self.resource is None:
             raise SbgError('Undefined collection resource.')
@@ -48,7 +130,7 @@ class Collection(list):
             data = response.json()
             total = response.headers['x-total-matching-query']
             items = [
-                self.resource(api=self._api, **group)
+                self.resource._listed(self._api, group)
                 for group in data['items']
             ]
             links = [Link(**link) for link in data['links']]
@@ -107,6 +189,12 @@ class VolumeCollection(Collection):
     def previous_page(self):
         raise PaginationError('Cannot paginate backwards')
 
+    def _next_href(self):
+        for link in self.links:
+            if link.next:
+                return link.next
+        return None
+
     def _load(self, url):
         if self.resource is None:
             raise SbgError('Undefined collection resource.')
@@ -114,7 +202,7 @@ class VolumeCollection(Collection):
             response = self._api.get(url, append_base=False)
             data = response.json()
             items = [
-                self.resource(api=self._api, **group) for group in
+                self.resource._listed(self._api, group) for group in
                 data['items']
             ]
             prefixes = [
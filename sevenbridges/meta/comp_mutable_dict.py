@@ -13,6 +13,7 @@ class CompoundMutableDict(dict):
 
     def __setitem__(self, key, value):
         super().__setitem__(key, value)
+        self._parent._ensure_old(self._name)
         if self._name not in self._parent._dirty:
             self._parent._dirty.update({self._name: {}})
         if key in self._parent._data[self._name]:
@@ -15,7 +15,7 @@ class Field:
 
     def __set__(self, instance, value):
         # using empty as sentinel, value can be only set once - first time
-        if self.read_only and instance._data[self.name] is not Field.EMPTY:
+        if self.read_only and instance._value(self.name) is not Field.EMPTY:
             raise ReadOnlyPropertyError(
                 f'Property {self.name} is marked as read only!'
             )
@@ -28,20 +28,19 @@ class Field:
                 raise ValidationError('Not a valid dictionary!')
 
         value = self.validate(value)
-        try:
-            current_value = instance._data[self.name]
-            if current_value == value:
-                return
-        except KeyError:
-            pass
+        if instance._value(self.name) == value:
+            return
         instance._dirty[self.name] = value
-        instance._data[self.name] = value
+        instance._set(self.name, value)
 
     def __get__(self, instance, cls):
         try:
-            data = instance._data[self.name]
+            data = instance._value(self.name)
+            if isinstance(data, (dict, list)):
+                # Value can be modified in place
+                instance._ensure_old(self.name)
             return data
-        except (KeyError, AttributeError):
+        except AttributeError:
             return None
 
     def validate(self, value):
@@ -59,7 +58,7 @@ class CompoundField(Field):
         self.cls = cls
 
     def __get__(self, instance, owner):
-        data = instance._data[self.name]
+        data = instance._value(self.name)
         # empty is used for read only fields, None all for others
         if data is not Field.EMPTY and data is not None:
             return self.cls(api=instance._api, _parent=instance, **data)
@@ -74,7 +73,7 @@ class CompoundListField(Field):
         self.cls = cls
 
     def __get__(self, instance, owner):
-        data = instance._data[self.name]
+        data = instance._value(self.name)
         # empty is used for read only fields, None for all others
         if data is not Field.EMPTY and data is not None:
             return [self.cls(api=instance._api, **item) for item in data]
@@ -4,13 +4,26 @@ from json import JSONDecodeError
 
 from sevenbridges.errors import SbgError, NonJSONResponseError
 from sevenbridges.meta.fields import Field
-from sevenbridges.meta.data import DataContainer
 from sevenbridges.meta.transformer import Transform
 from sevenbridges.models.enums import RequestParameters
 
 
 logger = logging.getLogger(__name__)
 
+# Marks fields which were missing when their snapshot was taken
+_MISSING = object()
+
+
+def _slots(cls):
+    """
+    Collects slot names declared on the class and its bases.
+    """
+    slots = set()
+    for klass in cls.__mro__:
+        declared = klass.__dict__.get('__slots__', ())
+        slots.update((declared,) if isinstance(declared, str) else declared)
+    return slots
+
 
 # noinspection PyProtectedMember
 class ResourceMeta(type):
@@ -22,8 +35,14 @@ class ResourceMeta(type):
 
     Creates constructors for all resources and manages instantiation of
     resource fields.
+
+    Resources with a generated constructor are slotted, their fields are
+    kept in a single dictionary per instance and the field table is shared
+    by all instances of the resource.
     """
 
+    INSTANCE_SLOTS = ('_api', '_data', '_fetched', '_changes', '_old')
+
     def __new__(mcs, name, bases, dct):
         # Attach fields object fo resource instance.
         fields = {}
@@ -38,19 +57,38 @@ class ResourceMeta(type):
         dct['_fields'] = fields
 
         if '__init__' not in dct:
+            # Instance state lives in slots, resources declare additional
+            # instance attributes in their own __slots__.
+            declared = dct.get('__slots__', ())
+            if isinstance(declared, str):
+                declared = (declared,)
+            dct['__slots__'] = tuple(declared) + tuple(
+                slot for slot in mcs.INSTANCE_SLOTS
+                if slot not in declared and
+                not any(slot in _slots(base) for base in bases)
+            )
+
             def init(self, **kwargs):
                 self._api = kwargs.pop('api', None)
-                urls = getattr(self, '_URL', None)
-                self._data = DataContainer(
-                    urls=urls, api=self._api, parent=self
-                )
-                self._dirty = {}
+                self._data = data = {}
+                self._fetched = False
+                self._changes = None
+                # Snapshot of the unmodified data is taken on first write
+                self._old = None
                 for key, value in kwargs.items():
                     if key in fields:
-                        validated_value = fields[key].validate(value)
-                        self._data[key] = validated_value
-
-                self._old = copy.deepcopy(self._data.data)
+                        data[key] = fields[key].validate(value)
+
+            def adopt(cls, api, data):
+                # Listing items are adopted as the resource data as they
+                # are, without validating or copying them.
+                self = cls.__new__(cls)
+                self._api = api
+                self._data = data
+                self._fetched = False
+                self._changes = None
+                self._old = None
+                return self
 
             def _data_diff(d1, d2):
                 data = {}
@@ -70,7 +108,8 @@ class ResourceMeta(type):
             # get modified data from the instance
             def modified_data(self):
                 metadata = copy.deepcopy(self._dirty.get('metadata'))
-                difference = _data_diff(self._old, self._data.data)
+                old = self._unmodified_data()
+                difference = _data_diff(old, self._data)
                 self._dirty.update(difference)
                 if metadata:
                     # File metadata specific patch, otherwise the diff will
@@ -99,7 +138,7 @@ class ResourceMeta(type):
 
                 # Clean dirty
                 self._dirty = {}
-                self._old = copy.deepcopy(self._data.data)
+                self._old = None
 
             def equals(self, other):
                 if not type(other) == type(self):
@@ -107,7 +146,7 @@ class ResourceMeta(type):
                 return self is other or self._data == other._data
 
             def deepcopy(self):
-                return type(self)(api=self._api, **self._data.data)
+                return type(self)(api=self._api, **self._data)
 
             if '__str__' not in dct:
                 dct['__str__'] = lambda self: type(self).__name__
@@ -115,6 +154,7 @@ class ResourceMeta(type):
                 dct['__repr__'] = lambda self: str(self)
 
             dct['__init__'] = init
+            dct['_adopt'] = classmethod(adopt)
             dct['equals'] = equals
             dct['deepcopy'] = deepcopy
             dct['_modified_data'] = modified_data
@@ -136,12 +176,27 @@ class Resource(metaclass=ResourceMeta):
     of magic of injecting instance of API and common operations (like generic
     query).
     """
+    __slots__ = ()
+
     _API = None
     _URL = {}
 
     def __init__(self, api, *args, **kwargs):
         self.api = api
 
+    @property
+    def _dirty(self):
+        # Most resources are never modified, the dictionary holding
+        # modifications is allocated on first use.
+        changes = getattr(self, '_changes', None)
+        if changes is None:
+            changes = self._changes = {}
+        return changes
+
+    @_dirty.setter
+    def _dirty(self, value):
+        self._changes = value
+
     @classmethod
     def _query(cls, **kwargs):
         """
@@ -171,7 +226,7 @@ class Resource(metaclass=ResourceMeta):
 
         total = response.headers['x-total-matching-query']
 
-        items = [cls(api=api, **item) for item in data['items']]
+        items = [cls._listed(api, item) for item in data['items']]
         links = [Link(**link) for link in data['links']]
         href = data['href']
         return Collection(
@@ -179,6 +234,20 @@ class Resource(metaclass=ResourceMeta):
             links=links, api=api
         )
 
+    @classmethod
+    def _listed(cls, api, item):
+        """
+        Builds the resource from an item of a listing page. With lazy
+        listings enabled the raw item becomes the resource data, fields
+        are only converted when they are read.
+        :param api: sevenbridges Api instance.
+        :param item: Raw listing item.
+        :return: Resource object.
+        """
+        if getattr(api, 'lazy_listings', False) and '_adopt' in vars(cls):
+            return cls._adopt(api, item)
+        return cls(api=api, **item)
+
     @classmethod
     def get(cls, id, api=None):
         """
@@ -189,6 +258,9 @@ class Resource(metaclass=ResourceMeta):
         """
         id = Transform.to_resource(id)
         api = api if api else cls._API
+        coalescer = getattr(api, 'coalescer', None)
+        if coalescer is not None and 'bulk_get' in cls._URL:
+            return coalescer.get(cls, id)
         if 'get' in cls._URL:
             extra = {'resource': cls.__name__, 'query': {'id': id}}
             logger.info('Fetching %s resource', cls, extra=extra)
@@ -236,12 +308,113 @@ class Resource(metaclass=ResourceMeta):
             )
 
         self._data = resource._data
+        self._fetched = resource._fetched
         self._dirty = resource._dirty
         self.update_old()
         return self
 
     def update_old(self):
-        self._old = copy.deepcopy(self._data.data)
+        # Marks the current data as unmodified, snapshots of single fields
+        # are taken lazily by _ensure_old.
+        self._old = None
+
+    def _ensure_old(self, name):
+        """
+        Takes the copy-on-write snapshot of the unmodified field value. Has
+        to be called before the field is modified or handed out for in
+        place modification, only fields which can actually change are
+        copied.
+        :param name: Field name
+        """
+        old = getattr(self, '_old', None)
+        if old is None:
+            old = self._old = {}
+        if name not in old:
+            value = self._data.get(name, _MISSING)
+            if isinstance(value, (dict, list)):
+                value = copy.deepcopy(value)
+            old[name] = value
+
+    def _unmodified_data(self):
+        """
+        Returns the resource data as it was before it was modified.
+        """
+        if not self._old:
+            return self._data
+        data = dict(self._data)
+        for key, value in self._old.items():
+            if value is _MISSING:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        return data
+
+    def _fetch(self, item=None):
+        """
+        Fetches the resource from the server, using the coalescer, the
+        href or the resource identifier.
+        :param item: Name of the missing field which triggered the fetch.
+        """
+        logger.debug(
+            'Property "%s" is not set, fetching resource from server', item
+        ) if item else logger.debug(
+            'Requested property is not set, fetching resource from server',
+        )
+
+        api = self._api
+        urls = getattr(self, '_URL', None)
+        href = self._data.get('href', None)
+        headers = dict(api.headers)
+        coalescer = getattr(api, 'coalescer', None)
+
+        if (
+                coalescer is not None and self._data.get('id') and
+                urls is not None and 'bulk_get' in urls
+        ):
+            resource = coalescer.get(type(self), self._data['id'])
+            self._data = resource._data
+            logger.debug('Resource fetched in a coalesced bulk request.')
+        elif href:
+            self._data = api.get(
+                href,
+                headers=headers,
+                append_base=False
+            ).json()
+            logger.debug('Resource fetched using the "href" property.')
+        elif urls is not None and 'get' in urls:
+            resource_id = self._data.get('id', None)
+            if resource_id is None:
+                logger.debug(
+                    'Failed to fetch resource, "id" or "href" property '
+                    'not set'
+                )
+                return
+            self._data = api.get(
+                urls['get'].format(id=resource_id),
+                headers=headers,
+                append_base=True
+            ).json()
+
+            logger.debug('Resource fetched using the id property.')
+        else:
+            logger.debug(
+                'Skipping resource fetch, retrieval for this resource is '
+                'not available.'
+            )
+            return
+        self.update_old()
+        self._fetched = True
+
+    def _value(self, name):
+        """
+        Returns the field value, fetching the resource once if the field
+        is missing.
+        :param name: Field name
+        :return: Field value or None
+        """
+        if name not in self._data and not self._fetched:
+            self._fetch(item=name)
+        return self._data.get(name)
 
     def field(self, name):
         """
@@ -249,7 +422,10 @@ class Resource(metaclass=ResourceMeta):
         :param name: Field name
         :return: Field value or None
         """
-        return self._data.data.get(name, None)
+        value = self._data.get(name, None)
+        if isinstance(value, (dict, list)):
+            self._ensure_old(name)
+        return value
 
     def _set(self, key, value):
         """
@@ -257,4 +433,5 @@ class Resource(metaclass=ResourceMeta):
         :param key: Property name
         :param value: Property value
         """
-        self._data.data[key] = value
+        self._ensure_old(key)
+        self._data[key] = value
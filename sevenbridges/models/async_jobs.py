@@ -1,5 +1,6 @@
 import logging
 
+from sevenbridges.meta.bulk import bulk_execute
 from sevenbridges.meta.resource import Resource
 from sevenbridges.models.file import FileBulkRecord
 from sevenbridges.meta.transformer import Transform
@@ -138,31 +139,59 @@ class AsyncJob(Resource):
         )
 
     @classmethod
-    def file_bulk_copy(cls, files, api=None):
+    def file_bulk_copy(cls, files, api=None, chunked=False):
+        """
+        Submits async job for copying files in bulk.
+        :param files: List of items describing files.
+        :param api: Api instance.
+        :param chunked: Split lists longer than the bulk limit and submit a
+            job for every chunk.
+        :return: AsyncJob object, or a list of AsyncJob objects if chunked.
+        """
         api = api or cls._API
-        data = {'items': files}
         logger.info('Submitting async job for copying files in bulk')
-        response = api.post(
-            url=cls._URL['bulk_copy_files'], data=data
-        ).json()
-        return AsyncJob(api=api, **response)
+        return cls._submit_jobs(
+            cls._URL['bulk_copy_files'], files, chunked, api
+        )
 
     @classmethod
-    def file_bulk_move(cls, files, api=None):
+    def file_bulk_move(cls, files, api=None, chunked=False):
+        """
+        Submits async job for moving files in bulk.
+        :param files: List of items describing files.
+        :param api: Api instance.
+        :param chunked: Split lists longer than the bulk limit and submit a
+            job for every chunk.
+        :return: AsyncJob object, or a list of AsyncJob objects if chunked.
+        """
         api = api or cls._API
-        data = {'items': files}
         logger.info('Submitting async job for moving files in bulk')
-        response = api.post(
-            url=cls._URL['bulk_move_files'], data=data
-        ).json()
-        return AsyncJob(api=api, **response)
+        return cls._submit_jobs(
+            cls._URL['bulk_move_files'], files, chunked, api
+        )
 
     @classmethod
-    def file_bulk_delete(cls, files, api=None):
+    def file_bulk_delete(cls, files, api=None, chunked=False):
+        """
+        Submits async job for deleting files in bulk.
+        :param files: List of items describing files.
+        :param api: Api instance.
+        :param chunked: Split lists longer than the bulk limit and submit a
+            job for every chunk.
+        :return: AsyncJob object, or a list of AsyncJob objects if chunked.
+        """
         api = api or cls._API
-        data = {'items': files}
         logger.info('Submitting async job for deleting files in bulk')
-        response = api.post(
-            url=cls._URL['bulk_delete_files'], data=data
-        ).json()
-        return AsyncJob(api=api, **response)
+        return cls._submit_jobs(
+            cls._URL['bulk_delete_files'], files, chunked, api
+        )
+
+    @classmethod
+    def _submit_jobs(cls, url, files, chunked, api):
+        def request(chunk):
+            response = api.post(url=url, data={'items': chunk}).json()
+            return [AsyncJob(api=api, **response)]
+
+        if chunked:
+            return bulk_execute(request, files, idempotent=False)
+        return request(files)[0]
@@ -17,6 +17,7 @@ class BatchBy(Resource, dict):
 
     def __setitem__(self, key, value):
         super().__setitem__(key, value)
+        self.parent._ensure_old(self._name)
         self.parent._data[self._name][key] = value
         if self._name not in self.parent._dirty:
             self.parent._dirty.update({self._name: {}})
@@ -4,6 +4,7 @@ class RequestParameters:
     DEFAULT_RETRY_COUNT = 6
     DEFAULT_BACKOFF_FACTOR = 1
     DEFAULT_BULK_LIMIT = 100
+    DEFAULT_BULK_WORKERS = 4
 
 
 class PartSize:
@@ -16,8 +17,10 @@ class PartSize:
     MAXIMUM_TOTAL_PARTS = 10000
 
     DOWNLOAD_MINIMUM_PART_SIZE = 5 * MB
+    DOWNLOAD_MAXIMUM_PART_SIZE = 1 * GB
     UPLOAD_MINIMUM_PART_SIZE = 5 * MB
     UPLOAD_RECOMMENDED_SIZE = 32 * MB
+    DOWNLOAD_BUFFER_SIZE = 1 * MB
 
 
 class TransferState:
@@ -28,6 +31,7 @@ class TransferState:
     PREPARING = 'PREPARING'
     STOPPED = 'STOPPED'
     FAILED = 'FAILED'
+    SKIPPED = 'SKIPPED'
 
 
 class VolumeType:
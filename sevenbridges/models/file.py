@@ -1,10 +1,14 @@
+import functools
 import logging
 import os
 import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 from sevenbridges.decorators import inplace_reload
 from sevenbridges.errors import (
     SbgError,
+    PaginationError,
     ResourceNotModified,
     LocalFileAlreadyExists
 )
@@ -12,6 +16,7 @@ from sevenbridges.meta.fields import (
     HrefField, StringField, IntegerField, CompoundField, DateTimeField,
     BasicListField
 )
+from sevenbridges.meta.bulk import bulk_execute
 from sevenbridges.meta.resource import Resource
 from sevenbridges.meta.transformer import Transform
 from sevenbridges.models.bulk import BulkRecord
@@ -19,9 +24,13 @@ from sevenbridges.models.compound.files.download_info import DownloadInfo
 from sevenbridges.models.compound.files.file_origin import FileOrigin
 from sevenbridges.models.compound.files.file_storage import FileStorage
 from sevenbridges.models.compound.files.metadata import Metadata
-from sevenbridges.models.enums import PartSize, RequestParameters
+from sevenbridges.models.enums import (
+    PartSize, RequestParameters, TransferState
+)
 from sevenbridges.transfer.download import Download
-from sevenbridges.transfer.upload import Upload
+from sevenbridges.transfer.stream import RemoteFile
+from sevenbridges.transfer.upload import StreamUpload, Upload
+from sevenbridges.transfer.utils import TransferResult, bandwidth_bucket
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +39,9 @@ class File(Resource):
     """
     Central resource for managing files.
     """
+    # Set when the metadata is replaced instead of patched
+    __slots__ = ('_overwrite_metadata',)
+
     FOLDER_TYPE = 'folder'
 
     _URL = {
@@ -177,7 +189,8 @@ class File(Resource):
     def upload(cls, path, project=None, parent=None, file_name=None,
                overwrite=False, retry=RequestParameters.DEFAULT_RETRY_COUNT,
                timeout=RequestParameters.DEFAULT_TIMEOUT, part_size=None,
-               wait=True, api=None):
+               wait=True, api=None, window=None, journal=None,
+               checksums=False, verify=False):
         """
         Uploads a file using multipart upload and returns an upload handle
         if the wait parameter is set to False. If wait is set to True it
@@ -190,9 +203,16 @@ class File(Resource):
         :param overwrite: If true will overwrite the file on the server.
         :param retry:  Number of retries if error occurs during upload.
         :param timeout:  Timeout for http requests.
-        :param part_size:  Part size in bytes.
+        :param part_size:  Part size in bytes or PartSizePolicy.
         :param wait:  If true will wait for upload to complete.
         :param api: Api instance.
+        :param window: Number of parts uploaded in parallel.
+        :param journal: Optional journal file path, an interrupted upload
+            started with the same journal is resumed.
+        :param checksums: Compute checksums while uploading, available as
+            upload.digest.
+        :param verify: Compute checksums and retry parts whose ETag does
+            not match their MD5.
         """
 
         api = api or cls._API
@@ -225,7 +245,8 @@ class File(Resource):
         upload = Upload(
             file_path=path, project=project, parent=parent,
             file_name=file_name, overwrite=overwrite, retry_count=retry,
-            timeout=timeout, part_size=part_size, api=api
+            timeout=timeout, part_size=part_size, api=api, window=window,
+            journal=journal, checksums=checksums, verify=verify
         )
         if wait:
             upload.start()
@@ -234,6 +255,204 @@ class File(Resource):
         else:
             return upload
 
+    @classmethod
+    def upload_stream(cls, source, name, project=None, parent=None,
+                      size=None, overwrite=False,
+                      retry=RequestParameters.DEFAULT_RETRY_COUNT,
+                      timeout=RequestParameters.DEFAULT_TIMEOUT,
+                      part_size=None, wait=True, api=None, window=None,
+                      checksums=False, verify=False, max_memory=None):
+        """
+        Uploads a stream which is read only once, like a pipe, stdin or a
+        generator, without staging it on the disk. Parts are read into a
+        window of reused buffers, so memory use is window times part size.
+
+        :param source: Binary file object or iterable of bytes chunks.
+        :param name: File name.
+        :param project: Project identifier
+        :param parent: Parent folder identifier
+        :param size: Stream size in bytes, if known.
+        :param overwrite: If true will overwrite the file on the server.
+        :param retry:  Number of retries if error occurs during upload.
+        :param timeout:  Timeout for http requests.
+        :param part_size:  Part size in bytes or PartSizePolicy. Streams of
+            unknown size default to parts fitting into max_memory.
+        :param wait:  If true will wait for upload to complete.
+        :param api: Api instance.
+        :param window: Number of parts uploaded in parallel.
+        :param checksums: Compute checksums while uploading, available as
+            upload.digest.
+        :param verify: Compute checksums and retry parts whose ETag does
+            not match their MD5.
+        :param max_memory: Memory in bytes for the part buffers of a stream
+            of unknown size, 512 MiB by default.
+        """
+        api = api or cls._API
+        extra = {'resource': cls.__name__, 'query': {
+            'name': name,
+            'project': project,
+            'parent': parent,
+            'size': size,
+            'overwrite': overwrite,
+            'part_size': part_size,
+            'wait': wait,
+        }}
+        logger.info('Uploading stream', extra=extra)
+
+        if project:
+            project = Transform.to_project(project)
+
+        if parent:
+            parent = Transform.to_file(parent)
+
+        upload = StreamUpload(
+            source, name, project=project, parent=parent, size=size,
+            overwrite=overwrite, retry_count=retry, timeout=timeout,
+            part_size=part_size, api=api, window=window,
+            checksums=checksums, verify=verify, max_memory=max_memory
+        )
+        if wait:
+            upload.start()
+            upload.wait()
+        return upload
+
+    @classmethod
+    def upload_directory(cls, path, project=None, parent=None,
+                         overwrite=False, part_size=None, priority=0,
+                         api=None):
+        """
+        Uploads a local directory, its subdirectories are mirrored as
+        folders. Every destination folder is listed once and files which
+        exist there with the same name and size are skipped. Files are
+        uploaded through the transfer manager of the api, every upload is
+        created once a transfer worker takes it. Symbolic links are
+        followed, a directory reached again through a link is skipped.
+
+        :param path: Local directory path.
+        :param project: Project identifier
+        :param parent: Parent folder identifier
+        :param overwrite: If true remote files of a different size are
+            overwritten.
+        :param part_size: Part size in bytes or PartSizePolicy.
+        :param priority: Priority of the uploads in the transfer manager.
+        :param api: Api instance.
+        :return: List of TransferResult, one for each local file.
+        """
+        api = api or cls._API
+
+        if not project and not parent:
+            raise SbgError('A project or parent identifier is required.')
+        if project and parent:
+            raise SbgError(
+                'Project and parent identifiers are mutually exclusive.'
+            )
+        if not os.path.isdir(path):
+            raise SbgError(f'Path {path} is not a directory.')
+
+        project = Transform.to_project(project) if project else None
+        parent = Transform.to_file(parent) if parent else None
+        logger.info('Uploading directory', extra={
+            'resource': cls.__name__, 'query': {
+                'path': path, 'project': project, 'parent': parent,
+            }
+        })
+
+        def listing(item):
+            _, destination, created = item
+            if created:
+                return {}
+            children = {}
+            page = cls.query(
+                api=api, limit=RequestParameters.DEFAULT_BULK_LIMIT,
+                **destination
+            )
+            while True:
+                children.update((file_.name, file_) for file_ in page)
+                try:
+                    page = page.next_page()
+                except PaginationError:
+                    return children
+
+        def create(item):
+            name, destination = item
+            return cls.create_folder(name, api=api, **destination)
+
+        results, uploads = [], []
+        level = [(path, {'project': project} if project else {
+            'parent': parent
+        }, False)]
+        root = os.stat(path)
+        visited = {(root.st_dev, root.st_ino)}
+        with ThreadPoolExecutor(
+                max_workers=RequestParameters.DEFAULT_BULK_WORKERS
+        ) as executor:
+            while level:
+                # Folders of one level are listed and created concurrently,
+                # folders created by the upload are known to be empty
+                listings = executor.map(listing, level)
+                missing, next_level = [], []
+                for (directory, destination, _), remote in zip(
+                        level, listings
+                ):
+                    for entry in sorted(os.scandir(directory),
+                                        key=lambda e: e.name):
+                        existing = remote.get(entry.name)
+                        if entry.is_dir():
+                            stat = entry.stat()
+                            if (stat.st_dev, stat.st_ino) in visited:
+                                logger.warning(
+                                    'Skipping %s, directory already '
+                                    'uploaded.', entry.path
+                                )
+                                continue
+                            visited.add((stat.st_dev, stat.st_ino))
+                            if existing is not None and existing.is_folder():
+                                next_level.append((
+                                    entry.path, {'parent': existing.id}, False
+                                ))
+                            else:
+                                missing.append((entry, destination))
+                        elif entry.is_file():
+                            size = entry.stat().st_size
+                            if (
+                                    existing is not None and
+                                    not existing.is_folder() and
+                                    existing.size == size
+                            ):
+                                results.append(TransferResult(
+                                    entry.path, TransferState.SKIPPED,
+                                    existing, None
+                                ))
+                                continue
+                            upload = functools.partial(
+                                Upload, entry.path, overwrite=overwrite,
+                                part_size=part_size, api=api, **destination
+                            )
+                            uploads.append((entry.path, api.transfers.submit(
+                                upload, priority=priority, size=size
+                            )))
+
+                folders = executor.map(create, [
+                    (entry.name, destination) for entry, destination in missing
+                ])
+                for (entry, _), folder in zip(missing, folders):
+                    next_level.append(
+                        (entry.path, {'parent': folder.id}, True)
+                    )
+                level = next_level
+
+        for file_path, future in uploads:
+            try:
+                upload = future.result()
+                results.append(TransferResult(
+                    file_path, TransferState.COMPLETED, upload.result(), None
+                ))
+            except Exception as e:
+                results.append(TransferResult(
+                    file_path, TransferState.FAILED, None, e
+                ))
+        return sorted(results, key=lambda result: result.path)
+
     def copy(self, project, name=None):
         """
         Copies the current file.
@@ -267,16 +486,26 @@ class File(Resource):
 
     def download(self, path, retry=RequestParameters.DEFAULT_RETRY_COUNT,
                  timeout=RequestParameters.DEFAULT_TIMEOUT, chunk_size=None,
-                 wait=True, overwrite=False):
+                 wait=True, overwrite=False, window=None, resume=False,
+                 buffer_size=PartSize.DOWNLOAD_BUFFER_SIZE, checksums=False,
+                 verify=False):
         """
         Downloads the file and returns a download handle.
         Download will not start until .start() method is invoked.
         :param path: Full path to the new file.
         :param retry:  Number of retries if error occurs during download.
         :param timeout:  Timeout for http requests.
-        :param chunk_size:  Chunk size in bytes.
+        :param chunk_size:  Chunk size in bytes or PartSizePolicy.
         :param wait: If true will wait for download to complete.
         :param overwrite: If True will silently overwrite existing file.
+        :param window: Number of parts downloaded in parallel.
+        :param resume: If true an interrupted download of the file to the
+            same path continues from its .partial file.
+        :param buffer_size: Size of the buffered writes to the file.
+        :param checksums: Compute checksums while downloading, available as
+            download.digest.
+        :param verify: Compute checksums and fail the download if they do
+            not match the ones reported by storage.
         :return: Download handle.
         """
 
@@ -296,13 +525,196 @@ class File(Resource):
         info = self.download_info()
         download = Download(
             url=info.url, file_path=path, retry_count=retry, timeout=timeout,
-            part_size=chunk_size, api=self._api
+            part_size=chunk_size, api=self._api, window=window, resume=resume,
+            buffer_size=buffer_size, checksums=checksums, verify=verify,
+            refresh_url=lambda: self.download_info().url
         )
         if wait:
             download.start()
             download.wait()
-        else:
-            return download
+        return download
+
+    def download_folder(self, path, overwrite=False, chunk_size=None,
+                        priority=0):
+        """
+        Downloads the folder contents recursively into a local directory,
+        keeping the folder layout.
+        :param path: Local directory path.
+        :param overwrite: If true local files of a different size are
+            overwritten.
+        :param chunk_size: Chunk size in bytes or PartSizePolicy.
+        :param priority: Priority of the downloads in the transfer manager.
+        :return: List of TransferResult, one for each file.
+        """
+        if not self.is_folder():
+            raise SbgError(f'{self.name} is not a folder')
+        return self._download_all(
+            self._api, [(self, path)], overwrite=overwrite,
+            chunk_size=chunk_size, priority=priority
+        )
+
+    @classmethod
+    def download_files(cls, files, path, overwrite=False, chunk_size=None,
+                       priority=0, api=None):
+        """
+        Downloads files and folders into a local directory, folders are
+        downloaded recursively keeping their layout. File details are
+        fetched in bulk and local files of the same size are skipped.
+        Files with the same name are downloaded into subdirectories named
+        by their id. Downloads run on the transfer manager of the api.
+        :param files: Files or file identifiers.
+        :param path: Local directory path.
+        :param overwrite: If true local files of a different size are
+            overwritten.
+        :param chunk_size: Chunk size in bytes or PartSizePolicy.
+        :param priority: Priority of the downloads in the transfer manager.
+        :param api: Api instance.
+        :return: List of TransferResult, one for each file.
+        """
+        return cls._download_groups(
+            api or cls._API, {'': files}, path, overwrite=overwrite,
+            chunk_size=chunk_size, priority=priority
+        )
+
+    @classmethod
+    def _download_groups(cls, api, groups, path, overwrite, chunk_size,
+                         priority):
+        """
+        Downloads groups of files into a local directory. If names of the
+        files collide, every group is downloaded into a subdirectory named
+        by the group, and files whose names still collide into
+        subdirectories named by their id.
+        """
+        group_of = {}
+        for group, files in groups.items():
+            for file_ in files:
+                group_of.setdefault(Transform.to_file(file_), group)
+        file_ids = list(group_of)
+
+        results, found = [], []
+        records = cls.bulk_get(file_ids, api=api) if file_ids else []
+        for file_id, record in zip(file_ids, records):
+            if record.valid:
+                found.append((record.resource, group_of[file_id]))
+            else:
+                results.append(TransferResult(
+                    None, TransferState.FAILED, None,
+                    SbgError(f'File {file_id}: {record.error.message}')
+                ))
+
+        names = [file_.name for file_, _ in found]
+        grouped = len(groups) > 1 and len(set(names)) < len(names)
+        targets = [
+            (file_, os.path.join(path, group if grouped else '', file_.name))
+            for file_, group in found
+        ]
+        return results + cls._download_all(
+            api, cls._unique_targets(targets), overwrite=overwrite,
+            chunk_size=chunk_size, priority=priority
+        )
+
+    @staticmethod
+    def _unique_targets(targets):
+        """
+        Moves files paired with the same local path into subdirectories
+        named by their id.
+        """
+        paths = Counter(
+            os.path.normcase(file_path) for _, file_path in targets
+        )
+        unique = []
+        for file_, file_path in targets:
+            if paths[os.path.normcase(file_path)] > 1:
+                logger.warning(
+                    'Downloading %s into a subdirectory named by its id, '
+                    'another file has the same name.', file_path
+                )
+                file_path = os.path.join(
+                    os.path.dirname(file_path), file_.id,
+                    os.path.basename(file_path)
+                )
+            unique.append((file_, file_path))
+        return unique
+
+    @classmethod
+    def _download_all(cls, api, targets, overwrite, chunk_size, priority):
+        """
+        Downloads files to the paired local paths, folders are listed level
+        by level and their files are downloaded into a local directory.
+        """
+        def listing(item):
+            folder, directory = item
+            children = []
+            page = folder.list_files(
+                limit=RequestParameters.DEFAULT_BULK_LIMIT, api=api
+            )
+            while True:
+                children.extend(
+                    (file_, os.path.join(directory, file_.name))
+                    for file_ in page
+                )
+                try:
+                    page = page.next_page()
+                except PaginationError:
+                    return children
+
+        def prepare(file_, file_path):
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+            return file_.download(
+                file_path, overwrite=True, wait=False, chunk_size=chunk_size
+            )
+
+        results, files = [], []
+        with ThreadPoolExecutor(
+                max_workers=RequestParameters.DEFAULT_BULK_WORKERS
+        ) as executor:
+            level = targets
+            while level:
+                folders = [item for item in level if item[0].is_folder()]
+                for folder, directory in folders:
+                    os.makedirs(directory, exist_ok=True)
+                files.extend(
+                    item for item in level if not item[0].is_folder()
+                )
+                level = [
+                    child for children in executor.map(listing, folders)
+                    for child in children
+                ]
+
+        # Downloads are created by the transfer manager once it starts them,
+        # queued files hold no download urls or sessions
+        downloads = []
+        for file_, file_path in files:
+            if os.path.isfile(file_path):
+                if os.path.getsize(file_path) == file_.size:
+                    results.append(TransferResult(
+                        file_path, TransferState.SKIPPED, file_, None
+                    ))
+                    continue
+                if not overwrite:
+                    results.append(TransferResult(
+                        file_path, TransferState.FAILED, file_,
+                        LocalFileAlreadyExists(message=file_path)
+                    ))
+                    continue
+            try:
+                downloads.append((file_, file_path, api.transfers.submit(
+                    functools.partial(prepare, file_, file_path),
+                    priority=priority, size=file_.size or 0
+                )))
+            except Exception as e:
+                results.append(TransferResult(
+                    file_path, TransferState.FAILED, file_, e
+                ))
+
+        for file_, file_path, future in downloads:
+            error = future.exception()
+            results.append(TransferResult(
+                file_path,
+                TransferState.FAILED if error else TransferState.COMPLETED,
+                file_, error
+            ))
+        return sorted(results, key=lambda result: result.path or '')
 
     @inplace_reload
     def save(self, inplace=True, silent=False):
@@ -355,17 +767,61 @@ class File(Resource):
 
         return self if not reload else self.reload()
 
-    def stream(self, part_size=32 * PartSize.KB):
+    def open(self, mode='rb', block_size=PartSize.MB, cache_blocks=64,
+             read_ahead=4, retry=RequestParameters.DEFAULT_RETRY_COUNT,
+             timeout=RequestParameters.DEFAULT_TIMEOUT, sequential=False):
+        """
+        Opens the file for random access reads served by range requests.
+        :param mode: Only 'rb' is supported.
+        :param block_size: Size of the cached blocks.
+        :param cache_blocks: Maximum number of blocks kept in the cache.
+        :param read_ahead: Number of blocks fetched ahead of sequential
+            reads, 0 disables read ahead.
+        :param retry: Number of retries if error occurs during a read.
+        :param timeout: Timeout for http requests.
+        :param sequential: Read ahead from the first read.
+        :return: RemoteFile, a seekable raw binary file object.
+        """
+        if mode != 'rb':
+            raise SbgError(f'Unsupported mode {mode}, only rb is supported.')
+        if self.is_folder():
+            raise SbgError(f'{self.name} is a folder')
+        return RemoteFile(
+            url=self.download_info().url, size=self.size, api=self._api,
+            block_size=block_size, cache_blocks=cache_blocks,
+            read_ahead=read_ahead, retry=retry, timeout=timeout,
+            refresh_url=lambda: self.download_info().url, name=self.name,
+            sequential=sequential
+        )
+
+    def stream(self, part_size=32 * PartSize.KB, window=None,
+               range_size=8 * PartSize.MB):
         """
         Creates an iterator which can be used to stream the file content.
         :param part_size: Size of the part in bytes. Default 32KB
+        :param window: Number of ranges fetched in parallel ahead of the
+            consumer, by default the file is streamed over one connection.
+        :param range_size: Size of the ranges fetched in parallel, memory
+            used by the stream is capped at window + 1 ranges.
+        Reads are limited by the download bandwidth limit of the Api.
         :return Iterator
         """
+        if window:
+            with self.open(
+                    block_size=range_size, cache_blocks=window + 1,
+                    read_ahead=window, sequential=True
+            ) as fp:
+                yield from iter(lambda: fp.read(part_size), b'')
+            return
+
         download_info = self.download_info()
         response = self._api.get(
             url=download_info.url, stream=True, append_base=False
         )
+        bandwidth = bandwidth_bucket(self._api, 'download')
         for part in response.iter_content(part_size):
+            if bandwidth is not None:
+                bandwidth.consume(len(part))
             yield part
 
     def reload(self):
@@ -415,11 +871,15 @@ class File(Resource):
         """
         api = api or cls._API
         file_ids = [Transform.to_file(file_) for file_ in files]
-        data = {'file_ids': file_ids}
+
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_get'], data={'file_ids': chunk}
+            )
+            return FileBulkRecord.parse_records(response=response, api=api)
 
         logger.debug('Getting files in bulk.')
-        response = api.post(url=cls._URL['bulk_get'], data=data)
-        return FileBulkRecord.parse_records(response=response, api=api)
+        return bulk_execute(request, file_ids)
 
     @classmethod
     def bulk_delete(cls, files, api=None):
@@ -431,11 +891,15 @@ class File(Resource):
         """
         api = api or cls._API
         file_ids = [Transform.to_file(file_) for file_ in files]
-        data = {'file_ids': file_ids}
+
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_delete'], data={'file_ids': chunk}
+            )
+            return FileBulkRecord.parse_records(response=response, api=api)
 
         logger.debug('Deleting files in bulk.')
-        response = api.post(url=cls._URL['bulk_delete'], data=data)
-        return FileBulkRecord.parse_records(response=response, api=api)
+        return bulk_execute(request, file_ids)
 
     @classmethod
     def bulk_update(cls, files, api=None):
@@ -453,21 +917,24 @@ class File(Resource):
             raise SbgError('Files are required.')
 
         api = api or cls._API
-        data = {
-            'items': [
-                {
-                    'id': file_.id,
-                    'name': file_.name,
-                    'tags': file_.tags,
-                    'metadata': file_.metadata,
-                }
-                for file_ in files
-            ]
-        }
+        items = [
+            {
+                'id': file_.id,
+                'name': file_.name,
+                'tags': file_.tags,
+                'metadata': file_.metadata,
+            }
+            for file_ in files
+        ]
+
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_update'], data={'items': chunk}
+            )
+            return FileBulkRecord.parse_records(response=response, api=api)
 
         logger.debug('Updating files in bulk.')
-        response = api.post(url=cls._URL['bulk_update'], data=data)
-        return FileBulkRecord.parse_records(response=response, api=api)
+        return bulk_execute(request, items)
 
     @classmethod
     def bulk_edit(cls, files, api=None):
@@ -485,21 +952,24 @@ class File(Resource):
             raise SbgError('Files are required.')
 
         api = api or cls._API
-        data = {
-            'items': [
-                {
-                    'id': file_.id,
-                    'name': file_.name,
-                    'tags': file_.tags,
-                    'metadata': file_.metadata,
-                }
-                for file_ in files
-            ]
-        }
+        items = [
+            {
+                'id': file_.id,
+                'name': file_.name,
+                'tags': file_.tags,
+                'metadata': file_.metadata,
+            }
+            for file_ in files
+        ]
+
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_edit'], data={'items': chunk}
+            )
+            return FileBulkRecord.parse_records(response=response, api=api)
 
         logger.debug('Editing files in bulk.')
-        response = api.post(url=cls._URL['bulk_edit'], data=data)
-        return FileBulkRecord.parse_records(response=response, api=api)
+        return bulk_execute(request, items)
 
     def list_files(self, offset=None, limit=None, api=None, cont_token=None):
         """List files in a folder
@@ -5,6 +5,7 @@ from sevenbridges.meta.fields import (
     HrefField, StringField, CompoundField, DateTimeField, BooleanField,
     DictField
 )
+from sevenbridges.meta.bulk import bulk_execute
 from sevenbridges.meta.resource import Resource
 from sevenbridges.meta.transformer import Transform
 from sevenbridges.models.bulk import BulkRecord
@@ -146,10 +147,14 @@ class Export(Resource):
         """
         api = api or cls._API
         export_ids = [Transform.to_export(export) for export in exports]
-        data = {'export_ids': export_ids}
 
-        response = api.post(url=cls._URL['bulk_get'], data=data)
-        return ExportBulkRecord.parse_records(response=response, api=api)
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_get'], data={'export_ids': chunk}
+            )
+            return ExportBulkRecord.parse_records(response=response, api=api)
+
+        return bulk_execute(request, export_ids)
 
     @classmethod
     def bulk_submit(cls, exports, copy_only=False, api=None):
@@ -187,13 +192,16 @@ class Export(Resource):
 
             items.append(item)
 
-        data = {'items': items}
         params = {'copy_only': copy_only}
 
-        response = api.post(
-            url=cls._URL['bulk_create'], params=params, data=data
-        )
-        return ExportBulkRecord.parse_records(response=response, api=api)
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_create'], params=params,
+                data={'items': chunk}
+            )
+            return ExportBulkRecord.parse_records(response=response, api=api)
+
+        return bulk_execute(request, items, idempotent=False)
 
 
 class ExportBulkRecord(BulkRecord):
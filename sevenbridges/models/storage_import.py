@@ -5,6 +5,7 @@ from sevenbridges.meta.fields import (
     HrefField, StringField, CompoundField, DateTimeField, BooleanField,
     DictField
 )
+from sevenbridges.meta.bulk import bulk_execute
 from sevenbridges.meta.resource import Resource
 from sevenbridges.meta.transformer import Transform
 from sevenbridges.models.bulk import BulkRecord
@@ -167,10 +168,14 @@ class Import(Resource):
         """
         api = api or cls._API
         import_ids = [Transform.to_import(import_) for import_ in imports]
-        data = {'import_ids': import_ids}
 
-        response = api.post(url=cls._URL['bulk_get'], data=data)
-        return ImportBulkRecord.parse_records(response=response, api=api)
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_get'], data={'import_ids': chunk}
+            )
+            return ImportBulkRecord.parse_records(response=response, api=api)
+
+        return bulk_execute(request, import_ids)
 
     @classmethod
     def bulk_submit(cls, imports, api=None):
@@ -233,9 +238,13 @@ class Import(Resource):
                 )
             items.append(import_config)
 
-        data = {'items': items}
-        response = api.post(url=cls._URL['bulk_create'], data=data)
-        return ImportBulkRecord.parse_records(response=response, api=api)
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_create'], data={'items': chunk}
+            )
+            return ImportBulkRecord.parse_records(response=response, api=api)
+
+        return bulk_execute(request, items, idempotent=False)
 
 
 class ImportBulkRecord(BulkRecord):
@@ -12,6 +12,7 @@ from sevenbridges.meta.fields import (
     CompoundField, DateTimeField,
     BooleanField, DictField
 )
+from sevenbridges.meta.bulk import bulk_execute
 from sevenbridges.meta.resource import Resource
 from sevenbridges.meta.transformer import Transform
 
@@ -408,6 +409,37 @@ class Task(Resource):
             api=api,
         )
 
+    def download_outputs(self, path, overwrite=False, chunk_size=None,
+                         priority=0):
+        """
+        Downloads all output files of the task into a local directory,
+        together with their secondary files. Output folders are downloaded
+        recursively. If outputs have the same name, the outputs of every
+        port are downloaded into a subdirectory named by the port.
+        :param path: Local directory path.
+        :param overwrite: If true local files of a different size are
+            overwritten.
+        :param chunk_size: Chunk size in bytes or PartSizePolicy.
+        :param priority: Priority of the downloads in the transfer manager.
+        :return: List of TransferResult, one for each file.
+        """
+        def output_files(value):
+            if isinstance(value, File):
+                yield value
+                yield from value.secondary_files or []
+            elif isinstance(value, list):
+                for item in value:
+                    yield from output_files(item)
+
+        ports = {
+            name: list(output_files(self.outputs[name]))
+            for name in self.outputs
+        }
+        return File._download_groups(
+            self._api, ports, path, overwrite=overwrite,
+            chunk_size=chunk_size, priority=priority
+        )
+
     @classmethod
     def bulk_get(cls, tasks, api=None):
         """
@@ -418,11 +450,15 @@ class Task(Resource):
         """
         api = api or cls._API
         task_ids = [Transform.to_task(task) for task in tasks]
-        data = {'task_ids': task_ids}
+
+        def request(chunk):
+            response = api.post(
+                url=cls._URL['bulk_get'], data={'task_ids': chunk}
+            )
+            return TaskBulkRecord.parse_records(response=response, api=api)
 
         logger.debug('Getting tasks in bulk.')
-        response = api.post(url=cls._URL['bulk_get'], data=data)
-        return TaskBulkRecord.parse_records(response=response, api=api)
+        return bulk_execute(request, task_ids)
 
     def wait(self=None, period=10, callback=None, *args, **kwargs):
         """
@@ -0,0 +1,434 @@
+import os
+import re
+import zlib
+import base64
+import hashlib
+import logging
+import threading
+
+from sevenbridges.errors import SbgError
+from sevenbridges.models.enums import PartSize
+
+try:
+    import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+logger = logging.getLogger(__name__)
+
+CRC32_POLYNOMIAL = 0xEDB88320
+CRC32C_POLYNOMIAL = 0x82F63B78
+
+_MD5_HEX = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _gf2_times(matrix, vector):
+    total = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return total
+
+
+def _gf2_square(matrix):
+    return [_gf2_times(matrix, row) for row in matrix]
+
+
+def crc_combine(crc1, crc2, length2, polynomial=CRC32_POLYNOMIAL):
+    """
+    Combines checksums of two consecutive blocks into the checksum of
+    their concatenation, the same way zlib crc32_combine does.
+    :param crc1: Checksum of the first block.
+    :param crc2: Checksum of the second block.
+    :param length2: Length of the second block.
+    :param polynomial: Reflected CRC polynomial.
+    :return: Checksum of both blocks.
+    """
+    if length2 <= 0:
+        return crc1
+    # Operator appending a single zero bit, squared to two and four bits
+    odd = [polynomial] + [1 << n for n in range(31)]
+    even = _gf2_square(odd)
+    odd = _gf2_square(even)
+    while True:
+        even = _gf2_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_square(even)
+        if length2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+    return crc1 ^ crc2
+
+
+def expected_digests(headers):
+    """
+    Collects the checksums storage reports for an object.
+    :param headers: Response headers of the object.
+    :return: Dictionary with any of etag, md5 and crc32c.
+    """
+    expected = {}
+    etag = (headers.get('ETag') or '').strip('"').lower()
+    if _MD5_HEX.match(etag):
+        expected['md5'] = etag
+    elif re.match(r'^[0-9a-f]{32}-\d+$', etag):
+        expected['etag'] = etag
+    if headers.get('Content-MD5'):
+        expected['md5'] = base64.b64decode(headers['Content-MD5']).hex()
+    for item in (headers.get('x-goog-hash') or '').split(','):
+        name, _, value = item.strip().partition('=')
+        if name == 'md5':
+            expected['md5'] = base64.b64decode(value).hex()
+        elif name == 'crc32c':
+            expected['crc32c'] = int.from_bytes(
+                base64.b64decode(value), 'big'
+            )
+    return expected
+
+
+class PartHasher:
+    """
+    Running checksums of a single part.
+    """
+
+    def __init__(self, crc32c=True):
+        """
+        :param crc32c: Compute CRC32C if the crc32c module is installed.
+        """
+        self.size = 0
+        self._md5 = hashlib.md5()
+        self.crc32 = 0
+        self.crc32c = 0 if crc32c and _crc32c is not None else None
+
+    def update(self, data):
+        self.size += len(data)
+        self._md5.update(data)
+        self.crc32 = zlib.crc32(data, self.crc32)
+        if self.crc32c is not None:
+            self.crc32c = _crc32c.crc32c(data, self.crc32c)
+
+    @property
+    def md5(self):
+        return self._md5.digest()
+
+
+class TransferDigest:
+    """
+    Checksums of a transfer computed while the bytes pass through it.
+
+    Parts are hashed by the workers in any order, MD5 and CRCs of every
+    part are kept and the part CRCs are combined into the file CRCs once
+    the transfer is finished. The file MD5 can not be combined from parts,
+    it is computed in file order. Data ahead of it is held in memory up to
+    `memory` bytes, beyond that it is read back from the file once the data
+    before it arrives. On parallel transfers whose parts run far ahead of
+    the first one, this read back is a second I/O pass over most of the
+    file. Without a file all data ahead is held in memory. Ranges which
+    never passed through the transfer, like parts of a resumed transfer,
+    are read from the file when it is finished.
+    """
+    DEFAULT_MEMORY = 64 * PartSize.MB
+
+    def __init__(self, size, path=None, part_size=None, crc32c=True,
+                 memory=DEFAULT_MEMORY):
+        """
+        :param size: File size.
+        :param path: Path of the file holding the transferred data.
+        :param part_size: Size of the parts of the storage object, ranges
+            read back at the end are hashed in parts of this size.
+        :param crc32c: Compute CRC32C if the crc32c module is installed.
+        :param memory: Bytes of data ahead of the file MD5 held in memory
+            instead of being read back from the file.
+        """
+        self.size = size
+        self.path = path
+        self.part_size = part_size
+        self.memory = memory
+        self.crc32c_enabled = crc32c and _crc32c is not None
+        self.verified = None
+        self.mismatches = []
+        self.checked_parts = 0
+        self._parts = {}
+        self._md5 = hashlib.md5()
+        # End of the data handed to the MD5 and of the data hashed so far,
+        # file ranges are read back and hashed outside of the lock
+        self._cursor = 0
+        self._hashed = 0
+        self._ahead = []
+        self._held = 0
+        self._crcs = None
+        self._fd = None
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+    def __repr__(self):
+        return f'<TransferDigest: size={self.size}, md5={self.md5}>'
+
+    def hasher(self):
+        return PartHasher(crc32c=self.crc32c_enabled)
+
+    def add_part(self, offset, hasher):
+        """
+        Records checksums of a completed part.
+        :param offset: Offset of the part in the file.
+        :param hasher: PartHasher of the part.
+        """
+        with self._lock:
+            self._parts[offset] = (
+                hasher.size, hasher.md5, hasher.crc32, hasher.crc32c
+            )
+            self._crcs = None
+
+    def check_part(self, hasher, e_tag):
+        """
+        Compares the part MD5 with the ETag storage returned for it.
+        :param hasher: PartHasher of the part.
+        :param e_tag: ETag of the part.
+        :return: True if they match, None if the ETag is not an MD5.
+        """
+        e_tag = (e_tag or '').strip('"').lower()
+        if not _MD5_HEX.match(e_tag):
+            return None
+        if hasher.md5.hex() != e_tag:
+            return False
+        with self._lock:
+            self.checked_parts += 1
+        return True
+
+    def update(self, offset, data):
+        """
+        Feeds data at the offset to the file MD5.
+        :param offset: Offset of the data in the file.
+        :param data: Bytes like object.
+        """
+        end = offset + len(data)
+        with self._lock:
+            if end <= self._cursor:
+                return
+            if offset > self._cursor:
+                if self.path is None or self._held + len(data) <= self.memory:
+                    self._held += len(data)
+                    data = bytes(data)
+                else:
+                    data = None
+                self._ahead.append((offset, end, data))
+                return
+            ranges = [
+                (self._cursor, end, memoryview(data)[self._cursor - offset:])
+            ]
+            self._cursor = end
+            ranges.extend(self._catch_up())
+            # Ranges handed out earlier are hashed first
+            start = ranges[0][0]
+            self._condition.wait_for(lambda: self._hashed == start)
+        try:
+            for start, end, data in ranges:
+                if data is None:
+                    self._hash_file(start, end)
+                else:
+                    self._md5.update(data)
+        finally:
+            with self._condition:
+                self._hashed = ranges[-1][1]
+                self._condition.notify_all()
+
+    def _catch_up(self):
+        """
+        Takes the ranges ahead which continue the data handed to the MD5.
+        :return: List of (start, end, data) ranges, data is None for ranges
+            read back from the file.
+        """
+        ranges = []
+        while True:
+            ready = [item for item in self._ahead if item[0] <= self._cursor]
+            if not ready:
+                return ranges
+            self._ahead = [
+                item for item in self._ahead if item[0] > self._cursor
+            ]
+            for start, end, data in sorted(ready, key=lambda item: item[:2]):
+                if data is not None:
+                    self._held -= len(data)
+                if end <= self._cursor:
+                    continue
+                if data is not None:
+                    data = memoryview(data)[self._cursor - start:]
+                ranges.append((self._cursor, end, data))
+                self._cursor = end
+
+    def _read(self, offset, size):
+        if self._fd is None:
+            self._fd = os.open(
+                self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+            )
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+        os.lseek(self._fd, offset, os.SEEK_SET)
+        return os.read(self._fd, size)
+
+    def _hash_file(self, start, end, hasher=None):
+        while start < end:
+            data = self._read(start, min(end - start, 4 * PartSize.MB))
+            if not data:
+                raise SbgError(f'Unexpected end of file at byte {start}.')
+            if hasher is None:
+                self._md5.update(data)
+            else:
+                hasher.update(data)
+            start += len(data)
+
+    def finish(self):
+        """
+        Reads back the ranges which did not pass through the transfer and
+        completes the checksums.
+        """
+        with self._lock:
+            self._condition.wait_for(lambda: self._hashed == self._cursor)
+            try:
+                gaps, position = [], 0
+                for offset in sorted(self._parts):
+                    if offset > position:
+                        gaps.append((position, offset))
+                    position = max(position, offset + self._parts[offset][0])
+                if position < self.size:
+                    gaps.append((position, self.size))
+                if (gaps or self._cursor < self.size) and self.path is None:
+                    raise SbgError('Data missing from the checksums.')
+
+                step = self.part_size or self.size or 1
+                for start, end in gaps:
+                    for offset in range(start, end, step):
+                        hasher = self.hasher()
+                        self._hash_file(
+                            offset, min(offset + step, end), hasher
+                        )
+                        self._parts[offset] = (
+                            hasher.size, hasher.md5, hasher.crc32,
+                            hasher.crc32c
+                        )
+                self._ahead = []
+                self._held = 0
+                if self._cursor < self.size:
+                    self._hash_file(self._cursor, self.size)
+                    self._cursor = self._hashed = self.size
+                # Parts are complete, combining them is not repeated on
+                # every read of the checksums
+                self._crcs = (
+                    self._combined(2, CRC32_POLYNOMIAL),
+                    self._combined(3, CRC32C_POLYNOMIAL)
+                    if self.crc32c_enabled else None
+                )
+            finally:
+                self.close()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def complete(self):
+        return self._hashed >= self.size
+
+    @property
+    def md5(self):
+        """
+        MD5 of the file as a hex string.
+        """
+        return self._md5.hexdigest() if self.complete else None
+
+    @property
+    def parts(self):
+        return [self._parts[offset] for offset in sorted(self._parts)]
+
+    @property
+    def etag(self):
+        """
+        ETag of the object uploaded in the recorded parts, the MD5 of the
+        part MD5s followed by the number of parts.
+        """
+        parts = self.parts
+        if not self.complete or len(parts) <= 1:
+            return self.md5
+        digest = hashlib.md5(b''.join(part[1] for part in parts))
+        return f'{digest.hexdigest()}-{len(parts)}'
+
+    def _combined(self, index, polynomial):
+        crc = 0
+        for part in self.parts:
+            if part[index] is None:
+                return None
+            crc = crc_combine(crc, part[index], part[0], polynomial)
+        return crc
+
+    @property
+    def crc32(self):
+        if self._crcs is not None:
+            return self._crcs[0]
+        return self._combined(2, CRC32_POLYNOMIAL)
+
+    @property
+    def crc32c(self):
+        if not self.crc32c_enabled:
+            return None
+        if self._crcs is not None:
+            return self._crcs[1]
+        return self._combined(3, CRC32C_POLYNOMIAL)
+
+    def verify_parts(self):
+        """
+        Concludes the verification from the part checks.
+        :return: True if every part matched its ETag, None if some parts
+            were not checked.
+        """
+        if self.mismatches:
+            self.verified = False
+        elif self._parts and self.checked_parts == len(self._parts):
+            self.verified = True
+        return self.verified
+
+    def _storage_parts(self, count):
+        """
+        Whether the recorded parts are the parts the object was uploaded
+        in, so that its multipart ETag can be compared. Parts of downloads
+        are sized by the client and the storage part size is not known.
+        :param count: Number of parts in the ETag.
+        """
+        sizes = [part[0] for part in self.parts]
+        if not self.part_size or len(sizes) != count:
+            return False
+        return (
+            all(size == self.part_size for size in sizes[:-1]) and
+            0 < sizes[-1] <= self.part_size
+        )
+
+    def verify(self, expected):
+        """
+        Compares the checksums with the ones reported by storage.
+        :param expected: Dictionary with any of md5, etag and crc32c.
+        :return: True if all of them match, None if none could be
+            compared.
+        """
+        actual = {'md5': self.md5, 'crc32c': self.crc32c}
+        if 'etag' in expected and self._storage_parts(
+                int(expected['etag'].rsplit('-', 1)[1])
+        ):
+            actual['etag'] = self.etag
+        compared = False
+        for name, value in expected.items():
+            if actual.get(name) is None:
+                continue
+            compared = True
+            if actual[name] != value:
+                self.mismatches.append((name, value, actual[name]))
+        if compared:
+            self.verified = not self.mismatches
+        return self.verified
@@ -6,33 +6,109 @@ import threading
 
 import requests
 
-from sevenbridges.errors import SbgError
+from sevenbridges.errors import SbgError, StorageError
 from sevenbridges.http.client import generate_session
+from sevenbridges.transfer.digest import TransferDigest, expected_digests
+from sevenbridges.transfer.journal import PartBitmap, object_validator
 from sevenbridges.models.enums import (
     PartSize, TransferState, RequestParameters
 )
-from sevenbridges.transfer.utils import Part, Progress, total_parts
+from sevenbridges.transfer.utils import (
+    DOWNLOAD_PART_LIMITS, FixedPartSize, Part, PartRetry, PartSizePolicy,
+    Progress, TransferStats, TransferWindow, bandwidth_bucket,
+    iterate_parts, part_size_policy, total_parts
+)
 
 
 logger = logging.getLogger(__name__)
 
 
-def _download_part(path, session, url, timeout, start_byte, end_byte):
+class FileWriter:
+    """
+    Writes downloaded parts into the target file through a single file
+    descriptor shared by all download workers, using positional writes.
+    """
+
+    def __init__(self, path, size=0, preallocate=True):
+        """
+        :param path: File path.
+        :param size: File size, the file is preallocated to it.
+        :param preallocate: Reserve the file blocks up front.
+        """
+        self.path = path
+        try:
+            self.fd = os.open(
+                path, os.O_CREAT | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+            )
+        except OSError:
+            raise SbgError(f'Unable to open file {path}')
+        self._lock = None if hasattr(os, 'pwrite') else threading.Lock()
+        if preallocate and size:
+            self._preallocate(size)
+
+    def __repr__(self):
+        return f'<FileWriter: path={self.path}>'
+
+    def _preallocate(self, size):
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self.fd, 0, size)
+                return
+            except OSError:
+                logger.debug('Preallocation not supported for %s', self.path)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+
+    def write(self, offset, data):
+        """
+        Writes the data at the offset.
+        :param offset: File offset.
+        :param data: Bytes like object.
+        :return: Number of bytes written.
+        """
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            if self._lock is None:
+                written += os.pwrite(self.fd, view[written:], offset + written)
+            else:
+                with self._lock:
+                    os.lseek(self.fd, offset + written, os.SEEK_SET)
+                    written += os.write(self.fd, view[written:])
+        return written
+
+    def close(self, sync=True):
+        """
+        Closes the file.
+        :param sync: Flush the file to the disk before closing it.
+        """
+        if self.fd is None:
+            return
+        try:
+            if sync:
+                os.fsync(self.fd)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _download_part(writer, session, url, timeout, start_byte, end_byte,
+                   buffer_size=PartSize.DOWNLOAD_BUFFER_SIZE, digest=None,
+                   bandwidth=None, stats=None):
     """
     Downloads a single part.
-    :param path: File path.
+    :param writer: FileWriter of the target file.
     :param session: Requests session.
     :param url: Url of the resource.
     :param timeout: Session timeout.
     :param start_byte: Start byte of the part.
     :param end_byte: End byte of the part.
-    :return:
+    :param buffer_size: Size of the reads from the response.
+    :param digest: TransferDigest computing checksums of the parts.
+    :param bandwidth: TokenBucket limiting the download bandwidth.
+    :param stats: TransferStats counting the received bytes.
+    :return: Part
     """
-    try:
-        fp = os.open(path, os.O_CREAT | os.O_WRONLY)
-    except IOError:
-        raise SbgError('Unable to open file %s' % path)
-
     # Prepare range headers.
     headers = {}
     if end_byte is not None:
@@ -43,23 +119,51 @@ def _download_part(path, session, url, timeout, start_byte, end_byte):
             url=url, headers=headers, timeout=timeout, stream=True
         )
         response.raise_for_status()
-        part_size = response.headers.get('Content-Length')
-        os.lseek(fp, start_byte, os.SEEK_SET)
-        for part in response.iter_content(32 * PartSize.KB):
-            os.write(fp, part)
-        os.close(fp)
-        return Part(start=start_byte, size=float(part_size))
+        offset = start_byte
+        hasher = digest.hasher() if digest is not None else None
+        with response:
+            for chunk in response.iter_content(buffer_size):
+                if bandwidth is not None:
+                    bandwidth.consume(len(chunk))
+                if stats is not None:
+                    stats.transferred(len(chunk))
+                written = writer.write(offset, chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                    digest.update(offset, chunk)
+                offset += written
+        if end_byte is not None and offset != end_byte + 1:
+            raise SbgError(
+                f'Expected {end_byte - start_byte + 1} bytes from range '
+                f'{start_byte}-{end_byte}, got {offset - start_byte}.'
+            )
+        if hasher is not None:
+            digest.add_part(start_byte, hasher)
+        return Part(start=start_byte, size=offset - start_byte)
     except (requests.HTTPError, requests.RequestException) as e:
-        raise SbgError(f'Failed to download file. Response: {e}')
+        response = getattr(e, 'response', None)
+        raise StorageError(
+            f'Failed to download file. Response: {e}',
+            status=response.status_code if response is not None else None
+        )
+    except OSError as e:
+        raise SbgError(f'Unable to write file {writer.path}. Reason: {e}')
 
 
-def _get_content_length(session, url, timeout):
+def _get_object_headers(session, url, timeout):
     try:
         response = session.get(url, timeout=timeout, stream=True)
     except requests.RequestException as e:
         raise SbgError(str(e))
+    response.close()
+    return response.headers
+
+
+def _get_content_length(session, url, timeout, headers=None):
+    if headers is None:
+        headers = _get_object_headers(session, url, timeout)
 
-    file_size = response.headers.get('Content-Length', None)
+    file_size = headers.get('Content-Length', None)
     if file_size is None:
         raise SbgError('Server did not provide Content-Length Headers!')
 
@@ -68,7 +172,10 @@ def _get_content_length(session, url, timeout):
 
 class DPartedFile:
     def __init__(
-            self, file_path, session, url, file_size, part_size, timeout, pool
+            self, file_path, session, url, file_size, part_size, timeout, pool,
+            window=None, policy=None, ranges=None, bitmap=None, writer=None,
+            buffer_size=PartSize.DOWNLOAD_BUFFER_SIZE, retry=None,
+            refresh_url=None, digest=None, bandwidth=None, stats=None
     ):
         """
         Emulates the partitioned file. Uses the download pool attached to the
@@ -80,6 +187,20 @@ class DPartedFile:
         :param part_size: Part size.
         :param timeout: Session timeout.
         :param pool: Download pool.
+        :param window: TransferWindow, number of parts in flight.
+        :param policy: PartSizePolicy adjusting the size of the following
+            parts to the measured part throughput.
+        :param ranges: Byte ranges to download as (start, end) tuples with
+            exclusive end, the whole file by default.
+        :param bitmap: PartBitmap marking the downloaded parts.
+        :param writer: FileWriter of the file, shared by the parts.
+        :param buffer_size: Size of the reads from part responses.
+        :param retry: PartRetry retrying failed parts.
+        :param refresh_url: Callable returning a new url of the resource,
+            called when the url expired.
+        :param digest: TransferDigest computing checksums of the parts.
+        :param bandwidth: TokenBucket limiting the download bandwidth.
+        :param stats: TransferStats recording the part telemetry.
         """
         self.url = url
         self.file_path = file_path
@@ -89,23 +210,98 @@ class DPartedFile:
         self.timeout = timeout
         self.submitted = 0
         self.total_submitted = 0
-        self.total = total_parts(self.file_size, self.part_size)
         self.pool = pool
-        self.parts = self.get_parts()
+        self.window = window or TransferWindow()
+        self.policy = policy or FixedPartSize(part_size)
+        self.throughput = None
+        if ranges is None:
+            ranges = [(0, file_size)]
+        self._ranges = [[start, end] for start, end in ranges if start < end]
+        self.bitmap = bitmap
+        self.writer = writer
+        self.buffer_size = buffer_size
+        self.retry = retry or PartRetry()
+        self.refresh_url = refresh_url
+        self.digest = digest
+        self.bandwidth = bandwidth
+        self.stats = stats or TransferStats(retry=self.retry)
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        return self.total_submitted + sum(
+            total_parts(end - start, self.part_size)
+            for start, end in self._ranges
+        )
+
+    @property
+    def remaining(self):
+        return sum(end - start for start, end in self._ranges)
+
+    def _download(self, start_byte, end_byte):
+        started = time.monotonic()
+        used = []
+
+        def attempt():
+            used.append(self.url)
+            with self.stats.timed('storage'):
+                return _download_part(
+                    self.writer, self.session, used[-1], self.timeout,
+                    start_byte, end_byte, self.buffer_size, self.digest,
+                    self.bandwidth, self.stats
+                )
+
+        def refresh():
+            with self._lock:
+                # Parts failing on the same expired url refresh it once
+                if self.url == used[-1]:
+                    with self.stats.timed('api'):
+                        self.url = self.refresh_url()
+
+        part = self.retry.call(
+            attempt, refresh=refresh if self.refresh_url else None
+        )
+        elapsed = time.monotonic() - started
+        self.stats.part_done(part.size, elapsed)
+        if elapsed > 0:
+            self._record_throughput(part.size / elapsed)
+        if self.bitmap is not None:
+            self.bitmap.mark(part.start, int(part.size))
+        return part
+
+    def _record_throughput(self, throughput):
+        with self._lock:
+            self.throughput = (
+                throughput if self.throughput is None
+                else 0.5 * self.throughput + 0.5 * throughput
+            )
+
+    def _next_part(self):
+        if self.throughput is not None:
+            parts_left = (
+                DOWNLOAD_PART_LIMITS.max_parts - self.total_submitted
+            )
+            self.part_size = self.policy.adjust(
+                self.part_size, self.throughput, self.remaining, parts_left,
+                DOWNLOAD_PART_LIMITS
+            )
+        current = self._ranges[0]
+        start_byte = current[0]
+        end_byte = min(start_byte + self.part_size, current[1]) - 1
+        current[0] = end_byte + 1
+        if current[0] >= current[1]:
+            self._ranges.pop(0)
+        return start_byte, end_byte
 
     def submit(self):
         """
-        Partitions the file into chunks and submits them into group of 4
-        for download on the api download pool.
+        Partitions the file into chunks and submits them for download on the
+        api download pool until the window is full.
         """
         futures = []
-        while self.submitted < 4 and not self.done():
-            part = self.parts.pop(0)
+        while self.submitted < self.window.size and not self.done():
             futures.append(
-                self.pool.submit(
-                    _download_part, self.file_path, self.session, self.url,
-                    self.timeout, *part
-                )
+                self.pool.submit(self._download, *self._next_part())
             )
             self.submitted += 1
             self.total_submitted += 1
@@ -113,28 +309,22 @@ class DPartedFile:
         return futures
 
     def done(self):
-        return self.total_submitted == self.total
+        return not self._ranges
 
     def __iter__(self):
-        futures = self.submit()
-        while futures:
-            future = futures[0]
-            self.submitted -= 1
-            futures.remove(future)
-            futures.extend(self.submit())
-            yield future.result()
+        return iterate_parts(self)
 
     def get_parts(self):
         """
-        Partitions the file and saves the part information in memory.
+        Partitions the remaining part of the file with the current part
+        size.
         """
         parts = []
-        start_b = 0
-        end_byte = start_b + self.part_size - 1
-        for _ in range(self.total):
-            parts.append([start_b, end_byte])
-            start_b = end_byte + 1
-            end_byte = start_b + self.part_size - 1
+        for start_b, end in self._ranges:
+            while start_b < end:
+                end_byte = min(start_b + self.part_size, end) - 1
+                parts.append([start_b, end_byte])
+                start_b = end_byte + 1
         return parts
 
 
@@ -142,7 +332,10 @@ class DPartedFile:
 class Download(threading.Thread):
     def __init__(
             self, url, file_path, part_size=None, retry_count=None,
-            timeout=None, api=None
+            timeout=None, api=None, window=None, resume=False,
+            buffer_size=PartSize.DOWNLOAD_BUFFER_SIZE, refresh_url=None,
+            error_budget=PartRetry.DEFAULT_ERROR_BUDGET, checksums=False,
+            verify=False
      ):
         """
         File multipart downloader.
@@ -150,8 +343,27 @@ class Download(threading.Thread):
         :param file_path: Local file path.
         :param retry_count: Number of times to retry on error.
         :param timeout: Connection timeout in seconds.
-        :param part_size: Size of the parts in bytes.
+        :param part_size: Size of the parts in bytes or PartSizePolicy, by
+            default part size is picked from the file size and adapted to
+            the download throughput.
         :param api: Api instance.
+        :param window: Number of parts in flight, defaults to the Api
+            transfer window.
+        :param resume: If true the file is downloaded into a .partial file
+            with a bitmap of the completed ranges next to it, and a download
+            interrupted earlier continues with the missing ranges only.
+        :param buffer_size: Size of the reads from part responses, each
+            read is written to the file with a single call.
+        :param refresh_url: Callable returning a new signed url of the
+            file, used when the url expires during the download.
+        :param error_budget: Number of failed part attempts tolerated
+            before the download fails, each part is retried up to
+            retry_count times.
+        :param checksums: Compute checksums of the file while it is
+            downloaded, available as digest and compared with the ones
+            reported by storage.
+        :param verify: Compute checksums and fail the download if they do
+            not match the ones reported by storage.
         """
         threading.Thread.__init__(self)
         self.daemon = True
@@ -159,7 +371,10 @@ class Download(threading.Thread):
         if api is None:
             raise SbgError('Api instance missing.')
 
-        if part_size and part_size < PartSize.DOWNLOAD_MINIMUM_PART_SIZE:
+        if (
+                part_size and not isinstance(part_size, PartSizePolicy) and
+                part_size < PartSize.DOWNLOAD_MINIMUM_PART_SIZE
+        ):
             self._status = TransferState.FAILED
             raise SbgError(
                 f'Part size is too small! Minimum get_parts size '
@@ -169,17 +384,40 @@ class Download(threading.Thread):
         self.url = url
         self._file_path = file_path
 
-        # append unique suffix to the file
-        suffix = hashlib.sha1(self._file_path.encode('utf-8')).hexdigest()[:10]
-        self._temp_file = f'{self._file_path}.{suffix}'
+        self._resume = resume
+        if resume:
+            self._temp_file = f'{self._file_path}.partial'
+        else:
+            # append unique suffix to the file
+            suffix = hashlib.sha1(
+                self._file_path.encode('utf-8')
+            ).hexdigest()[:10]
+            self._temp_file = f'{self._file_path}.{suffix}'
+        self._bitmap = None
+        self._buffer_size = buffer_size
         self._retry_count = (
             retry_count or RequestParameters.DEFAULT_RETRY_COUNT
         )
         self._timeout = timeout or RequestParameters.DEFAULT_TIMEOUT
-        self._part_size = part_size or PartSize.DOWNLOAD_MINIMUM_PART_SIZE
+        self._part_retry = PartRetry(
+            retry_count=self._retry_count, error_budget=error_budget
+        )
+        self._refresh_url = refresh_url
+        self._checksums = checksums or verify
+        self._verify = verify
+        self._digest = None
+        self._expected = {}
+        self._validator = None
+        self._part_size_policy = part_size_policy(part_size)
+        self._part_size = None
         self._api = api
+        self._window = window
+        self._bandwidth = bandwidth_bucket(api, 'download')
+        self._stats = TransferStats(retry=self._part_retry)
+        self._progress = None
         self._bytes_done = 0
         self._running = threading.Event()
+        self._finished = threading.Event()
         self._callback = None
         self._errorback = None
         self._progress_callback = None
@@ -195,6 +433,9 @@ class Download(threading.Thread):
 
         try:
             self._file_size = self._get_file_size()
+            self._part_size = self._part_size_policy.initial(
+                self._file_size, DOWNLOAD_PART_LIMITS
+            )
         except SbgError as error:
             if self._errorback:
                 self._errorback(error)
@@ -226,6 +467,29 @@ class Download(threading.Thread):
     def path(self):
         return self._file_path
 
+    @property
+    def bandwidth_limit(self):
+        """
+        Download bandwidth limit in force in bytes per second, None if
+        unlimited.
+        """
+        return self._bandwidth.rate if self._bandwidth is not None else None
+
+    @property
+    def stats(self):
+        """
+        TransferStats with the telemetry of the download.
+        """
+        return self._stats
+
+    @property
+    def digest(self):
+        """
+        TransferDigest with checksums of the downloaded file, if checksums
+        were requested.
+        """
+        return self._digest
+
     def add_callback(self, callback=None, errorback=None):
         """
         Adds a callback that will be called when the download
@@ -263,7 +527,9 @@ class Download(threading.Thread):
         """
         if self.status in (TransferState.PAUSED, TransferState.RUNNING):
             self._stop_signal = True
-            self.join()
+            # Wakes up a paused download so it sees the stop signal
+            self._running.set()
+            self._join()
             self._status = TransferState.STOPPED
             if self._callback:
                 return self._callback(self._status)
@@ -289,6 +555,16 @@ class Download(threading.Thread):
         """
         self.join()
 
+    def _join(self):
+        """
+        Waits until run returns, on the own thread of the download or on
+        the transfer manager worker running it.
+        """
+        if self.ident is not None:
+            self.join()
+        else:
+            self._finished.wait()
+
     def start(self):
         """
         Starts the download.
@@ -308,18 +584,49 @@ class Download(threading.Thread):
         """
         Runs the thread! Should not be used use start() method instead.
         """
+        try:
+            self._transfer()
+        finally:
+            self._finished.set()
+
+    def _transfer(self):
         self._running.set()
         self._status = TransferState.RUNNING
         self._time_started = time.time()
 
+        ranges = self._missing_ranges() if self._resume else None
+        writer = FileWriter(self._temp_file, self._file_size)
+        if self._checksums:
+            self._digest = TransferDigest(
+                self._file_size, path=self._temp_file
+            )
         parted_file = DPartedFile(
             file_path=self._temp_file,
             session=self._session,
             url=self.url,
             file_size=self._file_size,
             part_size=self._part_size,
+            policy=self._part_size_policy,
             timeout=self._timeout,
             pool=self._api.download_pool,
+            ranges=ranges,
+            bitmap=self._bitmap,
+            writer=writer,
+            buffer_size=self._buffer_size,
+            retry=self._part_retry,
+            refresh_url=self._refresh_url,
+            digest=self._digest,
+            bandwidth=self._bandwidth,
+            stats=self._stats,
+            window=TransferWindow(
+                size=self._window or getattr(
+                    self._api, 'transfer_window', TransferWindow.DEFAULT_SIZE
+                ),
+                maximum=getattr(self._api, 'download_max_workers', None),
+                adaptive=getattr(
+                    self._api, 'adaptive_transfer_window', False
+                ),
+            ),
         )
 
         try:
@@ -329,36 +636,124 @@ class Download(threading.Thread):
                 self._running.wait()
                 self._bytes_done += part.size
                 if self._progress_callback:
-                    progress = Progress(
-                        parted_file.total, parted_file.total_submitted,
-                        self._bytes_done, self._file_size, self.duration
-                    )
-                    self._progress_callback(progress)
+                    self._progress_callback(self._update_progress(
+                        parted_file.total, parted_file.total_submitted
+                    ))
+            writer.close()
+            if self._digest is not None:
+                self._verify_digest()
 
         except Exception as exc:
+            self._status = TransferState.FAILED
             if self._errorback:
                 return self._errorback(exc)
             else:
                 raise SbgError('Download failed! %s' % str(exc))
+        finally:
+            writer.close(sync=False)
+            if self._bitmap is not None:
+                self._bitmap.close()
+            if self._digest is not None:
+                self._digest.close()
 
         self._status = TransferState.COMPLETED
         try:
-            os.rename(self._temp_file, self._file_path)
+            os.replace(self._temp_file, self._file_path)
         except Exception as e:
             raise SbgError(f'Unable to rename the file due to an error: {e}.')
+        if self._bitmap is not None:
+            self._bitmap.remove()
 
         if self._callback:
             return self._callback(self._status)
 
+    def _update_progress(self, num_of_parts, parts_done):
+        """
+        Updates the progress object passed to every progress callback.
+        """
+        if self._progress is None:
+            self._progress = Progress(
+                num_of_parts, parts_done, self._bytes_done, self._file_size,
+                self.duration, self.bandwidth_limit, stats=self._stats
+            )
+            return self._progress
+        return self._progress.update(
+            num_of_parts, parts_done, self._bytes_done, self._file_size,
+            self.duration, self.bandwidth_limit
+        )
+
+    def _verify_digest(self):
+        """
+        Completes the checksums and compares them with the ones reported
+        by storage. A file failing verification is removed.
+        """
+        self._digest.finish()
+        if self._digest.verify(self._expected) is False and self._verify:
+            self._status = TransferState.FAILED
+            if self._bitmap is not None:
+                self._bitmap.remove()
+            os.remove(self._temp_file)
+            raise SbgError(
+                'Checksum verification failed: ' + ', '.join(
+                    f'{name} expected {expected}, got {actual}'
+                    for name, expected, actual in self._digest.mismatches
+                )
+            )
+
+    def _missing_ranges(self):
+        """
+        Loads the bitmap of the partial file left by an interrupted download
+        and returns the ranges still missing, or starts a new partial file.
+        The partial file is discarded if it does not have the size of the
+        file or the object changed since it was written.
+        :return: List of (start, end) byte ranges.
+        """
+        self._bitmap = PartBitmap(
+            f'{self._temp_file}.parts', self._file_size,
+            validator=self._validator
+        )
+        if self._partial_size() == self._file_size and self._bitmap.load():
+            ranges = self._bitmap.missing()
+            self._bytes_done = self._file_size - sum(
+                end - start for start, end in ranges
+            )
+            logger.info(
+                'Resuming download of %s, %s bytes already downloaded',
+                self._file_path, self._bytes_done
+            )
+            return ranges
+
+        if os.path.exists(self._temp_file):
+            logger.info(
+                'Discarding partial file of %s, it does not match the file.',
+                self._file_path
+            )
+        with open(self._temp_file, 'wb') as fp:
+            fp.truncate(self._file_size)
+        self._bitmap.create()
+        return None
+
+    def _partial_size(self):
+        try:
+            return os.path.getsize(self._temp_file)
+        except OSError:
+            return None
+
     def _get_file_size(self):
         """
         Fetches file size by reading the Content-Length header
         for the resource.
         :return: File size.
         """
-        file_size = int(
-            _get_content_length(self._session, self.url, self._timeout)
-        )
+        with self._stats.timed('storage'):
+            headers = _get_object_headers(
+                self._session, self.url, self._timeout
+            )
+        self._expected = expected_digests(headers)
+        self._validator = object_validator(headers)
+        file_size = int(_get_content_length(
+            self._session, self.url, self._timeout, headers=headers
+        ))
         if file_size == 0:
             with open(self._temp_file, 'a', encoding='utf-8'):
                 # Create file if empty
@@ -0,0 +1,306 @@
+import os
+import json
+import struct
+import hashlib
+import logging
+import threading
+
+from sevenbridges.errors import SbgError
+from sevenbridges.models.enums import PartSize
+from sevenbridges.transfer.utils import total_parts
+
+logger = logging.getLogger(__name__)
+
+
+def file_fingerprint(path, sample=True):
+    """
+    Identifies the file contents without reading the whole file.
+    :param path: File path.
+    :param sample: If true a hash of blocks sampled from the start,
+        the middle and the end of the file is included.
+    :return: Fingerprint dictionary.
+    """
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if sample:
+        block = 64 * PartSize.KB
+        digest = hashlib.sha256()
+        offsets = sorted({
+            0, max(stat.st_size // 2 - block // 2, 0),
+            max(stat.st_size - block, 0)
+        })
+        with open(path, 'rb') as fp:
+            for offset in offsets:
+                fp.seek(offset)
+                digest.update(fp.read(block))
+        fingerprint['sample'] = digest.hexdigest()
+    return fingerprint
+
+
+def object_validator(headers):
+    """
+    Identifies the version of a storage object from its response headers.
+    :param headers: Response headers of the object.
+    :return: ETag and Last-Modified of the object, None if storage
+        reported neither.
+    """
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    if etag is None and last_modified is None:
+        return None
+    return f'{etag or ""}\n{last_modified or ""}'
+
+
+class UploadJournal:
+    """
+    Checkpoint journal of a multipart upload, kept as a JSON lines file.
+
+    The first line describes the upload and each following line records a
+    completed part with its ETag, so a process that dies part way through
+    the upload can resume it and send only the missing parts. A torn last
+    line, left by a crash in the middle of a write, is ignored.
+    """
+
+    def __init__(self, path, sample=True):
+        """
+        :param path: Journal file path.
+        :param sample: Include a sampled hash in the file fingerprint.
+        """
+        self.path = path
+        self.sample = sample
+        self._fp = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<UploadJournal: path={self.path}>'
+
+    def fingerprint(self, file_path):
+        return file_fingerprint(file_path, sample=self.sample)
+
+    def load(self, file_path, destination):
+        """
+        Reads the journal and returns the recorded upload if it still
+        matches the local file and the upload destination.
+        :param file_path: Path of the file being uploaded.
+        :param destination: Upload destination, name and project or parent.
+        :return: Dictionary with upload_id, part_size and parts mapping part
+            numbers to ETags or None.
+        """
+        try:
+            with open(self.path, encoding='utf-8') as fp:
+                lines = fp.read().splitlines()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            raise SbgError(f'Unable to read upload journal. Reason: {e}')
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        if not records or 'upload_id' not in records[0]:
+            return None
+
+        header = records[0]
+        if header.get('destination') != destination:
+            logger.info('Upload destination changed, journal discarded.')
+            return None
+        if header.get('fingerprint') != self.fingerprint(file_path):
+            logger.info('File changed since the journal was written.')
+            return None
+
+        parts = {}
+        for record in records[1:]:
+            if 'part' in record:
+                parts[record['part']] = record.get('etag')
+        return {
+            'upload_id': header['upload_id'],
+            'part_size': header['part_size'],
+            'parts': parts,
+        }
+
+    def start(self, upload_id, part_size, file_path, destination):
+        """
+        Starts a new journal for the upload, replacing the old one.
+        :param upload_id: Upload identifier.
+        :param part_size: Part size.
+        :param file_path: Path of the file being uploaded.
+        :param destination: Upload destination, name and project or parent.
+        """
+        header = {
+            'upload_id': upload_id,
+            'part_size': part_size,
+            'fingerprint': self.fingerprint(file_path),
+            'destination': destination,
+        }
+        self.close()
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as fp:
+            fp.write(json.dumps(header) + '\n')
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, self.path)
+
+    def part_done(self, part_number, e_tag):
+        """
+        Records a part that was uploaded and reported.
+        :param part_number: Part number.
+        :param e_tag: ETag of the part.
+        """
+        line = json.dumps({'part': part_number, 'etag': e_tag}) + '\n'
+        with self._lock:
+            if self._fp is None:
+                self._fp = open(self.path, 'a', encoding='utf-8')
+            self._fp.write(line)
+            self._fp.flush()
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+    def remove(self):
+        """
+        Removes the journal once the upload is completed or aborted.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class PartBitmap:
+    """
+    Sidecar bitmap of the completed blocks of a ranged download.
+
+    The file is split into blocks of equal size and every block that was
+    fully written is marked, so a download interrupted by a crash fetches
+    only the missing ranges when restarted. Ranges that do not cover a
+    whole block leave it unmarked and it is downloaded again. The bitmap
+    records the version of the object, so blocks of an object replaced in
+    the meantime are not trusted.
+    """
+    _HEADER = struct.Struct('>8sQQ16s')
+    _MAGIC = b'SBGPART2'
+
+    def __init__(self, path, file_size, block_size=PartSize.MB,
+                 validator=None):
+        """
+        :param path: Bitmap file path.
+        :param file_size: Size of the downloaded file.
+        :param block_size: Size of the blocks tracked by a single bit.
+        :param validator: Version of the downloaded object, as returned by
+            object_validator.
+        """
+        self.path = path
+        self.file_size = file_size
+        self.block_size = block_size
+        self.validator = validator
+        self.blocks = total_parts(file_size, block_size)
+        self.bits = bytearray((self.blocks + 7) // 8)
+        self._fp = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<PartBitmap: path={self.path}>'
+
+    def load(self):
+        """
+        Reads the bitmap left by an earlier download of the same file.
+        :return: True if the bitmap was loaded, False if it is missing or
+            was written for a file of a different size or version.
+        """
+        try:
+            with open(self.path, 'rb') as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            raise SbgError(f'Unable to read download bitmap. Reason: {e}')
+
+        size = self._HEADER.size
+        if len(data) != size + len(self.bits):
+            return False
+        if self._HEADER.unpack(data[:size]) != self._header():
+            return False
+        self.bits[:] = data[size:]
+        return True
+
+    def create(self):
+        """
+        Writes an empty bitmap, replacing the old one.
+        """
+        self.close()
+        self.bits[:] = bytes(len(self.bits))
+        with open(self.path, 'wb') as fp:
+            fp.write(self._HEADER.pack(*self._header()))
+            fp.write(self.bits)
+
+    def _header(self):
+        validator = bytes(16)
+        if self.validator is not None:
+            validator = hashlib.md5(self.validator.encode('utf-8')).digest()
+        return self._MAGIC, self.file_size, self.block_size, validator
+
+    def mark(self, start, size):
+        """
+        Marks the blocks fully covered by a downloaded range.
+        :param start: First byte of the range.
+        :param size: Size of the range.
+        """
+        end = start + size
+        first = -(-start // self.block_size)
+        last = (
+            self.blocks if end >= self.file_size
+            else end // self.block_size
+        )
+        if first >= last:
+            return
+        with self._lock:
+            for block in range(first, last):
+                self.bits[block // 8] |= 1 << (block % 8)
+            if self._fp is None:
+                self._fp = open(self.path, 'r+b')
+            self._fp.seek(self._HEADER.size + first // 8)
+            self._fp.write(self.bits[first // 8:(last - 1) // 8 + 1])
+            self._fp.flush()
+
+    def completed(self, block):
+        return bool(self.bits[block // 8] & (1 << (block % 8)))
+
+    def missing(self):
+        """
+        Returns the byte ranges that are not downloaded yet.
+        :return: List of (start, end) tuples, end is exclusive.
+        """
+        ranges = []
+        for block in range(self.blocks):
+            if self.completed(block):
+                continue
+            start = block * self.block_size
+            end = min(start + self.block_size, self.file_size)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+    def remove(self):
+        """
+        Removes the bitmap once the download is completed.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,295 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, wait as wait_all
+
+from sevenbridges.errors import SbgError
+from sevenbridges.models.enums import PartSize, TransferState
+from sevenbridges.transfer.utils import Progress
+
+logger = logging.getLogger(__name__)
+
+
+class TransferManager:
+    """
+    Runs queued uploads and downloads on a fixed set of worker threads.
+
+    Transfers are not started as threads of their own, a worker runs each
+    transfer to the end and takes the next one, so the number of threads
+    does not grow with the number of queued transfers. Parts of the
+    running transfers share the upload and download pools of the Api and
+    the upload bytes in flight limit.
+
+    Queued transfers are split in two lanes by file size, half of the
+    workers prefer small files and the other half large ones, so a flood
+    of small files does not hold back large ones and the other way round.
+    Within a lane transfers with lower priority values go first.
+
+    Futures of transfers which fail or are stopped resolve with an error.
+    """
+    SMALL_FILE_SIZE = 64 * PartSize.MB
+    SMALL, LARGE = 'small', 'large'
+
+    def __init__(self, max_transfers=8, small_file_size=SMALL_FILE_SIZE):
+        """
+        :param max_transfers: Maximum number of transfers running at the
+            same time.
+        :param small_file_size: Files up to this size go to the small
+            files lane.
+        """
+        if max_transfers < 1:
+            raise SbgError('At least one concurrent transfer is required.')
+        self.max_transfers = max_transfers
+        self.small_file_size = small_file_size
+        self._lanes = {self.SMALL: [], self.LARGE: []}
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._workers = []
+        # Futures of the running transfers mapped to the transfers
+        self._active = {}
+        self._cancelled = set()
+        self._futures = set()
+        self._callbacks = []
+        self._progress = None
+        self._shutdown = False
+        self._time_started = None
+        self._transfers = 0
+        self._finished = 0
+        self._total_bytes = 0
+        self._finished_bytes = 0
+
+    def __repr__(self):
+        return (
+            f'<TransferManager: max_transfers={self.max_transfers}, '
+            f'queued={self.queued}, running={len(self._active)}>'
+        )
+
+    @property
+    def queued(self):
+        with self._condition:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def submit(self, transfer, priority=0, size=None):
+        """
+        Queues an upload or download which was not started.
+        :param transfer: Upload or Download instance, or a callable creating
+            it once a worker takes it, so that queued transfers hold no
+            sessions.
+        :param priority: Transfers with lower values are started first.
+        :param size: Size of the file transferred, taken from the transfer
+            if not given.
+        :return: Future resolving to the transfer once it is finished.
+            Use cancel to stop the transfer.
+        """
+        future = Future()
+        if size is None:
+            size = getattr(transfer, '_file_size', 0) or 0
+        lane = self.SMALL if size <= self.small_file_size else self.LARGE
+        if not callable(transfer):
+            self._watch(transfer)
+        with self._condition:
+            if self._shutdown:
+                raise SbgError('Transfer manager is shut down.')
+            if self._time_started is None:
+                self._time_started = time.time()
+            heapq.heappush(
+                self._lanes[lane],
+                (priority, next(self._counter), transfer, future, size)
+            )
+            self._transfers += 1
+            self._total_bytes += size
+            self._futures.add(future)
+            self._spawn_worker()
+            self._condition.notify()
+        future.add_done_callback(self._discard)
+        return future
+
+    def cancel(self, future):
+        """
+        Cancels a queued transfer or stops a running one, blocking until
+        the transfer is stopped.
+        :param future: Future returned by submit.
+        :return: True if the transfer was cancelled or stopped, False if
+            it was already finished.
+        """
+        if future.cancel():
+            return True
+        with self._condition:
+            if future.done():
+                return False
+            transfer = self._active.get(future)
+            if transfer is None or transfer.status == TransferState.PREPARING:
+                # The transfer is not created or not running yet, it is
+                # not started or stopped by the worker once it runs
+                self._cancelled.add(future)
+                if transfer is not None:
+                    transfer._stop_signal = True
+                return True
+        try:
+            transfer.stop()
+        except SbgError:
+            return False
+        return True
+
+    def add_progress_callback(self, callback):
+        """
+        Adds a callback called with the aggregate progress of all
+        transfers every time one of them makes progress. Parts of the
+        progress are the transfers.
+        :param callback: Callback function.
+        """
+        self._callbacks.append(callback)
+
+    def progress(self):
+        """
+        Returns the aggregate progress of all submitted transfers.
+        :return: Progress object.
+        """
+        return Progress(*self._aggregate())
+
+    def _aggregate(self):
+        with self._condition:
+            bytes_done = self._finished_bytes + sum(
+                transfer._bytes_done for transfer in self._active.values()
+            )
+            started = self._time_started or time.time()
+            return (
+                self._transfers, self._finished, bytes_done,
+                self._total_bytes or 1, (time.time() - started) * 1000
+            )
+
+    def wait(self):
+        """
+        Blocks until all submitted transfers are finished.
+        """
+        while True:
+            with self._condition:
+                futures = list(self._futures)
+            if not futures:
+                return
+            wait_all(futures)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the workers once the queued transfers are finished.
+        :param wait: Block until the workers are stopped.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def _discard(self, future):
+        with self._condition:
+            self._futures.discard(future)
+
+    def _watch(self, transfer):
+        callback = transfer._progress_callback
+
+        def progress(value):
+            if callback:
+                callback(value)
+            self._notify()
+        transfer.add_progress_callback(progress)
+
+    def _notify(self):
+        if self._callbacks:
+            # Callbacks get the same progress object every time
+            if self._progress is None:
+                self._progress = self.progress()
+            progress = self._progress.update(*self._aggregate())
+            for callback in self._callbacks:
+                callback(progress)
+
+    def _spawn_worker(self):
+        if len(self._workers) >= self.max_transfers:
+            return
+        lane = self.LARGE if len(self._workers) % 2 == 0 else self.SMALL
+        worker = threading.Thread(
+            target=self._work, args=(lane,), daemon=True,
+            name=f'transfer-{len(self._workers)}'
+        )
+        self._workers.append(worker)
+        worker.start()
+
+    def _next(self, preferred):
+        """
+        Takes the transfer with the lowest priority value, from the
+        preferred lane on a tie.
+        """
+        other = self.LARGE if preferred == self.SMALL else self.SMALL
+        lane = self._lanes[preferred]
+        if not lane or (
+                self._lanes[other] and self._lanes[other][0][0] < lane[0][0]
+        ):
+            lane = self._lanes[other]
+        return heapq.heappop(lane)
+
+    def _work(self, lane):
+        while True:
+            with self._condition:
+                while not any(self._lanes.values()) and not self._shutdown:
+                    self._condition.wait()
+                if not any(self._lanes.values()):
+                    return
+                _, _, transfer, future, size = self._next(lane)
+                if not future.set_running_or_notify_cancel():
+                    self._transfers -= 1
+                    self._total_bytes -= size
+                    continue
+            try:
+                self._run(transfer, future)
+            except BaseException:
+                # The worker exits, another one takes the queued transfers
+                with self._condition:
+                    self._workers.remove(threading.current_thread())
+                    if any(self._lanes.values()):
+                        self._spawn_worker()
+                raise
+
+    def _run(self, transfer, future):
+        error, stopped = None, False
+        try:
+            if callable(transfer):
+                transfer = transfer()
+                self._watch(transfer)
+            with self._condition:
+                stopped = future in self._cancelled
+                if not stopped:
+                    self._active[future] = transfer
+            if not stopped:
+                transfer.run()
+                stopped = getattr(transfer, '_stop_signal', False)
+                with self._condition:
+                    cancelled = future in self._cancelled
+                if cancelled and transfer.status in (
+                        TransferState.RUNNING, TransferState.PAUSED
+                ):
+                    transfer.stop()
+        except Exception as e:
+            logger.debug('Transfer %s failed: %s', transfer, e)
+            error = e
+        except BaseException:
+            # Interrupts propagate, the future still resolves so that
+            # waiting for it does not block forever
+            error = SbgError('Transfer interrupted.')
+            raise
+        finally:
+            with self._condition:
+                self._active.pop(future, None)
+                self._cancelled.discard(future)
+                self._finished += 1
+                self._finished_bytes += getattr(transfer, '_bytes_done', 0)
+            failed = getattr(transfer, 'status', None) == TransferState.FAILED
+            if error is None and not stopped and not failed:
+                future.set_result(transfer)
+            else:
+                future.set_exception(error or SbgError(
+                    'Transfer stopped.' if stopped else 'Transfer failed.'
+                ))
+        self._notify()
@@ -0,0 +1,226 @@
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+
+from sevenbridges.errors import SbgError, StorageError
+from sevenbridges.http.client import generate_session
+from sevenbridges.models.enums import PartSize, RequestParameters
+from sevenbridges.transfer.utils import PartRetry, bandwidth_bucket
+
+logger = logging.getLogger(__name__)
+
+
+def _get_range(session, url, timeout, start_byte, end_byte):
+    """
+    Fetches a byte range of the resource into memory.
+    :param session: Requests session.
+    :param url: Url of the resource.
+    :param timeout: Session timeout.
+    :param start_byte: First byte of the range.
+    :param end_byte: Last byte of the range, inclusive.
+    :return: Range content.
+    """
+    try:
+        response = session.get(
+            url=url, timeout=timeout,
+            headers={'Range': f'bytes={start_byte}-{end_byte}'}
+        )
+        response.raise_for_status()
+    except (requests.HTTPError, requests.RequestException) as e:
+        response = getattr(e, 'response', None)
+        raise StorageError(
+            f'Failed to read file range. Response: {e}',
+            status=response.status_code if response is not None else None
+        )
+    content = response.content
+    if len(content) != end_byte - start_byte + 1:
+        raise SbgError(
+            f'Expected {end_byte - start_byte + 1} bytes from range '
+            f'{start_byte}-{end_byte}, got {len(content)}.'
+        )
+    return content
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    Read only file object serving reads of a remote file through HTTP
+    range requests on its download url.
+
+    The file is read in blocks kept in a least recently used cache, so
+    formats which jump between an index and the data, like BAM indexes or
+    Parquet footers, fetch only the blocks they touch. Once the reads turn
+    sequential the following blocks are fetched ahead on the download pool
+    of the Api.
+    """
+
+    def __init__(
+            self, url, size, api, block_size=PartSize.MB, cache_blocks=64,
+            read_ahead=4, retry=RequestParameters.DEFAULT_RETRY_COUNT,
+            timeout=RequestParameters.DEFAULT_TIMEOUT, refresh_url=None,
+            name=None, sequential=False
+    ):
+        """
+        :param url: Download url of the file.
+        :param size: File size.
+        :param api: Api instance.
+        :param block_size: Size of the cached blocks.
+        :param cache_blocks: Maximum number of blocks kept in the cache.
+        :param read_ahead: Number of blocks fetched ahead of sequential
+            reads, 0 disables read ahead.
+        :param retry: Number of retries of a single block.
+        :param timeout: Timeout for http requests.
+        :param refresh_url: Callable returning a new url of the file,
+            called when the url expired.
+        :param name: File name.
+        :param sequential: Fetch blocks ahead from the first read instead
+            of waiting for the reads to turn sequential.
+        """
+        super().__init__()
+        if block_size <= 0:
+            raise SbgError('Block size must be positive.')
+        self.url = url
+        self.size = size
+        self.name = name
+        self.block_size = block_size
+        self.cache_blocks = max(cache_blocks, read_ahead + 1)
+        self.read_ahead = read_ahead
+        self.timeout = timeout
+        self.refresh_url = refresh_url
+        self._retry = PartRetry(retry_count=retry)
+        self._pool = api.download_pool
+        self._bandwidth = bandwidth_bucket(api, 'download')
+        self._session = generate_session(
+            pool_connections=api.pool_connections,
+            pool_maxsize=api.pool_maxsize,
+            pool_block=api.pool_block,
+            proxies=api.session.proxies,
+            retry_count=retry,
+        )
+        self._position = 0
+        self._last_block = -1 if sequential else None
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<RemoteFile: name={self.name}, size={self.size}>'
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._check_closed()
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_closed()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence ({whence})')
+        if position < 0:
+            raise ValueError(f'Negative seek position {position}')
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        self._check_closed()
+        view = memoryview(buffer).cast('B')
+        end = min(self._position + len(view), self.size)
+        written = 0
+        while self._position < end:
+            index, offset = divmod(self._position, self.block_size)
+            block = self._block(index)
+            count = min(len(block) - offset, end - self._position)
+            view[written:written + count] = block[offset:offset + count]
+            written += count
+            self._position += count
+        return written
+
+    def readall(self):
+        return self.read(max(self.size - self._position, 0))
+
+    def close(self):
+        if not self.closed:
+            with self._lock:
+                for future in self._pending.values():
+                    future.cancel()
+                self._pending.clear()
+                self._cache.clear()
+            self._session.close()
+        super().close()
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+    def _block(self, index):
+        sequential = self._last_block in (index, index - 1)
+        self._last_block = index
+        with self._lock:
+            block = self._cache.get(index)
+            if block is not None:
+                self._cache.move_to_end(index)
+            future = self._pending.get(index)
+        if sequential and self.read_ahead:
+            self._prefetch(index + 1)
+        if block is None:
+            block = future.result() if future else self._fetch(index)
+        return block
+
+    def _prefetch(self, first):
+        last = min(first + self.read_ahead, self._blocks())
+        with self._lock:
+            for index in range(first, last):
+                if index not in self._cache and index not in self._pending:
+                    self._pending[index] = self._pool.submit(
+                        self._fetch, index
+                    )
+
+    def _blocks(self):
+        return -(-self.size // self.block_size)
+
+    def _fetch(self, index):
+        start_byte = index * self.block_size
+        end_byte = min(start_byte + self.block_size, self.size) - 1
+        used = []
+
+        def attempt():
+            used.append(self.url)
+            if self._bandwidth is not None:
+                self._bandwidth.consume(end_byte - start_byte + 1)
+            return _get_range(
+                self._session, used[-1], self.timeout, start_byte, end_byte
+            )
+
+        def refresh():
+            with self._lock:
+                # Blocks failing on the same expired url refresh it once
+                if self.url == used[-1]:
+                    self.url = self.refresh_url()
+
+        try:
+            block = self._retry.call(
+                attempt, refresh=refresh if self.refresh_url else None
+            )
+        except SbgError:
+            with self._lock:
+                self._pending.pop(index, None)
+            raise
+        with self._lock:
+            self._pending.pop(index, None)
+            self._cache[index] = block
+            self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+        return block
@@ -1,11 +1,22 @@
+import io
 import os
+import mmap
 import time
 import logging
 import threading
+from concurrent.futures import wait
 
-from sevenbridges.errors import SbgError
+import requests
+
+from sevenbridges.errors import SbgError, StorageError
 from sevenbridges.http.client import generate_session
-from sevenbridges.transfer.utils import Progress, total_parts
+from sevenbridges.transfer.digest import TransferDigest
+from sevenbridges.transfer.journal import UploadJournal
+from sevenbridges.transfer.utils import (
+    FixedPartSize, PartRetry, Progress, TransferStats, TransferWindow,
+    UPLOAD_PART_LIMITS, bandwidth_bucket, iterate_parts, part_size_policy,
+    total_parts
+)
 from sevenbridges.models.enums import (
     PartSize, TransferState, RequestParameters
 )
@@ -25,8 +36,11 @@ def _get_part_url(api, url, upload, part):
     try:
         response = api.get(url.format(upload_id=upload, part_number=part))
         return response.json()['url']
-    except Exception:
-        raise SbgError(f'Unable to get upload url for part number {part}')
+    except Exception as e:
+        raise SbgError(
+            f'Unable to get upload url for part number {part}',
+            status=getattr(e, 'status', None)
+        )
 
 
 def _report_part(api, url, upload, part, e_tag):
@@ -49,7 +63,10 @@ def _report_part(api, url, upload, part, e_tag):
     try:
         api.post(url.format(upload_id=upload, part_number=''), data=part_data)
     except Exception as e:
-        raise SbgError(f'Unable to report part number {part}. Reason: {e}')
+        raise SbgError(
+            f'Unable to report part number {part}. Reason: {e}',
+            status=getattr(e, 'status', None)
+        )
 
 
 def _submit_part(session, url, part, timeout):
@@ -57,32 +74,67 @@ def _submit_part(session, url, part, timeout):
     Used by the worker to submit the part data to the storage service URL.
     :param session: Storage service session.
     :param url: Part url.
-    :param part: Part data in bytes.
+    :param part: Part data, bytes like object.
     :param timeout: Timeout for storage session.
     :return: ETag for the submitted part.
     """
     try:
         response = session.put(url, data=part, timeout=timeout)
+        response.raise_for_status()
         etag = response.headers.get('etag')
         return etag.strip('"') if etag else ""
+    except requests.HTTPError as e:
+        raise StorageError(
+            f'Failed to submit the part. Reason: {e}',
+            status=e.response.status_code
+        )
     except Exception as e:
-        raise SbgError(f'Failed to submit the part. Reason: {e}')
+        raise StorageError(f'Failed to submit the part. Reason: {e}')
 
 
-def _upload_part(api, session, url, upload, part_number, part, timeout):
+class _ThrottledPart:
     """
-    Used by the worker to upload a part to the storage service.
-    :param api: Api instance.
-    :param session: Storage service session.
-    :param url: Part url.
-    :param upload: Upload identifier.
-    :param part_number: Part number.
-    :param part: Part data.
-    :param timeout: Timeout for storage session.
+    File like part data which takes the bandwidth tokens of every chunk as
+    the http client reads it, so the part is sent at the limited rate.
+    Requests sends it as a body of known length with its Content-Length.
     """
-    part_url = _get_part_url(api, url, upload, part_number)
-    e_tag = _submit_part(session, part_url, part, timeout)
-    _report_part(api, url, upload, part_number, e_tag)
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, part, bandwidth):
+        """
+        :param part: Part data, memoryview.
+        :param bandwidth: TokenBucket limiting the upload bandwidth.
+        """
+        self._part = part
+        self._bandwidth = bandwidth
+        self._offset = 0
+
+    def __len__(self):
+        return len(self._part)
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.CHUNK_SIZE), b'')
+
+    def tell(self):
+        return self._offset
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Urllib3 rewinds the body before it retries the request
+        if whence == io.SEEK_CUR:
+            offset += self._offset
+        elif whence == io.SEEK_END:
+            offset += len(self._part)
+        self._offset = min(max(offset, 0), len(self._part))
+        return self._offset
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._part) - self._offset
+        chunk = bytes(self._part[self._offset:self._offset + size])
+        self._offset += len(chunk)
+        if chunk:
+            self._bandwidth.consume(len(chunk))
+        return chunk
 
 
 class UPartedFile:
@@ -91,7 +143,9 @@ class UPartedFile:
     }
 
     def __init__(
-        self, fp, file_size, part_size, upload, timeout, storage_session, api
+        self, fp, file_size, part_size, upload, timeout, storage_session, api,
+        window=None, completed=None, retry=None, prefetch=None, digest=None,
+        verify=False, stats=None
     ):
 
         """
@@ -105,6 +159,16 @@ class UPartedFile:
         :param timeout: Timeout for storage session service.
         :param storage_session: Storage session.
         :param api: Api instance.
+        :param window: TransferWindow, number of parts in flight.
+        :param completed: Numbers of the parts that were already uploaded,
+            these are skipped.
+        :param retry: PartRetry retrying failed parts, the part url is
+            fetched again for every retry.
+        :param prefetch: Number of part urls fetched ahead of the submitted
+            parts, defaults to the window size.
+        :param digest: TransferDigest computing checksums of the parts.
+        :param verify: Retry parts whose ETag does not match their MD5.
+        :param stats: TransferStats recording the part telemetry.
         """
         self.fp = fp
         self.file_size = file_size
@@ -115,51 +179,215 @@ class UPartedFile:
         self.api = api
         self.pool = api.upload_pool
         self.submitted = 0
-        self.total_submitted = 0
         self.total = total_parts(self.file_size, self.part_size) or 1
-        self.parts = self.get_parts()
+        completed = set(completed or ())
+        self.parts = [
+            part for part in self.get_parts() if part['part'] not in completed
+        ]
+        self.total_submitted = self.total - len(self.parts)
+        self.window = window or TransferWindow()
+        self.retry = retry or PartRetry()
+        self.prefetch = prefetch
+        self.digest = digest
+        self.verify = verify
+        self.stats = stats or TransferStats(retry=self.retry)
+        self._urls = {}
+        self.in_flight = getattr(api, 'upload_in_flight', None)
+        self.bandwidth = bandwidth_bucket(api, 'upload')
+        self._map = self._map_file()
+        self._buffers = []
+        self._buffers_lock = threading.Lock()
+
+    def _map_file(self):
+        """
+        Memory maps the file, parts are then sent straight from the page
+        cache without copying them into process memory.
+        """
+        if not self.file_size:
+            return None
+        try:
+            return mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            logger.debug('Unable to map the file, reading parts to buffers.')
+            return None
+
+    def _read_part(self, offset, size):
+        """
+        Returns the part data as a memoryview and the reusable buffer
+        backing it, if the file could not be mapped.
+        """
+        if not size:
+            return memoryview(b''), None
+        if self._map is not None:
+            return memoryview(self._map)[offset:offset + size], None
+
+        with self._buffers_lock:
+            buffer = self._buffers.pop() if self._buffers else None
+        if buffer is None or len(buffer) < size:
+            buffer = bytearray(max(size, self.part_size))
+        view = memoryview(buffer)[:size]
+        self.fp.seek(offset)
+        read = 0
+        while read < size:
+            count = self.fp.readinto(view[read:])
+            if not count:
+                view.release()
+                raise SbgError(
+                    f'Unexpected end of file at byte {offset + read}.'
+                )
+            read += count
+        return view, buffer
+
+    def _upload(self, part_number, view, buffer):
+        started = time.monotonic()
+        size = len(view)
+        part_url = self._prefetched_url(part_number)
+        hasher = None
+        if self.digest is not None:
+            hasher = self.digest.hasher()
+            hasher.update(view)
+
+        def attempt():
+            nonlocal part_url
+            url, part_url = part_url, None
+            if url is None:
+                with self.stats.timed('api'):
+                    url = _get_part_url(
+                        self.api, self._URL['upload_part'], self.upload_id,
+                        part_number
+                    )
+            body = view
+            if self.bandwidth is not None and self.bandwidth.rate and size:
+                body = _ThrottledPart(view, self.bandwidth)
+            self.stats.transferred(size)
+            with self.stats.timed('storage'):
+                e_tag = _submit_part(self.session, url, body, self.timeout)
+            if hasher is not None and (
+                    self.digest.check_part(hasher, e_tag) is False
+            ):
+                if self.verify:
+                    raise SbgError(
+                        f'ETag of part {part_number} does not match its MD5.'
+                    )
+                self.digest.mismatches.append(
+                    (f'part {part_number}', e_tag, hasher.md5.hex())
+                )
+            return e_tag
+
+        try:
+            e_tag = self.retry.call(attempt)
+            if hasher is not None:
+                self.digest.add_part(
+                    (part_number - 1) * self.part_size, hasher
+                )
+            # Reported right away, parts done survive a later failure
+            with self.stats.timed('api'):
+                self.retry.call(
+                    _report_part, self.api, self._URL['upload_part'],
+                    self.upload_id, part_number, e_tag
+                )
+            self.stats.part_done(size, time.monotonic() - started)
+            return part_number, e_tag
+        finally:
+            view.release()
+            if buffer is not None:
+                with self._buffers_lock:
+                    self._buffers.append(buffer)
+            if self.in_flight is not None:
+                self.in_flight.release(size)
 
     def submit(self):
 
         """
-        Partitions the file into chunks and submits them into group of 4
-        for upload on the api upload pool.
+        Partitions the file into chunks and submits them for upload on the
+        api upload pool until the window is full.
         :return: Futures
         """
         futures = []
-        while self.submitted < 4 and not self.done():
+        while self.submitted < self.window.size and not self.done():
             part = self.parts.pop(0)
             part_number = part['part']
             part_read_offset = part['offset']
-            part_read_limit = part['limit']
-
-            self.fp.seek(part_read_offset)
-            part_data = self.fp.read(part_read_limit - part_read_offset)
+            part_size = part['limit'] - part_read_offset
+
+            if self.in_flight is not None:
+                self.in_flight.acquire(part_size)
+            try:
+                view, buffer = self._read_part(part_read_offset, part_size)
+            except Exception:
+                if self.in_flight is not None:
+                    self.in_flight.release(part_size)
+                raise
+            if self.digest is not None:
+                self.digest.update(part_read_offset, view)
 
             futures.append(
-                self.pool.submit(
-                    _upload_part, self.api, self.session,
-                    self._URL['upload_part'], self.upload_id,
-                    part_number, part_data, self.timeout
-                )
+                self.pool.submit(self._upload, part_number, view, buffer)
             )
 
             self.submitted += 1
             self.total_submitted += 1
 
+        self._prefetch_urls()
         return futures
 
+    def _prefetch_urls(self):
+        """
+        Fetches urls of the parts next in line in parallel on the upload
+        pool, so the workers start sending them right away. The fetches are
+        queued ahead of the parts that use them.
+        """
+        depth = self.prefetch if self.prefetch is not None else (
+            self.window.size
+        )
+        for part in self.parts[:depth]:
+            part_number = part['part']
+            if part_number not in self._urls:
+                self._urls[part_number] = self.pool.submit(
+                    self._fetch_url, part_number
+                )
+
+    def _fetch_url(self, part_number):
+        with self.stats.timed('api'):
+            return _get_part_url(
+                self.api, self._URL['upload_part'], self.upload_id,
+                part_number
+            )
+
+    def _prefetched_url(self, part_number):
+        """
+        Returns the prefetched url of the part, or None if the worker has
+        to fetch it, because the fetch failed or did not start yet.
+        :param part_number: Part number.
+        """
+        future = self._urls.pop(part_number, None)
+        if future is None or future.cancel():
+            return None
+        try:
+            return future.result()
+        except SbgError as e:
+            logger.debug('Part url prefetch failed: %s', e)
+            return None
+
+    def close(self):
+        """
+        Unmaps the file and drops the url fetches not started. Parts still
+        in flight keep the mapping alive until they are released.
+        """
+        for future in list(self._urls.values()):
+            future.cancel()
+        self._urls = {}
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+
     def done(self):
         return self.total_submitted == self.total
 
     def __iter__(self):
-        futures = self.submit()
-        while futures:
-            future = futures[0]
-            self.submitted -= 1
-            futures.remove(future)
-            futures.extend(self.submit())
-            yield future.result()
+        return iterate_parts(self)
 
     def get_parts(self):
         """
@@ -192,7 +420,9 @@ class Upload(threading.Thread):
     def __init__(
         self, file_path, project=None, parent=None, file_name=None,
         overwrite=False, part_size=None, retry_count=None, timeout=None,
-        api=None
+        api=None, window=None, journal=None,
+        error_budget=PartRetry.DEFAULT_ERROR_BUDGET, checksums=False,
+        verify=False
     ):
         """
         Multipart File uploader.
@@ -201,23 +431,30 @@ class Upload(threading.Thread):
         :param project: Target project identifier.
         :param file_name: Optional file name.
         :param overwrite: If true will overwrite file on the server.
-        :param part_size: Size of part in bytes.
+        :param part_size: Size of part in bytes or PartSizePolicy, by
+            default part size is picked from the file size.
         :param retry_count: Retry count.
         :param timeout: Timeout for s3/google session.
         :param api: Api instance.
+        :param window: Number of parts in flight, defaults to the Api
+            transfer window.
+        :param journal: Journal file path or UploadJournal. Completed parts
+            are recorded in the journal and an upload interrupted by a
+            crash is resumed from it.
+        :param error_budget: Number of failed part attempts tolerated
+            before the upload fails, each part is retried up to
+            retry_count times.
+        :param checksums: Compute checksums of the file while it is
+            uploaded, available as digest.
+        :param verify: Compute checksums and retry parts whose ETag does
+            not match their MD5.
         """
         threading.Thread.__init__(self)
         self.daemon = True
 
         self._validate_project_parent(parent, project)
 
-        if not file_path:
-            raise SbgError('File path is not valid.')
-
-        if not os.path.isfile(file_path):
-            raise SbgError(
-                f'File path {file_path} is not a path to a valid file.'
-            )
+        file_size = self._source_size(file_path)
         if not api:
             raise SbgError('Api instance not provided!')
 
@@ -226,21 +463,41 @@ class Upload(threading.Thread):
         else:
             self._file_name = file_name
 
-        self._part_size = part_size or PartSize.UPLOAD_RECOMMENDED_SIZE
         self._project = project
         self._parent = parent
         self._file_path = file_path
-        self._file_size = os.path.getsize(self._file_path)
+        self._file_size = file_size
 
         self._verify_file_size()
 
+        # Parts of streams of unknown size must fit the largest object
+        self._part_size = part_size_policy(part_size).initial(
+            PartSize.MAXIMUM_OBJECT_SIZE if file_size is None else file_size,
+            UPLOAD_PART_LIMITS
+        )
+
         self._overwrite = overwrite
         self._retry = retry_count or RequestParameters.DEFAULT_RETRY_COUNT
         self._timeout = timeout or RequestParameters.DEFAULT_TIMEOUT
+        self._part_retry = PartRetry(
+            retry_count=self._retry, error_budget=error_budget
+        )
         self._api = api
+        self._window = window
+        self._bandwidth = bandwidth_bucket(api, 'upload')
+        if journal is not None and not isinstance(journal, UploadJournal):
+            journal = UploadJournal(journal)
+        self._journal = journal
+        self._checksums = checksums or verify
+        self._verify = verify
+        self._digest = None
+        self._stats = TransferStats(retry=self._part_retry)
+        self._progress = None
+        self._e_tags = {}
         self._bytes_done = 0
         self._time_started = 0
         self._running = threading.Event()
+        self._finished = threading.Event()
         self._status = TransferState.PREPARING
         self._callback = None
         self._errorback = None
@@ -262,6 +519,29 @@ class Upload(threading.Thread):
     def result(self):
         return self._result
 
+    @property
+    def bandwidth_limit(self):
+        """
+        Upload bandwidth limit in force in bytes per second, None if
+        unlimited.
+        """
+        return self._bandwidth.rate if self._bandwidth is not None else None
+
+    @property
+    def stats(self):
+        """
+        TransferStats with the telemetry of the upload.
+        """
+        return self._stats
+
+    @property
+    def digest(self):
+        """
+        TransferDigest with checksums of the uploaded file, if checksums
+        were requested.
+        """
+        return self._digest
+
     def _validate_project_parent(self, parent, project):
         if not project and not parent:
             raise SbgError('Project or parent identifier is required.')
@@ -270,12 +550,31 @@ class Upload(threading.Thread):
                 'Project and parent identifiers are mutually exclusive.'
             )
 
+    def _source_size(self, file_path):
+        """
+        Validates the file path and returns the file size.
+        """
+        if not file_path:
+            raise SbgError('File path is not valid.')
+
+        if not os.path.isfile(file_path):
+            raise SbgError(
+                f'File path {file_path} is not a path to a valid file.'
+            )
+        return os.path.getsize(file_path)
+
+    def _open_source(self):
+        return open(self._file_path, mode='rb')
+
     def _verify_file_size(self):
         """
         Verifies that the file is smaller then 5TB which is the maximum
         that is allowed for upload.
         """
-        if self._file_size > PartSize.MAXIMUM_OBJECT_SIZE:
+        if (
+                self._file_size is not None and
+                self._file_size > PartSize.MAXIMUM_OBJECT_SIZE
+        ):
             self._status = TransferState.FAILED
             raise SbgError(
                 f'File size = {self._file_size}b. '
@@ -295,9 +594,11 @@ class Upload(threading.Thread):
             init_params['overwrite'] = self._overwrite
 
         try:
-            response = self._api.post(
-                self._URL['upload_init'], data=init_data, params=init_params
-            )
+            with self._stats.timed('api'):
+                response = self._api.post(
+                    self._URL['upload_init'], data=init_data,
+                    params=init_params
+                )
             data = response.json()
             self._upload_id = data['upload_id']
             part_size = data.get('part_size')
@@ -311,6 +612,46 @@ class Upload(threading.Thread):
                 f'Reason: {e.message}'
             )
 
+    def _prepare_upload(self):
+        """
+        Resumes the upload recorded in the journal if it is still open on
+        the server, otherwise initializes a new one.
+        """
+        if self._journal is not None:
+            destination = self._create_init_data()
+            destination.pop('part_size', None)
+            state = self._journal.load(self._file_path, destination)
+            if state and self._upload_open(state['upload_id']):
+                logger.info(
+                    'Resuming upload %s, %s parts already uploaded',
+                    state['upload_id'], len(state['parts'])
+                )
+                self._upload_id = state['upload_id']
+                self._part_size = state['part_size']
+                self._e_tags = state['parts']
+                self._bytes_done = min(
+                    len(self._e_tags) * self._part_size, self._file_size
+                )
+                return
+
+        self._initialize_upload()
+        if self._journal is not None:
+            self._journal.start(
+                self._upload_id, self._part_size, self._file_path,
+                destination
+            )
+
+    def _upload_open(self, upload_id):
+        try:
+            with self._stats.timed('api'):
+                self._api.get(
+                    self._URL['upload_info'].format(upload_id=upload_id)
+                )
+            return True
+        except SbgError as e:
+            logger.info('Journaled upload %s not resumable: %s', upload_id, e)
+            return False
+
     def _create_init_data(self):
         init_data = {
             'name': self._file_name,
@@ -330,12 +671,17 @@ class Upload(threading.Thread):
         """
         from sevenbridges.models.file import File
         try:
-            response = self._api.post(
-                self._URL['upload_complete'].format(upload_id=self._upload_id)
-            ).json()
+            with self._stats.timed('api'):
+                response = self._api.post(
+                    self._URL['upload_complete'].format(
+                        upload_id=self._upload_id
+                    )
+                ).json()
             # noinspection PyArgumentList
             self._result = File(api=self._api, **response)
             self._status = TransferState.COMPLETED
+            if self._journal is not None:
+                self._journal.remove()
 
         except SbgError as e:
             self._status = TransferState.FAILED
@@ -413,10 +759,13 @@ class Upload(threading.Thread):
         :raises SbgError: If upload is not in PAUSED or RUNNING state.
         """
         if self.status in (TransferState.PAUSED, TransferState.RUNNING):
-            self._running.clear()
             self._stop_signal = True
-            self.join()
+            # Wakes up a paused upload so it sees the stop signal
+            self._running.set()
+            self._join()
             self._abort_upload()
+            if self._journal is not None:
+                self._journal.remove()
             self._status = TransferState.STOPPED
             if self._callback:
                 return self._callback(self._status)
@@ -442,6 +791,16 @@ class Upload(threading.Thread):
         """
         self.join()
 
+    def _join(self):
+        """
+        Waits until run returns, on the own thread of the upload or on
+        the transfer manager worker running it.
+        """
+        if self.ident is not None:
+            self.join()
+        else:
+            self._finished.wait()
+
     def start(self):
         """
         Starts the upload.
@@ -458,40 +817,62 @@ class Upload(threading.Thread):
         """
         Runs the thread! Should not be used use start() method instead.
         """
+        try:
+            self._transfer()
+        finally:
+            self._finished.set()
+
+    def _transfer(self):
         self._running.set()
         self._status = TransferState.RUNNING
         self._time_started = time.time()
 
-        # Initializes the upload
-        self._initialize_upload()
+        # Initializes the upload or resumes the journaled one
+        self._prepare_upload()
+        if self._checksums:
+            self._digest = self._create_digest()
+        # Bytes of the parts uploaded before the upload was resumed
+        resumed = self._bytes_done
 
         # Opens the file for reading in binary mode.
         try:
-            with open(self._file_path, mode='rb') as fp:
+            with self._open_source() as fp:
                 # Creates a partitioned file
                 parted_file = self.partition_file(fp)
 
                 # Iterates over parts and submits them for upload.
-                for _ in parted_file:
-                    if self._stop_signal:
-                        return
-                    self._running.wait()
-                    self._bytes_done += self._part_size
-                    # If the progress callback is set we need to provide a
-                    # progress object for it.
-                    if self._progress_callback:
-                        progress = Progress(
-                            parted_file.total, parted_file.total_submitted,
-                            self._bytes_done, self._file_size, self.duration
-                        )
-                        self._progress_callback(progress)
+                try:
+                    for part_number, e_tag in parted_file:
+                        self._e_tags[part_number] = e_tag
+                        if self._journal is not None:
+                            self._journal.part_done(part_number, e_tag)
+                        if self._stop_signal:
+                            return
+                        self._running.wait()
+                        self._bytes_done = resumed + self._stats.bytes_done
+                        # If the progress callback is set we need to provide
+                        # a progress object for it.
+                        if self._progress_callback:
+                            self._progress_callback(self._update_progress(
+                                parted_file.total,
+                                parted_file.total_submitted,
+                                parted_file.file_size
+                            ))
+                    if self._digest is not None:
+                        self._digest.size = parted_file.file_size
+                        self._digest.finish()
+                        self._digest.verify_parts()
+                finally:
+                    parted_file.close()
+                    if self._journal is not None:
+                        self._journal.close()
         except IOError:
             raise SbgError(f'Unable to open file {self._file_path}')
         except Exception as e:
             # If the errorback callback is set call it with status
             self._status = TransferState.FAILED
             if self._errorback:
-                self._errorback(self._status)
+                return self._errorback(self._status)
             else:
                 raise SbgError(str(e))
 
@@ -502,10 +883,41 @@ class Upload(threading.Thread):
         if self._callback:
             self._callback(self._status)
 
+    def _update_progress(self, num_of_parts, parts_done, file_size):
+        """
+        Updates the progress object passed to every progress callback.
+        """
+        if self._progress is None:
+            self._progress = Progress(
+                num_of_parts, parts_done, self._bytes_done, file_size,
+                self.duration, self.bandwidth_limit, stats=self._stats
+            )
+            return self._progress
+        return self._progress.update(
+            num_of_parts, parts_done, self._bytes_done, file_size,
+            self.duration, self.bandwidth_limit
+        )
+
+    def _create_window(self):
+        return TransferWindow(
+            size=self._window or getattr(
+                self._api, 'transfer_window', TransferWindow.DEFAULT_SIZE
+            ),
+            maximum=getattr(self._api, 'upload_max_workers', None),
+            adaptive=getattr(self._api, 'adaptive_transfer_window', False),
+        )
+
+    def _create_digest(self):
+        return TransferDigest(
+            self._file_size, path=self._file_path, part_size=self._part_size
+        )
+
     def partition_file(self, fp):
         return UPartedFile(
             fp, self._file_size, self._part_size, self._upload_id,
-            self._timeout, self.session, self._api
+            self._timeout, self.session, self._api, self._create_window(),
+            completed=self._e_tags, retry=self._part_retry,
+            digest=self._digest, verify=self._verify, stats=self._stats
         )
 
 
@@ -566,7 +978,9 @@ class CodePackageUpload(Upload):
     def partition_file(self, fp):
         return CodePackageUPartedFile(
             fp, self._file_size, self._part_size, self._upload_id,
-            self._timeout, self.session, self._api
+            self._timeout, self.session, self._api, self._create_window(),
+            completed=self._e_tags, retry=self._part_retry,
+            digest=self._digest, verify=self._verify, stats=self._stats
         )
 
     def _create_init_data(self):
@@ -578,3 +992,407 @@ class CodePackageUpload(Upload):
         if self._part_size:
             init_data['part_size'] = self._part_size
         return init_data
+
+
+class _StreamReader:
+    """
+    Reads a binary file object or an iterable of bytes chunks, like a pipe,
+    stdin or a generator, into part buffers.
+    """
+
+    def __init__(self, source):
+        self._readinto = getattr(source, 'readinto', None)
+        self._read = getattr(source, 'read', None)
+        self._chunks = (
+            iter(source) if self._readinto is None and self._read is None
+            else None
+        )
+        self._pending = memoryview(b'')
+        self.bytes_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # The source is owned by the caller
+        return False
+
+    def _read_some(self, view):
+        if not self._pending and self._readinto is not None:
+            return self._readinto(view) or 0
+        while not self._pending:
+            if self._read is not None:
+                chunk = self._read(len(view))
+            else:
+                chunk = next(self._chunks, None)
+            if not chunk:
+                if chunk is None or self._read is not None:
+                    return 0
+                continue
+            self._pending = memoryview(chunk).cast('B')
+        count = min(len(view), len(self._pending))
+        view[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def readinto(self, view):
+        """
+        Fills the view, fewer bytes are read only at the end of the stream.
+        :param view: Writable memoryview.
+        :return: Number of bytes read.
+        """
+        filled = 0
+        while filled < len(view):
+            count = self._read_some(view[filled:])
+            if not count:
+                break
+            filled += count
+        self.bytes_read += filled
+        return filled
+
+    def read(self, size):
+        buffer = bytearray(size)
+        del buffer[self.readinto(memoryview(buffer)):]
+        return buffer
+
+    def unread(self, data):
+        """
+        Pushes back data read last, it is read again before the source.
+        The data is not copied and must not be changed by the caller.
+        """
+        self.bytes_read -= len(data)
+        if self._pending:
+            data = bytes(data) + self._pending
+        self._pending = memoryview(data)
+
+
+class StreamUPartedFile(UPartedFile):
+    def __init__(
+        self, reader, file_size, part_size, upload, timeout, storage_session,
+        api, window=None, retry=None, digest=None, verify=False, stats=None,
+        first=None
+    ):
+        """
+        Partitions a stream into parts as it is read. Parts are read into a
+        ring of buffers reused once a part is uploaded, so at most a window
+        of parts is held in memory. The window does not grow.
+
+        :param reader: Stream reader.
+        :param file_size: Stream size, None if unknown.
+        :param part_size: Part size.
+        :param upload: Upload identifier.
+        :param timeout: Timeout for storage session service.
+        :param storage_session: Storage session.
+        :param api: Api instance.
+        :param window: TransferWindow, number of parts in flight.
+        :param retry: PartRetry retrying failed parts.
+        :param digest: TransferDigest computing checksums of the parts.
+        :param verify: Retry parts whose ETag does not match their MD5.
+        :param stats: TransferStats recording the part telemetry.
+        :param first: Buffer holding the first part, read ahead before the
+            upload was initialized and already acquired from the bytes in
+            flight.
+        """
+        self.fp = reader
+        self._size = file_size
+        self.part_size = part_size
+        self.upload_id = upload
+        self.timeout = timeout
+        self.session = storage_session
+        self.api = api
+        self.pool = api.upload_pool
+        self.submitted = 0
+        self.total_submitted = 0
+        # Part urls are not prefetched, the number of parts is not known
+        self.parts = []
+        self.prefetch = 0
+        self.window = window or TransferWindow()
+        self.retry = retry or PartRetry()
+        self.digest = digest
+        self.verify = verify
+        self.stats = stats or TransferStats(retry=self.retry)
+        self._urls = {}
+        self.in_flight = getattr(api, 'upload_in_flight', None)
+        self.bandwidth = bandwidth_bucket(api, 'upload')
+        self._map = None
+        self._buffers = []
+        self._buffers_lock = threading.Lock()
+        self._first = first
+        self._ended = False
+
+    @property
+    def file_size(self):
+        return self._size if self._size is not None else self.fp.bytes_read
+
+    @property
+    def total(self):
+        if self._size is not None:
+            return total_parts(self._size, self.part_size) or 1
+        return self.total_submitted + (0 if self._ended else 1)
+
+    def done(self):
+        return self._ended
+
+    def _next_part(self):
+        """
+        Reads the next part from the stream.
+        :return: Part data as a memoryview and the buffer backing it, or
+            None if the stream ended on a part boundary.
+        """
+        if self._first is not None:
+            buffer, self._first = self._first, None
+            view = memoryview(buffer)
+        else:
+            # Bytes are taken before the buffer is allocated and filled, the
+            # unused rest of a short last part is given back
+            if self.in_flight is not None:
+                self.in_flight.acquire(self.part_size)
+            try:
+                with self._buffers_lock:
+                    buffer = self._buffers.pop() if self._buffers else None
+                if buffer is None:
+                    buffer = bytearray(self.part_size)
+                view = memoryview(buffer)[:self.part_size]
+                read = self.fp.readinto(view)
+            except Exception:
+                if self.in_flight is not None:
+                    self.in_flight.release(self.part_size)
+                raise
+            if self.in_flight is not None:
+                self.in_flight.release(self.part_size - read)
+            view = view[:read]
+        try:
+            return self._check_part(view, buffer)
+        except Exception:
+            if self.in_flight is not None:
+                self.in_flight.release(len(view))
+            raise
+
+    def _check_part(self, view, buffer):
+        read = self.fp.bytes_read
+        if len(view) < self.part_size or read == self._size:
+            self._ended = True
+        if self._size is not None and (
+                read > self._size or self._ended and read != self._size
+        ):
+            raise SbgError(
+                f'Stream size does not match, expected {self._size} bytes, '
+                f'read {read} bytes.'
+            )
+        if not view and self.total_submitted:
+            with self._buffers_lock:
+                self._buffers.append(buffer)
+            return None
+        if self.total_submitted >= PartSize.MAXIMUM_TOTAL_PARTS:
+            raise SbgError(
+                f'Stream exceeds {PartSize.MAXIMUM_TOTAL_PARTS} parts of '
+                f'{self.part_size} bytes.'
+            )
+        return view, buffer
+
+    def submit(self):
+        """
+        Reads parts from the stream and submits them for upload on the
+        api upload pool until the window is full.
+        :return: Futures
+        """
+        futures = []
+        while self.submitted < self.window.size and not self.done():
+            try:
+                part = self._next_part()
+            except Exception:
+                # Parts already submitted are let finish
+                wait(futures)
+                raise
+            if part is None:
+                break
+            view, buffer = part
+            if self.digest is not None:
+                self.digest.update(self.total_submitted * self.part_size, view)
+
+            futures.append(self.pool.submit(
+                self._upload, self.total_submitted + 1, view, buffer
+            ))
+            self.submitted += 1
+            self.total_submitted += 1
+        return futures
+
+
+class StreamUpload(Upload):
+    """
+    Multipart upload of a stream which can only be read once, parts are
+    uploaded as they are read without staging the stream on the disk.
+    """
+    DEFAULT_MAX_MEMORY = 512 * PartSize.MB
+
+    def __init__(
+        self, source, file_name, project=None, parent=None, size=None,
+        overwrite=False, part_size=None, retry_count=None, timeout=None,
+        api=None, window=None, error_budget=PartRetry.DEFAULT_ERROR_BUDGET,
+        checksums=False, verify=False, max_memory=None
+    ):
+        """
+        :param source: Binary file object or iterable of bytes chunks.
+        :param file_name: File name.
+        :param project: Target project identifier.
+        :param parent: Parent folder identifier.
+        :param size: Stream size if known. Without it parts are sized so
+            that the buffered parts fit into max_memory, unless part_size
+            is set in bytes.
+        :param overwrite: If true will overwrite file on the server.
+        :param part_size: Size of part in bytes or PartSizePolicy.
+        :param retry_count: Retry count.
+        :param timeout: Timeout for s3/google session.
+        :param api: Api instance.
+        :param window: Number of parts in flight, each of them is held in
+            memory.
+        :param error_budget: Number of failed part attempts tolerated
+            before the upload fails.
+        :param checksums: Compute checksums of the stream while it is
+            uploaded, available as digest.
+        :param verify: Compute checksums and retry parts whose ETag does
+            not match their MD5.
+        :param max_memory: Memory in bytes for the part buffers of a stream
+            of unknown size, the window of parts in flight and the part
+            being read. Parts do not get smaller than the minimum part
+            size and the stream may have at most 10000 parts.
+        """
+        if not file_name:
+            raise SbgError('File name is required.')
+        self._reader = _StreamReader(source)
+        self._stream_size = size
+        self._first = None
+        super().__init__(
+            file_path=source, project=project, parent=parent,
+            file_name=file_name, overwrite=overwrite, part_size=part_size,
+            retry_count=retry_count, timeout=timeout, api=api,
+            window=window, error_budget=error_budget, checksums=checksums,
+            verify=verify
+        )
+        if size is None and not isinstance(
+                part_size_policy(part_size), FixedPartSize
+        ):
+            self._part_size = self._memory_part_size(
+                max_memory or self.DEFAULT_MAX_MEMORY
+            )
+
+    def __repr__(self):
+        return f'<StreamUpload: status={self.status}>'
+
+    def _memory_part_size(self, max_memory):
+        """
+        Caps the part size of a stream of unknown size, parts in flight
+        and the part being read have to fit into max_memory.
+        :param max_memory: Memory for part buffers in bytes.
+        :return: Part size in bytes.
+        """
+        parts = self._create_window().size + 1
+        size = max_memory // parts // PartSize.MB * PartSize.MB
+        return max(
+            min(self._part_size, size), PartSize.UPLOAD_MINIMUM_PART_SIZE
+        )
+
+    def _source_size(self, file_path):
+        if file_path is None:
+            raise SbgError('Stream is not valid.')
+        return self._stream_size
+
+    def _open_source(self):
+        return self._reader
+
+    def _prepare_upload(self):
+        """
+        Reads ahead up to a part before the upload is initialized, a stream
+        shorter than a part is uploaded with its size known. The data read
+        becomes the buffer of the first part.
+        """
+        if self._file_size is not None:
+            return super()._prepare_upload()
+
+        in_flight = getattr(self._api, 'upload_in_flight', None)
+        if in_flight is not None:
+            in_flight.acquire(self._part_size)
+        first = bytearray()
+        try:
+            if self._read_first(first, self._part_size):
+                self._file_size = len(first)
+        finally:
+            if in_flight is not None:
+                in_flight.release(self._part_size - len(first))
+        try:
+            super()._prepare_upload()
+            self._fit_first(first)
+        except Exception:
+            if in_flight is not None:
+                in_flight.release(len(first))
+            raise
+        self._first = first
+
+    def _read_first(self, first, size):
+        """
+        Reads the stream into the first part buffer up to size bytes, the
+        buffer grows as the stream is read so a short stream does not
+        allocate a whole part.
+        :return: Whether the stream ended.
+        """
+        while len(first) < size:
+            step = min(size - len(first), 8 * PartSize.MB)
+            chunk = self._reader.read(step)
+            first += chunk
+            if len(chunk) < step:
+                return True
+        return False
+
+    def _fit_first(self, first):
+        """
+        Fits the first part buffer to the part size picked by the server.
+        """
+        in_flight = getattr(self._api, 'upload_in_flight', None)
+        if len(first) > self._part_size:
+            self._reader.unread(first[self._part_size:])
+            if in_flight is not None:
+                in_flight.release(len(first) - self._part_size)
+            del first[self._part_size:]
+            return
+        if self._file_size is not None or len(first) == self._part_size:
+            return
+        if in_flight is not None:
+            in_flight.acquire(self._part_size - len(first))
+        try:
+            self._read_first(first, self._part_size)
+        finally:
+            if in_flight is not None:
+                in_flight.release(self._part_size - len(first))
+
+    def _create_init_data(self):
+        init_data = super()._create_init_data()
+        if self._file_size is None:
+            init_data.pop('size')
+        return init_data
+
+    def _finalize_upload(self):
+        self._file_size = self._reader.bytes_read
+        super()._finalize_upload()
+
+    def _create_window(self):
+        # Every part in flight holds a buffer, the ring of buffers is not
+        # grown by an adaptive window
+        return TransferWindow(
+            size=self._window or getattr(
+                self._api, 'transfer_window', TransferWindow.DEFAULT_SIZE
+            )
+        )
+
+    def _create_digest(self):
+        # Parts ahead of the file MD5 are held, there is no file to reread
+        return TransferDigest(
+            self._file_size or 0, part_size=self._part_size
+        )
+
+    def partition_file(self, fp):
+        return StreamUPartedFile(
+            fp, self._file_size, self._part_size, self._upload_id,
+            self._timeout, self.session, self._api, self._create_window(),
+            retry=self._part_retry, digest=self._digest, verify=self._verify,
+            stats=self._stats, first=self._first
+        )
@@ -1,7 +1,20 @@
 import sys
+import time
+import random
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
 
 import math
 
+from sevenbridges.errors import SbgError, StorageError
+from sevenbridges.models.enums import PartSize, RequestParameters
+
+logger = logging.getLogger(__name__)
+
 
 class Part:
     def __init__(self, start=None, size=None):
@@ -17,14 +30,34 @@ class Part:
         return self._size
 
 
+# Outcome of a single file transfer of a directory or a batch of files
+TransferResult = namedtuple(
+    'TransferResult', ['path', 'status', 'file', 'error']
+)
+
+
 class Progress:
     def __init__(self, num_of_parts, parts_done, bytes_done,
-                 file_size, duration):
+                 file_size, duration, bandwidth_limit=None, stats=None):
+        self.update(
+            num_of_parts, parts_done, bytes_done, file_size, duration,
+            bandwidth_limit
+        )
+        self._stats = stats
+
+    def update(self, num_of_parts, parts_done, bytes_done, file_size,
+               duration, bandwidth_limit=None):
+        """
+        Updates the progress in place, transfers pass the same object to
+        every call of the progress callback.
+        """
         self._num_of_parts = num_of_parts
         self._parts_done = parts_done
         self._bytes_done = bytes_done
         self._file_size = file_size
         self._duration = duration
+        self._bandwidth_limit = bandwidth_limit
+        return self
 
     @property
     def num_of_parts(self):
@@ -56,6 +89,623 @@ class Progress:
     def bandwidth(self):
         return (self._bytes_done / 1000000) / self.duration
 
+    @property
+    def bandwidth_limit(self):
+        """
+        Bandwidth limit in force in bytes per second, None if unlimited.
+        """
+        return self._bandwidth_limit
+
+    @property
+    def stats(self):
+        """
+        TransferStats of the transfer, None for aggregate progress.
+        """
+        return self._stats
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in buckets doubling from one millisecond, the
+    last bucket holds everything above its lower bound. Percentiles are
+    approximated by bucket upper bounds.
+    """
+    BUCKETS = 20
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def __repr__(self):
+        return (
+            f'<LatencyHistogram: count={self.count}, '
+            f'p50={self.percentile(50)}, p99={self.percentile(99)}>'
+        )
+
+    def record(self, seconds):
+        """
+        :param seconds: Latency in seconds.
+        """
+        index = (math.ceil(max(seconds * 1000, 1)) - 1).bit_length()
+        self.counts[min(index, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def buckets(self):
+        """
+        List of (upper bound in seconds, count) tuples, the upper bound of
+        the last bucket is infinite.
+        """
+        bounds = [2 ** index / 1000 for index in range(self.BUCKETS - 1)]
+        return list(zip(bounds + [math.inf], self.counts))
+
+    def percentile(self, percent):
+        """
+        :param percent: Percentile between 0 and 100.
+        :return: Upper bound of the bucket holding the percentile in
+            seconds, None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                break
+        if index == self.BUCKETS - 1:
+            return self.maximum
+        return min(2 ** index / 1000, self.maximum)
+
+
+class TransferStats:
+    """
+    Telemetry of a single transfer, updated by its part workers.
+
+    Bytes on the wire include the bytes of failed attempts. Throughput is
+    measured over a moving window of recent seconds. API and storage times
+    are summed over all workers, so with parts in parallel they can exceed
+    the duration of the transfer.
+    """
+
+    def __init__(self, retry=None, window=5):
+        """
+        :param retry: PartRetry of the transfer, source of the retry count.
+        :param window: Throughput window in seconds.
+        """
+        self.retry = retry
+        self.window = window
+        self.bytes_on_wire = 0
+        self.bytes_done = 0
+        self.parts_done = 0
+        self.api_time = 0.0
+        self.storage_time = 0.0
+        self.latency = LatencyHistogram()
+        self._first = None
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f'<TransferStats: bytes_on_wire={self.bytes_on_wire}, '
+            f'parts_done={self.parts_done}, retries={self.retries}>'
+        )
+
+    @property
+    def retries(self):
+        return self.retry.retries if self.retry is not None else 0
+
+    def transferred(self, size):
+        """
+        Records bytes sent or received.
+        :param size: Number of bytes.
+        """
+        now = time.monotonic()
+        second = int(now)
+        with self._lock:
+            self.bytes_on_wire += size
+            if self._first is None:
+                self._first = now
+            if self._samples and self._samples[-1][0] == second:
+                self._samples[-1][1] += size
+            else:
+                self._samples.append([second, size])
+                while self._samples[0][0] <= second - self.window:
+                    self._samples.popleft()
+
+    def part_done(self, size, latency):
+        """
+        Records a completed part.
+        :param size: Part size.
+        :param latency: Time the part took including retries, in seconds.
+        """
+        with self._lock:
+            self.bytes_done += size
+            self.parts_done += 1
+            self.latency.record(latency)
+
+    @contextmanager
+    def timed(self, kind):
+        """
+        Adds the time spent in the block to the API or storage time.
+        :param kind: 'api' or 'storage'.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                if kind == 'api':
+                    self.api_time += elapsed
+                else:
+                    self.storage_time += elapsed
+
+    @property
+    def throughput(self):
+        """
+        Bytes per second on the wire over the last window seconds, None
+        before any bytes were transferred.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._first is None:
+                return None
+            span = min(self.window, now - self._first)
+            total = sum(
+                size for second, size in self._samples
+                if second > now - self.window - 1
+            )
+        return total / span if span > 0 else None
+
+
+class ByteSemaphore:
+    """
+    Bounds the total number of bytes held by parts in flight. A single
+    request larger than the limit is let through when nothing else is in
+    flight, so that it never blocks forever.
+    """
+
+    def __init__(self, limit):
+        """
+        :param limit: Maximum number of bytes in flight.
+        """
+        self.limit = limit
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, size):
+        with self._condition:
+            while self._in_flight and self._in_flight + size > self.limit:
+                self._condition.wait()
+            self._in_flight += size
+
+    def release(self, size):
+        with self._condition:
+            self._in_flight -= size
+            self._condition.notify_all()
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of transferred bytes. Callers take the
+    tokens for the bytes they transfer and sleep while the bucket is in
+    debt, so a chunk larger than the burst goes through at the limited
+    rate instead of blocking forever, and concurrent callers are served in
+    the order they arrive.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        """
+        :param rate: Bytes per second, None or 0 for unlimited.
+        :param burst: Bytes which can be taken at once after an idle
+            period, one second worth of bytes by default.
+        """
+        self._rate = rate or None
+        self._burst = burst
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<TokenBucket: rate={self._rate}>'
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = rate or None
+            self._tokens = min(self._tokens, self.burst)
+
+    @property
+    def burst(self):
+        return self._burst or self._rate or 0
+
+    def _refill(self, now):
+        if self._rate:
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated) * self._rate
+            )
+        self._updated = now
+
+    def consume(self, amount):
+        """
+        Takes tokens for the bytes, sleeping until the rate allows them.
+        :param amount: Number of bytes.
+        :return: Seconds slept.
+        """
+        with self._lock:
+            if not self._rate:
+                return 0
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class BandwidthLimiter:
+    """
+    Upload and download bandwidth limits shared by all transfers of an
+    Api, adjustable while the transfers are running.
+    """
+
+    def __init__(self, upload=None, download=None):
+        """
+        :param upload: Upload limit in bytes per second, None for
+            unlimited.
+        :param download: Download limit in bytes per second, None for
+            unlimited.
+        """
+        self.upload = TokenBucket(upload)
+        self.download = TokenBucket(download)
+
+    def __repr__(self):
+        return (
+            f'<BandwidthLimiter: upload={self.upload.rate}, '
+            f'download={self.download.rate}>'
+        )
+
+    def set_limits(self, upload=None, download=None):
+        """
+        Changes both limits, None removes a limit.
+        :param upload: Upload limit in bytes per second.
+        :param download: Download limit in bytes per second.
+        """
+        self.upload.rate = upload
+        self.download.rate = download
+
+
+def bandwidth_bucket(api, direction):
+    """
+    Returns the TokenBucket of the Api limiting the transfer direction.
+    :param api: Api instance.
+    :param direction: 'upload' or 'download'.
+    :return: TokenBucket or None if the Api has no bandwidth limiter.
+    """
+    return getattr(getattr(api, 'bandwidth', None), direction, None)
+
+
+class TransferWindow:
+    """
+    Number of parts of a single transfer kept in flight. When adaptive,
+    throughput is measured over every window worth of completed parts and
+    the window grows while throughput improves and shrinks when it drops.
+    """
+    DEFAULT_SIZE = 4
+
+    def __init__(self, size=DEFAULT_SIZE, maximum=None, adaptive=False):
+        """
+        :param size: Initial number of parts in flight.
+        :param maximum: Upper bound of the adaptive window.
+        :param adaptive: Whether to adapt the window to throughput.
+        """
+        self.size = max(1, size)
+        self.minimum = 1
+        self.maximum = max(self.size, maximum or self.size)
+        self.adaptive = adaptive
+        self._completed = 0
+        self._started = None
+        self._rate = None
+
+    def start(self):
+        self._started = time.monotonic()
+
+    def completed(self, count=1):
+        """
+        Records completed parts and adapts the window size.
+        :param count: Number of completed parts.
+        """
+        if not self.adaptive:
+            return
+        self._completed += count
+        if self._completed < self.size:
+            return
+        now = time.monotonic()
+        rate = self._completed / max(now - self._started, 1e-9)
+        if self._rate is None or rate >= self._rate * 1.05:
+            self.size = min(self.size + 1, self.maximum)
+        elif rate < self._rate * 0.9:
+            self.size = max(self.size - 1, self.minimum)
+        self._rate = rate
+        self._completed = 0
+        self._started = now
+
+
+class PartRetry:
+    """
+    Retries failed parts of a transfer with exponential backoff and full
+    jitter. All parts of the transfer share an error budget, once it is
+    spent the next part error fails the transfer.
+
+    Client errors of the API other than 408 and 429 fail the part right
+    away, client errors of storage in EXPIRED are retried with a fresh url.
+    """
+    DEFAULT_ERROR_BUDGET = 100
+    # Statuses returned by storage for expired presigned urls
+    EXPIRED = (400, 401, 403, 410)
+
+    def __init__(
+            self, retry_count=RequestParameters.DEFAULT_RETRY_COUNT,
+            backoff_factor=RequestParameters.DEFAULT_BACKOFF_FACTOR,
+            maximum_backoff=30, error_budget=DEFAULT_ERROR_BUDGET
+    ):
+        """
+        :param retry_count: Number of retries of a single part.
+        :param backoff_factor: Backoff of the first retry in seconds,
+            doubled with every following retry of the part.
+        :param maximum_backoff: Upper bound of the backoff in seconds.
+        :param error_budget: Number of part errors tolerated in the whole
+            transfer.
+        """
+        self.retry_count = retry_count
+        self.backoff_factor = backoff_factor
+        self.maximum_backoff = maximum_backoff
+        self.error_budget = error_budget
+        self.errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f'<PartRetry: retry_count={self.retry_count}, '
+            f'errors={self.errors}/{self.error_budget}>'
+        )
+
+    @staticmethod
+    def expired(error):
+        return (
+            isinstance(error, StorageError) and
+            error.status in PartRetry.EXPIRED
+        )
+
+    @staticmethod
+    def retryable(error):
+        status = error.status
+        return (
+            status is None or status >= 500 or
+            status in (408, 429) or PartRetry.expired(error)
+        )
+
+    def _spend(self):
+        with self._lock:
+            self.errors += 1
+            return self.errors <= self.error_budget
+
+    def call(self, function, *args, refresh=None):
+        """
+        Calls the function until it succeeds or the part is out of retries.
+        :param function: Part transfer function.
+        :param args: Function arguments.
+        :param refresh: Called before retrying after a presigned url
+            expired.
+        :return: Function result.
+        """
+        attempt = 0
+        while True:
+            try:
+                return function(*args)
+            except SbgError as e:
+                if (
+                        attempt >= self.retry_count or
+                        not self.retryable(e) or not self._spend()
+                ):
+                    raise
+                delay = random.uniform(0, min(
+                    self.maximum_backoff, self.backoff_factor * 2 ** attempt
+                ))
+                logger.debug(
+                    'Part transfer failed: %s, retrying in %.2fs.', e, delay
+                )
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                if refresh is not None and self.expired(e):
+                    refresh()
+                attempt += 1
+
+
+def iterate_parts(parted_file):
+    """
+    Keeps the window of the parted file full and yields results of parts
+    in the order of completion, so a single slow part does not hold back
+    submission of the following ones.
+    :param parted_file: Object with a `window` and a `submit()` method
+        returning futures of newly submitted parts.
+    """
+    parted_file.window.start()
+    pending = set(parted_file.submit())
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        parted_file.submitted -= len(done)
+        try:
+            results = [future.result() for future in done]
+        except Exception:
+            # Parts in flight are let finish, nothing touches the file
+            # once the transfer failed.
+            wait(pending)
+            raise
+        parted_file.window.completed(len(done))
+        try:
+            pending.update(parted_file.submit())
+        except Exception:
+            wait(pending)
+            raise
+        yield from results
+
+
+# Bounds of part sizes for a transfer direction
+PartLimits = namedtuple(
+    'PartLimits', ['minimum', 'maximum', 'default', 'max_parts']
+)
+
+UPLOAD_PART_LIMITS = PartLimits(
+    minimum=PartSize.UPLOAD_MINIMUM_PART_SIZE,
+    maximum=PartSize.MAXIMUM_UPLOAD_SIZE,
+    default=PartSize.UPLOAD_RECOMMENDED_SIZE,
+    max_parts=PartSize.MAXIMUM_TOTAL_PARTS,
+)
+
+DOWNLOAD_PART_LIMITS = PartLimits(
+    minimum=PartSize.DOWNLOAD_MINIMUM_PART_SIZE,
+    maximum=PartSize.DOWNLOAD_MAXIMUM_PART_SIZE,
+    default=PartSize.DOWNLOAD_MINIMUM_PART_SIZE,
+    max_parts=PartSize.MAXIMUM_TOTAL_PARTS,
+)
+
+
+class PartSizePolicy(ABC):
+    """
+    Strategy choosing part sizes of a transfer. Policies are stateless so
+    a single instance can be shared by many transfers.
+    """
+
+    @abstractmethod
+    def initial(self, file_size, limits):
+        """
+        Part size to start the transfer with.
+        :param file_size: File size in bytes.
+        :param limits: PartLimits of the transfer direction.
+        :return: Part size in bytes.
+        """
+
+    def adjust(self, part_size, throughput, remaining, parts_left, limits):
+        """
+        Part size for the following parts, once part throughput is known.
+        Only downloads change part size during the transfer.
+        :param part_size: Current part size in bytes.
+        :param throughput: Smoothed throughput of a single part in bytes
+            per second.
+        :param remaining: Number of bytes not submitted yet.
+        :param parts_left: Number of parts that can still be used.
+        :param limits: PartLimits of the transfer direction.
+        :return: Part size in bytes.
+        """
+        return part_size
+
+
+class FixedPartSize(PartSizePolicy):
+    """
+    Uses the same part size regardless of the file size.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: Part size in bytes.
+        """
+        self.size = size
+
+    def initial(self, file_size, limits):
+        return self.size
+
+    def __repr__(self):
+        return f'<FixedPartSize: size={self.size}>'
+
+
+class AutoPartSize(PartSizePolicy):
+    """
+    Picks part sizes from the file size so that the transfer fits into the
+    part count limit, and for downloads grows or shrinks parts so that a
+    single part takes about `target_duration` seconds at the observed
+    throughput.
+    """
+
+    def __init__(self, target_duration=5.0, minimum=None, maximum=None):
+        """
+        :param target_duration: Desired duration of a single part transfer
+            in seconds.
+        :param minimum: Smallest part size, defaults to the limit of the
+            transfer direction.
+        :param maximum: Largest part size, defaults to the limit of the
+            transfer direction.
+        """
+        self.target_duration = target_duration
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def _bounds(self, limits):
+        minimum = max(self.minimum or limits.minimum, limits.minimum)
+        maximum = min(self.maximum or limits.maximum, limits.maximum)
+        return minimum, max(minimum, maximum)
+
+    @staticmethod
+    def _round(size):
+        return int(math.ceil(size / PartSize.MB) * PartSize.MB)
+
+    def initial(self, file_size, limits):
+        minimum, maximum = self._bounds(limits)
+        size = max(
+            limits.default, self._round(file_size / limits.max_parts)
+        )
+        return min(max(size, minimum), maximum)
+
+    def adjust(self, part_size, throughput, remaining, parts_left, limits):
+        if not throughput:
+            return part_size
+        minimum, maximum = self._bounds(limits)
+        if parts_left > 0:
+            minimum = max(minimum, self._round(remaining / parts_left))
+        size = self._round(throughput * self.target_duration)
+        size = min(max(size, minimum), maximum)
+        # Small changes are not worth the churn
+        if abs(size - part_size) < part_size / 4:
+            return part_size
+        return size
+
+    def __repr__(self):
+        return f'<AutoPartSize: target_duration={self.target_duration}>'
+
+
+def part_size_policy(part_size):
+    """
+    Returns the policy for the part size argument of a transfer.
+    :param part_size: PartSizePolicy, size in bytes or None for automatic
+        part sizing.
+    """
+    if isinstance(part_size, PartSizePolicy):
+        return part_size
+    if part_size:
+        return FixedPartSize(part_size)
+    return AutoPartSize()
+
 
 def total_parts(file_size, part_size):
     return int(math.ceil(file_size / float(part_size)))
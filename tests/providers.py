@@ -1941,6 +1941,13 @@ class FileUploadProvider:
         matcher = re.compile(regx)
         self.request_mocker.delete(matcher, status_code=status_code)
 
+    def got_upload(self, upload_id, failed=False):
+        status_code = 404 if failed else 200
+        self.request_mocker.get(
+            f'{self.base_url}/upload/multipart/{upload_id}',
+            json={'upload_id': upload_id}, status_code=status_code
+        )
+
 
 class DRSImportProvider:
     def __init__(self, request_mocker, base_url):
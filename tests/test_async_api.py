@@ -0,0 +1,102 @@
+import asyncio
+
+import faker
+import pytest
+
+from sevenbridges import AsyncExecutorApi
+from sevenbridges.errors import NotFound
+
+generator = faker.Factory.create()
+
+
+def run(coroutine):
+    # asyncio.run is not available on python 3.6
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def async_api(api):
+    async_api = AsyncExecutorApi(api=api, max_concurrency=4)
+    yield async_api
+    async_api.close()
+
+
+def test_async_get(async_api, given, verifier):
+    # preconditions
+    username = 'test'
+    given.user.exists(username=username)
+
+    # action
+    user = run(async_api.users.get(username))
+
+    # verification
+    assert user.username == username
+    verifier.user.fetched(username)
+
+
+def test_async_get_concurrent(async_api, given):
+    # preconditions
+    ids = [generator.uuid4() for _ in range(10)]
+    for id_ in ids:
+        given.project.exists(id=id_)
+
+    async def fetch():
+        return await asyncio.gather(
+            *[async_api.projects.get(id=id_) for id_ in ids]
+        )
+
+    # action
+    projects = run(fetch())
+
+    # verification
+    assert [project.id for project in projects] == ids
+
+
+def test_async_query_and_iterate(async_api, given):
+    # preconditions
+    limit = 2
+    total = 10
+    given.project.paginated_projects(limit, total)
+
+    async def fetch():
+        projects = await async_api.projects.query(offset=0, limit=limit)
+        return [project async for project in async_api.iterate(projects.all())]
+
+    # action
+    projects = run(fetch())
+
+    # verification
+    assert len(projects) == total
+
+
+def test_async_instance_method(async_api, given, verifier):
+    # preconditions
+    id_ = generator.uuid4()
+    given.project.exists(id=id_)
+    given.project.can_be_saved(id=id_)
+
+    async def save():
+        project = await async_api.projects.get(id=id_)
+        project.name = 'new-name'
+        return await async_api.projects.save(project)
+
+    # action
+    run(save())
+
+    # verification
+    verifier.project.saved(id=id_)
+
+
+def test_async_error_mapping(async_api, request_mocker):
+    # preconditions
+    request_mocker.get(
+        '/users/missing', status_code=404, json={'message': 'Not found'}
+    )
+
+    # action
+    with pytest.raises(NotFound):
+        run(async_api.users.get('missing'))
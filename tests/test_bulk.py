@@ -0,0 +1,155 @@
+import faker
+import pytest
+
+from sevenbridges import ServerError, ServiceUnavailable
+from sevenbridges.meta import bulk
+from sevenbridges.meta.bulk import bulk_execute
+
+generator = faker.Factory.create()
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(bulk.time, 'sleep', lambda _: None)
+
+
+def bulk_files(request_mocker, fail_first=None):
+    calls = []
+
+    def items(request, context):
+        ids = request.json()['file_ids']
+        calls.append(ids)
+        if fail_first is not None and ids[0] == fail_first and \
+                calls.count(ids) == 1:
+            context.status_code = 503
+            return {'status': 503, 'message': 'Unavailable'}
+        return {'items': [{'resource': {'id': id_}} for id_ in ids]}
+
+    request_mocker.post('/bulk/files/get', json=items)
+    return calls
+
+
+def test_bulk_get_split_in_chunks(api, request_mocker):
+    # preconditions
+    file_ids = [generator.uuid4() for _ in range(250)]
+    calls = bulk_files(request_mocker)
+
+    # action
+    records = api.files.bulk_get(file_ids)
+
+    # verification
+    assert [r.resource.id for r in records] == file_ids
+    assert sorted(len(c) for c in calls) == [50, 100, 100]
+
+
+def test_bulk_get_failed_chunk_retried(api, request_mocker, no_sleep):
+    # preconditions
+    file_ids = [generator.uuid4() for _ in range(150)]
+    calls = bulk_files(request_mocker, fail_first=file_ids[100])
+
+    # action
+    records = api.files.bulk_get(file_ids)
+
+    # verification
+    assert [r.resource.id for r in records] == file_ids
+    assert len(calls) == 3
+    assert calls.count(file_ids[100:]) == 2
+
+
+def test_bulk_submit_not_retried_on_server_error(no_sleep):
+    # preconditions
+    calls = []
+
+    def request(chunk):
+        calls.append(chunk)
+        raise ServerError()
+
+    # action
+    with pytest.raises(ServerError):
+        bulk_execute(request, list(range(10)), idempotent=False)
+
+    # verification
+    assert len(calls) == 1
+
+
+def test_bulk_retry_limit(no_sleep):
+    # preconditions
+    calls = []
+
+    def request(chunk):
+        calls.append(chunk)
+        raise ServiceUnavailable()
+
+    # action
+    with pytest.raises(ServiceUnavailable):
+        bulk_execute(request, list(range(10)), retry_count=2)
+
+    # verification
+    assert len(calls) == 3
+
+
+def test_async_file_bulk_copy_split(api, request_mocker):
+    # preconditions
+    files = [
+        {'file': generator.uuid4(), 'parent': generator.uuid4()}
+        for _ in range(150)
+    ]
+    request_mocker.post(
+        '/async/files/copy', json={'id': generator.uuid4(), 'type': 'COPY'}
+    )
+
+    # action
+    jobs = api.async_jobs.file_bulk_copy(files, chunked=True)
+
+    # verification
+    assert len(jobs) == 2
+    assert request_mocker.call_count == 2
+
+
+def test_async_file_bulk_copy_single_job(api, request_mocker):
+    # preconditions
+    files = [
+        {'file': generator.uuid4(), 'parent': generator.uuid4()}
+        for _ in range(150)
+    ]
+    job_id = generator.uuid4()
+    request_mocker.post(
+        '/async/files/copy', json={'id': job_id, 'type': 'COPY'}
+    )
+
+    # action
+    job = api.async_jobs.file_bulk_copy(files)
+
+    # verification
+    assert job.id == job_id
+    assert request_mocker.call_count == 1
+    assert len(request_mocker.last_request.json()['items']) == 150
+
+
+def test_bulk_failed_chunk_keeps_results(api, request_mocker, no_sleep):
+    # preconditions
+    file_ids = [generator.uuid4() for _ in range(250)]
+    calls = []
+
+    def items(request, context):
+        ids = request.json()['file_ids']
+        calls.append(ids)
+        if ids[0] == file_ids[100]:
+            context.status_code = 500
+            return {'status': 500, 'message': 'Server error'}
+        return {'items': [{'resource': {'id': id_}} for id_ in ids]}
+    request_mocker.post('/bulk/files/get', json=items)
+
+    # action
+    with pytest.raises(ServerError) as error:
+        api.files.bulk_get(file_ids)
+
+    # verification
+    records = error.value.results
+    assert [r.resource.id for r in records] == (
+        file_ids[:100] + file_ids[200:]
+    )
+    assert error.value.failed_items == file_ids[100:200]
+    # The failed chunk is retried, the others are sent once
+    assert len(calls) == 6
+    assert calls.count(file_ids[100:200]) == 4
@@ -0,0 +1,257 @@
+import json
+import os
+import pickle
+import stat
+import time
+
+import faker
+import pytest
+
+from sevenbridges import Api, SbgError
+from sevenbridges.http.cache import (
+    CacheEntry, DiskCache, MemoryCache, ResponseCache
+)
+
+generator = faker.Factory.create()
+
+
+@pytest.fixture
+def cached_api(base_url):
+    return Api(url=base_url, token=generator.uuid4(), cache=MemoryCache())
+
+
+def project_calls(request_mocker, id_):
+    return [
+        r for r in request_mocker.request_history
+        if r.method == 'GET' and r.path.endswith(f'/projects/{id_}')
+    ]
+
+
+def test_cached_get(cached_api, given, request_mocker):
+    # preconditions
+    id_ = 'me/project'
+    given.project.exists(id=id_)
+
+    # action
+    first = cached_api.projects.get(id=id_)
+    second = cached_api.projects.get(id=id_)
+
+    # verification
+    assert first.id == second.id == id_
+    assert len(project_calls(request_mocker, id_)) == 1
+    assert cached_api.cache.stats() == {
+        'hits': 1, 'misses': 1, 'revalidations': 0
+    }
+
+
+def test_no_cache_by_default(api, given, request_mocker):
+    # preconditions
+    id_ = 'me/project'
+    given.project.exists(id=id_)
+
+    # action
+    api.projects.get(id=id_)
+    api.projects.get(id=id_)
+
+    # verification
+    assert api.cache is None
+    assert len(project_calls(request_mocker, id_)) == 2
+
+
+def test_resource_ttl_disables_cache(base_url, given, request_mocker):
+    # preconditions
+    api = Api(
+        url=base_url, token=generator.uuid4(),
+        cache=MemoryCache(resource_ttl={'projects': 0})
+    )
+    id_ = 'me/project'
+    given.project.exists(id=id_)
+
+    # action
+    api.projects.get(id=id_)
+    api.projects.get(id=id_)
+
+    # verification
+    assert len(project_calls(request_mocker, id_)) == 2
+
+
+def test_revalidation_with_etag(base_url, request_mocker):
+    # preconditions
+    api = Api(url=base_url, token=generator.uuid4(), cache=MemoryCache())
+    project = {'id': 'me/project', 'name': 'project'}
+    request_mocker.get(
+        '/projects/me/project',
+        [
+            {'json': project, 'headers': {'ETag': '"v1"'}},
+            {'status_code': 304, 'headers': {'ETag': '"v1"'}},
+        ]
+    )
+
+    # action
+    api.projects.get(id='me/project')
+    for _, entry in api.cache._entries.values():
+        entry.expires = 0
+    revalidated = api.projects.get(id='me/project')
+
+    # verification
+    history = request_mocker.request_history
+    assert 'If-None-Match' not in history[0].headers
+    assert history[1].headers['If-None-Match'] == '"v1"'
+    assert revalidated.name == 'project'
+    assert api.cache.revalidations == 1
+
+
+def test_update_invalidates_cache(cached_api, given, request_mocker):
+    # preconditions
+    id_ = 'me/project'
+    given.project.exists(id=id_)
+    request_mocker.patch(
+        f'/projects/{id_}', json={'id': id_, 'name': 'new-name'}
+    )
+
+    # action
+    project = cached_api.projects.get(id=id_)
+    project.name = 'new-name'
+    project.save()
+    cached_api.projects.get(id=id_)
+
+    # verification
+    assert len(project_calls(request_mocker, id_)) == 2
+
+
+def test_memory_cache_eviction():
+    cache = MemoryCache(maxsize=2)
+    for i in range(3):
+        entry = CacheEntry(
+            url=f'/path{i}', status_code=200, headers={}, content=b'{}',
+            encoding=None, etag=None, expires=0
+        )
+        cache.store(f'key{i}', f'/path{i}', entry)
+
+    assert len(cache) == 2
+    assert cache.lookup('key0', '/path0') is None
+    assert cache.lookup('key2', '/path2') is not None
+
+
+def test_disk_cache(tmpdir, base_url, given, request_mocker):
+    # preconditions
+    token = generator.uuid4()
+    id_ = 'me/project'
+    given.project.exists(id=id_)
+
+    # action
+    for _ in range(2):
+        api = Api(url=base_url, token=token, cache=DiskCache(str(tmpdir)))
+        project = api.projects.get(id=id_)
+
+    # verification
+    assert project.id == id_
+    assert len(project_calls(request_mocker, id_)) == 1
+
+
+def test_disk_cache_stores_json(tmpdir):
+    # preconditions
+    directory = str(tmpdir / 'cache')
+    cache = DiskCache(directory)
+    entry = CacheEntry(
+        url='https://api/v2/projects/a', status_code=200,
+        headers={'ETag': '"1"'}, content=b'\x00{"id": "a"}',
+        encoding='utf-8', etag='"1"', expires=time.time() + 60
+    )
+
+    # action
+    cache._set('key', '/projects/a', entry)
+    with open(cache._entry_file('key', '/projects/a'), 'rb') as fp:
+        stored = json.load(fp)
+    cached = cache._get('key', '/projects/a')
+    with open(cache._entry_file('key', '/projects/a'), 'wb') as fp:
+        pickle.dump(entry, fp)
+
+    # verification
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    assert stored['status_code'] == 200
+    assert cached.content == entry.content
+    assert cached.headers == entry.headers
+    assert cache._get('key', '/projects/a') is None
+
+
+@pytest.mark.parametrize('status', [200, 500])
+def test_write_invalidates_after_response(cached_api, given, request_mocker,
+                                          status):
+    # preconditions
+    id_ = 'me/project'
+    given.project.exists(id=id_)
+
+    def update(request, context):
+        # Read while the update is in flight
+        cached_api.get(f'/projects/{id_}')
+        context.status_code = status
+        return {'id': id_, 'name': 'new-name'}
+    request_mocker.patch(f'/projects/{id_}', json=update)
+
+    # action
+    try:
+        cached_api.patch(f'/projects/{id_}', data={'name': 'new-name'})
+    except SbgError:
+        pass
+    cached_api.get(f'/projects/{id_}')
+
+    # verification
+    assert len(project_calls(request_mocker, id_)) == 2
+
+
+@pytest.mark.parametrize('cache', ['memory', 'disk'])
+def test_post_invalidates_resource(base_url, request_mocker, tmpdir, cache):
+    # preconditions
+    api = Api(
+        url=base_url, token=generator.uuid4(),
+        cache=MemoryCache() if cache == 'memory' else DiskCache(str(tmpdir))
+    )
+    for path in ('/tasks/t1', '/files/f1', '/files/f2', '/projects/p1'):
+        request_mocker.get(path, json={'id': path})
+    for path in ('/tasks/t1/actions/run', '/bulk/files/update',
+                 '/bulk/files/get'):
+        request_mocker.post(path, json={})
+
+    def fetched(path):
+        return sum(
+            r.method == 'GET' and r.path.endswith(path)
+            for r in request_mocker.request_history
+        )
+
+    def fetch_all():
+        for path in ('/tasks/t1', '/files/f1', '/files/f2', '/projects/p1'):
+            api.get(path)
+
+    # action
+    fetch_all()
+    api.post('/tasks/t1/actions/run')
+    api.post('/bulk/files/get')
+    fetch_all()
+    api.post('/bulk/files/update')
+    fetch_all()
+
+    # verification
+    assert fetched('/tasks/t1') == 2
+    assert fetched('/files/f1') == fetched('/files/f2') == 2
+    assert fetched('/projects/p1') == 1
+
+
+def test_cache_backend_implements_storage():
+    class NoTree(ResponseCache):
+        def _get(self, key, path):
+            return None
+
+        def _set(self, key, path, entry):
+            pass
+
+        def _invalidate(self, path):
+            pass
+
+        def clear(self):
+            pass
+
+    with pytest.raises(TypeError):
+        ResponseCache()
+    with pytest.raises(TypeError):
+        NoTree()
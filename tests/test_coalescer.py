@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import faker
+import pytest
+
+from sevenbridges import Api, NotFound
+
+generator = faker.Factory.create()
+
+
+@pytest.fixture
+def coalescing_api(base_url):
+    return Api(
+        url=base_url, token=generator.uuid4(), coalesce_window=0.2
+    )
+
+
+def bulk_files(request_mocker, missing=()):
+    def items(request, context):
+        return {'items': [
+            {'error': {'status': 404, 'code': 5002, 'message': 'Not found'}}
+            if id_ in missing else
+            {'resource': {'id': id_, 'name': f'name-{id_}'}}
+            for id_ in request.json()['file_ids']
+        ]}
+    request_mocker.post('/bulk/files/get', json=items)
+
+
+def test_concurrent_gets_coalesced(coalescing_api, request_mocker):
+    # preconditions
+    ids = [generator.uuid4() for _ in range(10)]
+    bulk_files(request_mocker)
+
+    # action
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        files = list(pool.map(coalescing_api.files.get, ids))
+
+    # verification
+    assert [f.id for f in files] == ids
+    assert [f.name for f in files] == [f'name-{id_}' for id_ in ids]
+    assert request_mocker.call_count == 1
+    assert sorted(request_mocker.last_request.json()['file_ids']) == sorted(
+        ids
+    )
+
+
+def test_single_get_not_coalesced(coalescing_api, given, request_mocker):
+    # preconditions
+    id_ = generator.uuid4()
+    given.file.exists(id=id_)
+
+    # action
+    file_ = coalescing_api.files.get(id=id_)
+
+    # verification
+    assert file_.id == id_
+    assert request_mocker.last_request.method == 'GET'
+
+
+def test_coalesced_get_error(coalescing_api, request_mocker):
+    # preconditions
+    ids = [generator.uuid4() for _ in range(2)]
+    bulk_files(request_mocker, missing=ids[:1])
+
+    # action
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(coalescing_api.files.get, id_) for id_ in ids]
+
+    # verification
+    with pytest.raises(NotFound):
+        futures[0].result()
+    assert futures[1].result().id == ids[1]
+
+
+def test_batch_dispatched_at_limit(coalescing_api, request_mocker):
+    # preconditions
+    coalescing_api.coalescer.window = 10
+    coalescing_api.coalescer.limit = 4
+    ids = [generator.uuid4() for _ in range(4)]
+    bulk_files(request_mocker)
+
+    # action
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        files = list(pool.map(coalescing_api.files.get, ids))
+
+    # verification
+    assert [f.id for f in files] == ids
+    assert request_mocker.call_count == 1
+
+
+def test_lazy_fetch_coalesced(coalescing_api, request_mocker):
+    # preconditions
+    ids = [generator.uuid4() for _ in range(5)]
+    bulk_files(request_mocker)
+    files = [coalescing_api.files(id=id_, api=coalescing_api) for id_ in ids]
+
+    # action
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        names = list(pool.map(lambda f: f.name, files))
+
+    # verification
+    assert names == [f'name-{id_}' for id_ in ids]
+    assert request_mocker.call_count == 1
@@ -0,0 +1,235 @@
+import base64
+import hashlib
+import os
+import random
+import zlib
+
+import pytest
+
+from sevenbridges.errors import SbgError
+from sevenbridges.transfer import digest as digest_module
+from sevenbridges.transfer.digest import (
+    CRC32C_POLYNOMIAL, TransferDigest, crc_combine, expected_digests
+)
+
+
+def crc32c(data, crc=0):
+    crc ^= 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ (CRC32C_POLYNOMIAL if crc & 1 else 0)
+    return crc ^ 0xFFFFFFFF
+
+
+def chunks(content, size):
+    return [
+        (offset, content[offset:offset + size])
+        for offset in range(0, len(content), size)
+    ]
+
+
+def test_crc_combine():
+    # preconditions
+    first, second = os.urandom(1000), os.urandom(777)
+
+    # action
+    crc = crc_combine(zlib.crc32(first), zlib.crc32(second), len(second))
+    crc_c = crc_combine(
+        crc32c(first), crc32c(second), len(second), CRC32C_POLYNOMIAL
+    )
+
+    # verification
+    assert crc32c(b'123456789') == 0xE3069283
+    assert crc == zlib.crc32(first + second)
+    assert crc_c == crc32c(first + second)
+    assert crc_combine(crc, 0, 0) == crc
+
+
+@pytest.mark.parametrize('with_file', [True, False])
+def test_transfer_digest_out_of_order(tmpdir, with_file):
+    # preconditions
+    content = os.urandom(10000)
+    path = str(tmpdir / 'file.bin')
+    with open(path, 'wb') as fp:
+        fp.write(content)
+    digest = TransferDigest(len(content), path=path if with_file else None)
+    parts = chunks(content, 1024)
+    random.Random(7).shuffle(parts)
+
+    # action
+    for offset, data in parts + parts[:3]:
+        hasher = digest.hasher()
+        hasher.update(data)
+        digest.update(offset, data)
+        digest.add_part(offset, hasher)
+    digest.finish()
+
+    # verification
+    assert digest.md5 == hashlib.md5(content).hexdigest()
+    assert digest.crc32 == zlib.crc32(content)
+    assert digest.etag == hashlib.md5(b''.join(
+        hashlib.md5(data).digest() for _, data in chunks(content, 1024)
+    )).hexdigest() + '-10'
+
+
+def test_transfer_digest_reads_missing_parts(tmpdir):
+    # preconditions
+    content = os.urandom(10000)
+    path = str(tmpdir / 'file.bin')
+    with open(path, 'wb') as fp:
+        fp.write(content)
+    digest = TransferDigest(len(content), path=path, part_size=1024)
+
+    # action
+    for offset, data in chunks(content, 1024)[4:7]:
+        hasher = digest.hasher()
+        hasher.update(data)
+        digest.update(offset, data)
+        digest.add_part(offset, hasher)
+    digest.finish()
+
+    # verification
+    assert digest.md5 == hashlib.md5(content).hexdigest()
+    assert digest.crc32 == zlib.crc32(content)
+    assert len(digest.parts) == 10
+
+
+def test_transfer_digest_missing_data_without_file():
+    # preconditions
+    digest = TransferDigest(100)
+    digest.update(50, b'x' * 50)
+
+    # action
+    with pytest.raises(SbgError):
+        digest.finish()
+
+    # verification
+    assert digest.md5 is None
+
+
+def test_transfer_digest_verify():
+    # preconditions
+    content = b'content'
+    md5 = hashlib.md5(content)
+    digest = TransferDigest(len(content))
+    hasher = digest.hasher()
+    hasher.update(content)
+    digest.update(0, content)
+    digest.add_part(0, hasher)
+    digest.finish()
+
+    # action
+    expected = expected_digests({
+        'ETag': f'"{md5.hexdigest()}"',
+        'x-goog-hash': 'crc32c=AAAAAA==,md5=' + base64.b64encode(
+            md5.digest()
+        ).decode(),
+    })
+
+    # verification
+    assert expected['md5'] == md5.hexdigest()
+    assert expected['crc32c'] == 0
+    assert digest.verify(expected) is True
+    assert digest.verify({'md5': '0' * 32}) is False
+    assert digest.mismatches == [('md5', '0' * 32, md5.hexdigest())]
+    assert expected_digests({'ETag': '"abc"'}) == {}
+
+
+def test_transfer_digest_multipart_etag():
+    # preconditions
+    content = os.urandom(1000)
+    etag = hashlib.md5(b''.join(
+        hashlib.md5(data).digest() for _, data in chunks(content, 400)
+    )).hexdigest() + '-3'
+
+    def digest_of(part_size, sizes):
+        digest = TransferDigest(len(content), part_size=part_size)
+        offset = 0
+        for size in sizes:
+            data = content[offset:offset + size]
+            hasher = digest.hasher()
+            hasher.update(data)
+            digest.update(offset, data)
+            digest.add_part(offset, hasher)
+            offset += size
+        digest.finish()
+        return digest
+
+    # action
+    uploaded = digest_of(400, [400, 400, 200])
+    downloaded = digest_of(None, [300, 300, 400])
+    other_parts = digest_of(400, [300, 300, 400])
+
+    # verification
+    assert uploaded.verify({'etag': etag}) is True
+    # Parts of a different size are not compared, even if their number
+    # matches
+    assert downloaded.verify({'etag': etag}) is None
+    assert other_parts.verify({'etag': etag}) is None
+    assert not downloaded.mismatches and not other_parts.mismatches
+
+
+def test_transfer_digest_reads_file_outside_lock(tmpdir):
+    # preconditions
+    content = os.urandom(10000)
+    path = str(tmpdir / 'file.bin')
+    with open(path, 'wb') as fp:
+        fp.write(content)
+    digest = TransferDigest(len(content), path=path, memory=0)
+    read = digest._read
+    locked = []
+
+    def tracked_read(offset, size):
+        locked.append(digest._lock.locked())
+        return read(offset, size)
+    digest._read = tracked_read
+
+    # action
+    for offset, data in reversed(chunks(content, 1024)):
+        digest.update(offset, data)
+
+    # verification
+    assert locked and not any(locked)
+    assert digest.md5 == hashlib.md5(content).hexdigest()
+
+
+def test_transfer_digest_holds_data_ahead_in_memory(tmpdir, monkeypatch):
+    # preconditions
+    content = os.urandom(10000)
+    path = str(tmpdir / 'file.bin')
+    with open(path, 'wb') as fp:
+        fp.write(content)
+    digest = TransferDigest(len(content), path=path, memory=4096)
+    reads = []
+    read = digest._read
+
+    def tracked_read(offset, size):
+        reads.append(size)
+        return read(offset, size)
+    digest._read = tracked_read
+    combined = []
+    combine = digest_module.crc_combine
+
+    def tracked_combine(*args):
+        combined.append(args)
+        return combine(*args)
+    monkeypatch.setattr(digest_module, 'crc_combine', tracked_combine)
+
+    # action
+    for offset, data in reversed(chunks(content, 1024)):
+        hasher = digest.hasher()
+        hasher.update(data)
+        digest.update(offset, data)
+        digest.add_part(offset, hasher)
+    digest.finish()
+    combined_on_finish = len(combined)
+    crcs = [digest.crc32 for _ in range(3)]
+
+    # verification
+    # The last 3856 bytes fit into memory, the first part is not ahead
+    assert sum(reads) == 5 * 1024
+    assert digest._held == 0
+    assert digest.md5 == hashlib.md5(content).hexdigest()
+    assert crcs == [zlib.crc32(content)] * 3
+    assert len(combined) == combined_on_finish
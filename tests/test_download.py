@@ -0,0 +1,743 @@
+import hashlib
+import io
+import os
+import re
+import zlib
+
+import faker
+import pytest
+
+from sevenbridges.errors import SbgError
+from sevenbridges.models.enums import PartSize, TransferState
+from sevenbridges.models.file import File
+from sevenbridges.transfer.download import DPartedFile, Download, FileWriter
+from sevenbridges.transfer import utils
+from sevenbridges.transfer.journal import PartBitmap, object_validator
+from sevenbridges.transfer.stream import RemoteFile
+from sevenbridges.transfer.utils import AutoPartSize, FixedPartSize
+
+generator = faker.Factory.create()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(utils.time, 'sleep', lambda _: None)
+
+
+def validator(content):
+    return object_validator({'ETag': f'"{hashlib.md5(content).hexdigest()}"'})
+
+
+@pytest.fixture
+def storage(request_mocker):
+    """
+    Serves the file content from a fake storage url, honouring ranges.
+    A request for a range starting at a byte in failing is rejected once
+    for every occurrence of the byte.
+    """
+    url = generator.url() + 'file.bin'
+    content = os.urandom(3 * PartSize.MB + 123)
+    ranges = []
+    failing = []
+
+    def serve(request, context):
+        match = re.match(
+            r'bytes=(\d+)-(\d+)', request.headers.get('Range', '')
+        )
+        data = content
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            if start in failing:
+                failing.remove(start)
+                context.status_code = 500
+                return b''
+            ranges.append((start, end))
+            data = content[start:end + 1]
+        context.headers['Content-Length'] = str(len(data))
+        context.headers['ETag'] = f'"{hashlib.md5(content).hexdigest()}"'
+        return data
+
+    request_mocker.get(url, content=serve)
+    return url, content, ranges, failing
+
+
+def test_download(api, storage, tmpdir):
+    # preconditions
+    url, content, ranges, _ = storage
+    path = str(tmpdir / 'file.bin')
+
+    # action
+    download = Download(url=url, file_path=path, api=api)
+    download.run()
+
+    # verification
+    assert download.status == TransferState.COMPLETED
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert len(ranges) == 1
+
+
+def test_download_fixed_part_size(api, storage, tmpdir):
+    # preconditions
+    url, content, ranges, _ = storage
+    path = str(tmpdir / 'file.bin')
+
+    # action
+    download = Download(
+        url=url, file_path=path, part_size=FixedPartSize(PartSize.MB),
+        api=api
+    )
+    download.run()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert sorted(ranges) == [
+        (0, PartSize.MB - 1),
+        (PartSize.MB, 2 * PartSize.MB - 1),
+        (2 * PartSize.MB, 3 * PartSize.MB - 1),
+        (3 * PartSize.MB, len(content) - 1),
+    ]
+
+
+def test_download_part_size_follows_throughput():
+    # preconditions
+    parted_file = DPartedFile(
+        file_path=None, session=None, url=None, file_size=PartSize.GB,
+        part_size=PartSize.DOWNLOAD_MINIMUM_PART_SIZE, timeout=None,
+        pool=None, policy=AutoPartSize(target_duration=2)
+    )
+
+    # action
+    first = parted_file._next_part()
+    parted_file._record_throughput(50 * PartSize.MB)
+    second = parted_file._next_part()
+
+    # verification
+    assert first == (0, PartSize.DOWNLOAD_MINIMUM_PART_SIZE - 1)
+    assert second[1] - second[0] + 1 == 100 * PartSize.MB
+    assert parted_file.get_parts()[0][0] == second[1] + 1
+
+
+def test_download_resumed_from_partial_file(api, storage, tmpdir):
+    # preconditions
+    url, content, ranges, _ = storage
+    path = str(tmpdir / 'file.bin')
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as fp:
+        fp.write(content[:PartSize.MB] + bytes(len(content) - PartSize.MB))
+    bitmap = PartBitmap(
+        f'{partial}.parts', len(content), validator=validator(content)
+    )
+    bitmap.create()
+    bitmap.mark(0, PartSize.MB)
+    bitmap.close()
+
+    # action
+    download = Download(url=url, file_path=path, api=api, resume=True)
+    download.run()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert ranges == [(PartSize.MB, len(content) - 1)]
+    assert not os.path.exists(partial)
+    assert not os.path.exists(f'{partial}.parts')
+
+
+@pytest.mark.parametrize('stale', ['object', 'size'])
+def test_download_stale_partial_file_discarded(api, storage, tmpdir, stale):
+    # preconditions
+    url, content, ranges, _ = storage
+    path = str(tmpdir / 'file.bin')
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as fp:
+        fp.write(bytes(PartSize.MB))
+        if stale == 'object':
+            fp.truncate(len(content))
+    bitmap = PartBitmap(
+        f'{partial}.parts', len(content),
+        validator=validator(b'replaced' if stale == 'object' else content)
+    )
+    bitmap.create()
+    bitmap.mark(0, PartSize.MB)
+    bitmap.close()
+
+    # action
+    download = Download(url=url, file_path=path, api=api, resume=True)
+    download.run()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert ranges == [(0, len(content) - 1)]
+    assert not os.path.exists(partial)
+
+
+def test_download_interrupted_keeps_partial_file(api, storage, tmpdir):
+    # preconditions
+    url, content, _, failing = storage
+    path = str(tmpdir / 'file.bin')
+    failing.append(2 * PartSize.MB)
+
+    # action
+    download = Download(
+        url=url, file_path=path, part_size=FixedPartSize(PartSize.MB),
+        api=api, resume=True, error_budget=0
+    )
+    with pytest.raises(SbgError):
+        download.run()
+
+    # verification
+    assert not os.path.exists(path)
+    bitmap = PartBitmap(
+        f'{path}.partial.parts', len(content), validator=validator(content)
+    )
+    assert bitmap.load()
+    assert bitmap.completed(0) and bitmap.completed(1)
+    assert bitmap.missing()[0] == (2 * PartSize.MB, 3 * PartSize.MB)
+
+
+def test_part_bitmap_partial_blocks():
+    # preconditions
+    bitmap = PartBitmap(None, 10, block_size=4)
+    bitmap._fp = io.BytesIO(bytes(PartBitmap._HEADER.size + 1))
+
+    # action
+    bitmap.mark(0, 5)
+    bitmap.mark(6, 4)
+
+    # verification
+    assert bitmap.missing() == [(4, 8)]
+
+
+@pytest.mark.parametrize('positional', [True, False])
+def test_file_writer(tmpdir, monkeypatch, positional):
+    # preconditions
+    if not positional:
+        monkeypatch.delattr('os.pwrite')
+    path = str(tmpdir / 'file.bin')
+
+    # action
+    writer = FileWriter(path, size=10)
+    writer.write(5, b'world')
+    writer.write(0, b'hello')
+    writer.close()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == b'helloworld'
+    assert writer.fd is None
+
+
+def test_download_small_buffers(api, storage, tmpdir):
+    # preconditions
+    url, content, _, _ = storage
+    path = str(tmpdir / 'file.bin')
+
+    # action
+    download = Download(
+        url=url, file_path=path, api=api, buffer_size=1000,
+        part_size=FixedPartSize(PartSize.MB)
+    )
+    download.run()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+
+
+def test_download_part_retried(api, storage, tmpdir, no_backoff):
+    # preconditions
+    url, content, ranges, failing = storage
+    path = str(tmpdir / 'file.bin')
+    failing.extend([PartSize.MB, PartSize.MB])
+
+    # action
+    download = Download(
+        url=url, file_path=path, part_size=FixedPartSize(PartSize.MB),
+        api=api
+    )
+    download.run()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert not failing
+    assert len(ranges) == 4
+
+
+def test_download_expired_url_refreshed(api, storage, tmpdir, request_mocker,
+                                        no_backoff):
+    # preconditions
+    url, content, _, _ = storage
+    path = str(tmpdir / 'file.bin')
+    expired = generator.url() + 'expired.bin'
+    request_mocker.get(
+        expired, [
+            {'headers': {'Content-Length': str(len(content))}},
+            {'status_code': 403},
+        ]
+    )
+    refreshed = []
+
+    def refresh_url():
+        refreshed.append(url)
+        return url
+
+    # action
+    download = Download(
+        url=expired, file_path=path, part_size=FixedPartSize(PartSize.MB),
+        api=api, refresh_url=refresh_url
+    )
+    download.run()
+
+    # verification
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert len(refreshed) == 1
+
+
+def test_task_download_outputs(api, given, storage, request_mocker, tmpdir):
+    # preconditions
+    url, content, _, _ = storage
+    size = len(content)
+    task_id, bam, bai, folder, child = (
+        generator.uuid4() for _ in range(5)
+    )
+    given.task.exists(id=task_id, outputs={
+        'aligned': {
+            'class': 'File', 'path': bam, 'secondaryFiles': [{'path': bai}]
+        },
+        'reports': {'class': 'Directory', 'path': folder},
+    })
+    remote = {
+        bam: {'id': bam, 'name': 'a.bam', 'size': size, 'type': 'file'},
+        bai: {'id': bai, 'name': 'a.bam.bai', 'size': size, 'type': 'file'},
+        folder: {'id': folder, 'name': 'reports', 'type': 'folder'},
+    }
+    request_mocker.post('/bulk/files/get', json=lambda request, _: {
+        'items': [
+            {'resource': remote[file_id]}
+            for file_id in request.json()['file_ids']
+        ]
+    })
+    request_mocker.get(f'/files/{folder}/list', json={
+        'items': [
+            {'id': child, 'name': 'qc.html', 'size': size, 'type': 'file'}
+        ],
+        'links': [], 'href': generator.url()
+    }, headers={'x-total-matching-query': '1'})
+    request_mocker.get(
+        re.compile('/files/.*/download_info'), json={'url': url}
+    )
+    destination = tmpdir.mkdir('outputs')
+    destination.join('a.bam.bai').write_binary(content)
+
+    # action
+    results = api.tasks.get(task_id).download_outputs(str(destination))
+
+    # verification
+    assert [
+        (os.path.relpath(r.path, str(destination)), r.status)
+        for r in results
+    ] == [
+        ('a.bam', TransferState.COMPLETED),
+        ('a.bam.bai', TransferState.SKIPPED),
+        (os.path.join('reports', 'qc.html'), TransferState.COMPLETED),
+    ]
+    for result in results:
+        with open(result.path, 'rb') as fp:
+            assert fp.read() == content
+
+
+def test_download_files_same_name(api, storage, request_mocker, tmpdir):
+    # preconditions
+    url, content, _, _ = storage
+    first, second = generator.uuid4(), generator.uuid4()
+    request_mocker.post('/bulk/files/get', json={'items': [
+        {'resource': {
+            'id': file_id, 'name': 'a.bam', 'size': len(content),
+            'type': 'file'
+        }}
+        for file_id in (first, second)
+    ]})
+    request_mocker.get(
+        re.compile('/files/.*/download_info'), json={'url': url}
+    )
+    destination = tmpdir.mkdir('inputs')
+
+    # action
+    results = api.files.download_files([first, second], str(destination))
+
+    # verification
+    assert sorted(
+        (os.path.relpath(r.path, str(destination)), r.status)
+        for r in results
+    ) == sorted([
+        (os.path.join(first, 'a.bam'), TransferState.COMPLETED),
+        (os.path.join(second, 'a.bam'), TransferState.COMPLETED),
+    ])
+
+
+def test_download_files_created_lazily(api, storage, request_mocker, tmpdir,
+                                       monkeypatch):
+    # preconditions
+    url, content, _, _ = storage
+    file_ids = [generator.uuid4() for _ in range(3)]
+    request_mocker.post('/bulk/files/get', json={'items': [
+        {'resource': {
+            'id': file_id, 'name': f'{file_id}.bin', 'size': len(content),
+            'type': 'file'
+        }}
+        for file_id in file_ids
+    ]})
+    info = request_mocker.get(
+        re.compile('/files/.*/download_info'), json={'url': url}
+    )
+    queued = []
+    submit = api.transfers.submit
+
+    def record(transfer, priority=0, size=None):
+        queued.append((callable(transfer), size, info.call_count))
+        return submit(transfer, priority=priority, size=size)
+
+    monkeypatch.setattr(api.transfers, 'submit', record)
+    destination = tmpdir.mkdir('inputs')
+
+    # action
+    results = api.files.download_files(file_ids, str(destination))
+
+    # verification
+    assert [(lazy, size) for lazy, size, _ in queued] == [
+        (True, len(content))
+    ] * 3
+    # A download url is only requested once the manager runs the download
+    assert all(
+        requested <= index for index, (_, _, requested) in enumerate(queued)
+    )
+    assert info.call_count == 3
+    assert [r.status for r in results] == [TransferState.COMPLETED] * 3
+
+
+def test_task_download_outputs_same_name(api, given, storage, request_mocker,
+                                         tmpdir):
+    # preconditions
+    url, content, _, _ = storage
+    task_id, first, second = (generator.uuid4() for _ in range(3))
+    given.task.exists(id=task_id, outputs={
+        'report': {'class': 'File', 'path': first},
+        'summary': {'class': 'File', 'path': second},
+    })
+    remote = {
+        file_id: {
+            'id': file_id, 'name': 'report.html', 'size': len(content),
+            'type': 'file'
+        }
+        for file_id in (first, second)
+    }
+    request_mocker.post('/bulk/files/get', json=lambda request, _: {
+        'items': [
+            {'resource': remote[file_id]}
+            for file_id in request.json()['file_ids']
+        ]
+    })
+    request_mocker.get(
+        re.compile('/files/.*/download_info'), json={'url': url}
+    )
+    destination = tmpdir.mkdir('outputs')
+
+    # action
+    results = api.tasks.get(task_id).download_outputs(str(destination))
+
+    # verification
+    assert sorted(
+        (os.path.relpath(r.path, str(destination)), r.status)
+        for r in results
+    ) == [
+        (os.path.join('report', 'report.html'), TransferState.COMPLETED),
+        (os.path.join('summary', 'report.html'), TransferState.COMPLETED),
+    ]
+    for result in results:
+        with open(result.path, 'rb') as fp:
+            assert fp.read() == content
+
+
+def test_remote_file_random_access(api, storage):
+    # preconditions
+    url, content, ranges, _ = storage
+    block = 256 * PartSize.KB
+    remote = RemoteFile(
+        url, len(content), api, block_size=block, read_ahead=0
+    )
+
+    # action
+    remote.seek(-100, io.SEEK_END)
+    tail = remote.read(100)
+    remote.seek(10)
+    head = remote.read(block)
+    remote.seek(20)
+    cached = remote.read(30)
+
+    # verification
+    assert tail == content[-100:]
+    assert head == content[10:block + 10]
+    assert cached == content[20:50]
+    assert remote.read(0) == b''
+    assert sorted(ranges) == [
+        (0, block - 1), (block, 2 * block - 1),
+        (len(content) // block * block, len(content) - 1)
+    ]
+    remote.seek(len(content) + 10)
+    assert remote.read(10) == b''
+
+
+def test_remote_file_sequential_read_ahead(api, storage):
+    # preconditions
+    url, content, ranges, _ = storage
+    remote = RemoteFile(
+        url, len(content), api, block_size=PartSize.MB, read_ahead=2
+    )
+
+    # action
+    data = b''.join(iter(lambda: remote.read(100 * PartSize.KB), b''))
+
+    # verification
+    assert data == content
+    assert sorted(start for start, _ in ranges) == [
+        index * PartSize.MB for index in range(4)
+    ]
+
+
+def test_remote_file_cache_eviction(api, storage):
+    # preconditions
+    url, content, ranges, _ = storage
+    remote = RemoteFile(
+        url, len(content), api, block_size=PartSize.MB, cache_blocks=1,
+        read_ahead=0
+    )
+
+    # action
+    for offset in (0, PartSize.MB, 0):
+        remote.seek(offset)
+        remote.read(1)
+
+    # verification
+    assert [start for start, _ in ranges] == [0, PartSize.MB, 0]
+    assert list(remote._cache) == [0]
+
+
+def test_remote_file_refreshes_expired_url(
+        api, storage, request_mocker, no_backoff
+):
+    # preconditions
+    url, content, _, _ = storage
+    expired = generator.url() + 'expired.bin'
+    request_mocker.get(expired, status_code=403)
+    remote = RemoteFile(
+        expired, len(content), api, refresh_url=lambda: url
+    )
+
+    # action
+    data = remote.read(10)
+
+    # verification
+    assert data == content[:10]
+    assert remote.url == url
+
+
+def test_file_open(api, storage, request_mocker):
+    # preconditions
+    url, content, _, _ = storage
+    file_ = File(
+        api=api, id=generator.uuid4(), name='file.bin', size=len(content),
+        type='file'
+    )
+    request_mocker.get(
+        f'/files/{file_.id}/download_info', json={'url': url}
+    )
+
+    # action
+    with file_.open() as remote:
+        remote.seek(PartSize.MB)
+        data = remote.read(10)
+
+    # verification
+    assert data == content[PartSize.MB:PartSize.MB + 10]
+    assert remote.closed
+    with pytest.raises(SbgError):
+        file_.open(mode='wb')
+
+
+def test_file_stream_parallel(api, storage, request_mocker, no_backoff):
+    # preconditions
+    url, content, ranges, failing = storage
+    failing.append(0)
+    file_ = File(
+        api=api, id=generator.uuid4(), name='file.bin', size=len(content),
+        type='file'
+    )
+    request_mocker.get(
+        f'/files/{file_.id}/download_info', json={'url': url}
+    )
+
+    # action
+    chunks = list(file_.stream(
+        part_size=100 * PartSize.KB, window=2, range_size=PartSize.MB
+    ))
+
+    # verification
+    assert b''.join(chunks) == content
+    assert max(len(chunk) for chunk in chunks) == 100 * PartSize.KB
+    assert sorted(start for start, _ in ranges) == [
+        index * PartSize.MB for index in range(4)
+    ]
+
+
+@pytest.mark.parametrize('resume', [True, False])
+def test_download_verified(api, storage, tmpdir, resume):
+    # preconditions
+    url, content, _, _ = storage
+    path = str(tmpdir / 'file.bin')
+    if resume:
+        # Half of the file was downloaded before
+        bitmap = PartBitmap(
+            f'{path}.partial.parts', len(content),
+            validator=validator(content)
+        )
+        bitmap.create()
+        with open(f'{path}.partial', 'wb') as fp:
+            fp.write(content[:2 * PartSize.MB])
+            fp.truncate(len(content))
+        bitmap.mark(0, 2 * PartSize.MB)
+        bitmap.close()
+
+    # action
+    download = Download(
+        url=url, file_path=path, api=api, verify=True, resume=resume,
+        part_size=FixedPartSize(PartSize.DOWNLOAD_MINIMUM_PART_SIZE // 5)
+    )
+    download.run()
+
+    # verification
+    assert download.status == TransferState.COMPLETED
+    assert download.digest.verified is True
+    assert download.digest.md5 == hashlib.md5(content).hexdigest()
+    assert download.digest.crc32 == zlib.crc32(content)
+
+
+def test_download_verify_failed(api, request_mocker, tmpdir):
+    # preconditions
+    url = generator.url() + 'file.bin'
+    content = os.urandom(1000)
+    request_mocker.get(url, content=content, headers={
+        'Content-Length': str(len(content)),
+        'ETag': f'"{hashlib.md5(b"other").hexdigest()}"',
+    })
+    path = str(tmpdir / 'file.bin')
+
+    # action
+    with pytest.raises(SbgError) as error:
+        Download(url=url, file_path=path, api=api, verify=True).run()
+
+    # verification
+    assert 'md5' in str(error.value)
+    assert not os.listdir(str(tmpdir))
+
+
+def test_download_bandwidth_limited(api, storage, tmpdir, request_mocker,
+                                    monkeypatch):
+    # preconditions
+    url, content, _, _ = storage
+    delays = []
+    monkeypatch.setattr(utils.time, 'sleep', delays.append)
+    api.bandwidth.set_limits(download=PartSize.MB)
+    file_ = File(
+        api=api, id=generator.uuid4(), name='file.bin', size=len(content),
+        type='file'
+    )
+    request_mocker.get(
+        f'/files/{file_.id}/download_info', json={'url': url}
+    )
+    limits = []
+    delayed = []
+
+    # action
+    download = Download(url=url, file_path=str(tmpdir / 'file.bin'), api=api)
+    download.add_progress_callback(
+        lambda progress: limits.append(progress.bandwidth_limit)
+    )
+    download.run()
+    delayed.append(len(delays))
+    streamed = b''.join(file_.stream(part_size=PartSize.MB))
+    delayed.append(len(delays))
+    streamed_parallel = b''.join(
+        file_.stream(window=2, range_size=PartSize.MB)
+    )
+    delayed.append(len(delays))
+
+    # verification
+    assert download.status == TransferState.COMPLETED
+    assert set(limits) == {PartSize.MB}
+    assert streamed == streamed_parallel == content
+    assert 0 < delayed[0] < delayed[1] < delayed[2]
+
+
+def test_download_telemetry(api, storage, tmpdir, no_backoff):
+    # preconditions
+    url, content, _, failing = storage
+    failing.append(0)
+    updates = []
+
+    # action
+    download = Download(
+        url=url, file_path=str(tmpdir / 'file.bin'), api=api,
+        part_size=FixedPartSize(PartSize.MB)
+    )
+    download.add_progress_callback(
+        lambda progress: updates.append((progress, progress.bytes_done))
+    )
+    download.run()
+
+    # verification
+    stats = download.stats
+    assert len({id(progress) for progress, _ in updates}) == 1
+    assert updates[-1][1] == len(content)
+    assert stats.bytes_on_wire == stats.bytes_done == len(content)
+    assert stats.retries == 1
+    assert stats.latency.count == stats.parts_done == 4
+    assert stats.storage_time > 0
+
+
+def test_download_short_range_retried(api, request_mocker, tmpdir,
+                                      no_backoff):
+    # preconditions
+    url = generator.url() + 'file.bin'
+    content = os.urandom(1000)
+    truncated = []
+
+    def serve(request, context):
+        match = re.match(
+            r'bytes=(\d+)-(\d+)', request.headers.get('Range', '')
+        )
+        data = content
+        if match:
+            data = content[int(match.group(1)):int(match.group(2)) + 1]
+            if not truncated:
+                truncated.append(len(data))
+                data = data[:10]
+        context.headers['Content-Length'] = str(len(data))
+        return data
+    request_mocker.get(url, content=serve)
+    path = str(tmpdir / 'file.bin')
+
+    # action
+    download = Download(url=url, file_path=path, api=api)
+    download.run()
+
+    # verification
+    assert truncated == [len(content)]
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    assert download.stats.bytes_on_wire == len(content) + 10
+    assert download.stats.retries == 1
@@ -241,6 +241,100 @@ def test_files_save_tags(api, given, verifier, tags):
     verifier.file.file_saved_tags(id)
 
 
+def test_files_save_tags_in_place(api, given, verifier):
+    # precondition
+    id = generator.uuid4()
+    given.file.exists(id=id, tags=['test'])
+    given.file.can_be_saved(id=id)
+    given.file.tags_can_be_saved(id)
+
+    # action
+    file = api.files.get(id)
+    file.tags.append('test2')
+    file.save()
+
+    # verifier
+    verifier.file.file_saved_tags(id)
+
+
+def test_files_snapshot_taken_on_write(api):
+    # precondition
+    file = api.files(api=api, id=generator.uuid4(), name='a.txt', size=10)
+
+    # action
+    size = file.size
+    no_changes = dict(file._modified_data())
+    file.name = 'b.txt'
+
+    # verifier
+    assert size == 10
+    assert no_changes == {}
+    assert file._old == {'name': 'a.txt'}
+    assert file._modified_data() == {'name': 'b.txt'}
+
+
+def test_files_snapshot_of_read_field_only(api):
+    # precondition
+    file = api.files(
+        api=api, id=generator.uuid4(), tags=['a'], metadata={'x': '1'}
+    )
+
+    # action
+    file.tags.append('b')
+
+    # verifier
+    assert file._old == {'tags': ['a']}
+    assert file._modified_data() == {'tags': ['a', 'b']}
+
+
+def test_files_lazy_listing(api, given):
+    # preconditions
+    api.lazy_listings = True
+    owner = generator.user_name()
+    project_short_name = generator.slug()
+    id = f'{owner}/{project_short_name}'
+    given.file.files_exist_for_project(id, 3)
+
+    # action
+    files = api.files.query(project=id)
+    file = files[0]
+    raw = file._data
+    name = file.name
+    tags = file.tags
+    file.name = 'renamed.txt'
+
+    # verification
+    assert file._data is raw
+    assert name != 'renamed.txt'
+    assert tags is raw['tags']
+    assert file._modified_data() == {'name': 'renamed.txt'}
+    assert not files[1]._old
+
+
+def test_files_compact_instance(api):
+    # precondition
+    file = api.files(
+        api=api, id=generator.uuid4(), name='a.txt', metadata={}
+    )
+
+    # action
+    unmodified = file._changes
+    file.name = 'b.txt'
+    file.metadata = {'sample': 'a'}
+
+    # verifier
+    assert set(api.files.__slots__) == {
+        '_overwrite_metadata', '_api', '_data', '_fetched', '_changes', '_old'
+    }
+    assert not hasattr(file, '__dict__')
+    assert type(file._data) is dict
+    assert unmodified is None
+    assert file._dirty == {'name': 'b.txt', 'metadata': {'sample': 'a'}}
+    assert file._overwrite_metadata is True
+    with pytest.raises(AttributeError):
+        file._custom_attribute = True
+
+
 def test_files_bulk_get(api, given, verifier):
     # preconditions
     total = 10
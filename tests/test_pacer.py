@@ -0,0 +1,139 @@
+import threading
+
+import faker
+import pytest
+
+from sevenbridges import Api
+from sevenbridges.http import pacer
+from sevenbridges.http.pacer import RateLimitPacer
+
+generator = faker.Factory.create()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Frozen wall clock, sleeps are recorded instead of advancing it.
+    """
+    now = [1000.0]
+    delays = []
+    monkeypatch.setattr(pacer.time, 'time', lambda: now[0])
+    monkeypatch.setattr(pacer.time, 'sleep', delays.append)
+    return now, delays
+
+
+def rate_headers(limit, remaining, reset):
+    return {
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Reset': str(reset),
+    }
+
+
+def test_pacer_observe(clock):
+    # preconditions
+    rate_pacer = RateLimitPacer()
+
+    # action
+    empty = rate_pacer.budget()
+    rate_pacer.observe(rate_headers(100, 50, 1100))
+    rate_pacer.observe(rate_headers(100, 60, 1100))
+    rate_pacer.observe(rate_headers(100, 90, 1000))
+    budget = rate_pacer.budget()
+
+    # verification
+    assert empty.remaining is None and empty.wait == 0
+    assert budget.limit == 100
+    assert budget.remaining == 50
+    assert budget.reset_time.timestamp() == 1100
+    assert rate_pacer.acquire() == 0
+
+
+def test_pacer_spreads_requests(clock):
+    # preconditions
+    _, delays = clock
+    rate_pacer = RateLimitPacer(burst=2)
+    rate_pacer.observe(rate_headers(100, 10, 1010))
+
+    # action
+    waited = [rate_pacer.acquire() for _ in range(5)]
+
+    # verification
+    assert waited[:2] == [0, 0]
+    assert 0 < waited[2] < waited[3] < waited[4] < 10
+    assert delays == waited[2:]
+    assert rate_pacer.budget().remaining == 5
+
+
+def test_pacer_releases_requests_after_reset(clock):
+    # preconditions
+    now, _ = clock
+    rate_pacer = RateLimitPacer(window=100)
+    rate_pacer.observe(rate_headers(10, 0, 1030))
+
+    # action
+    waited = [rate_pacer.acquire() for _ in range(3)]
+    now[0] = 1031
+    budget = rate_pacer.budget()
+
+    # verification
+    assert waited == [30, 40, 50]
+    # Requests queued for the new window are taken from its budget
+    assert budget.remaining == 7
+    assert budget.reset_time.timestamp() == 1130
+
+
+def test_api_paced_by_headers(base_url, request_mocker, clock):
+    # preconditions
+    _, delays = clock
+    api = Api(
+        url=base_url, token=generator.uuid4(),
+        rate_pacer=RateLimitPacer(burst=0)
+    )
+    sent = []
+
+    def respond(request, context):
+        sent.append(request)
+        context.headers.update(rate_headers(1000, 101 - len(sent), 1100))
+        return {}
+    request_mocker.get(f'{base_url}/user', json=respond)
+
+    # action
+    threads = [
+        threading.Thread(target=api.get, args=('/user',)) for _ in range(4)
+    ]
+    api.get('/user')
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    budget = api.rate_budget()
+
+    # verification
+    assert len(sent) == 5
+    # The first request after the budget became known is not delayed
+    assert len(set(delays)) == len(delays) == 3
+    assert max(delays) < 100
+    assert budget.limit == 1000
+    assert budget.remaining == 96
+    assert not any(
+        r.path.endswith('/rate_limit') for r in request_mocker.request_history
+    )
+
+
+def test_rate_budget_without_pacer(api, request_mocker, base_url):
+    # preconditions
+    request_mocker.get(
+        f'{base_url}/user', json={},
+        headers=rate_headers(1000, 999, 1100)
+    )
+
+    # action
+    api.get('/user')
+    budget = api.rate_budget()
+
+    # verification
+    assert budget.limit == 1000
+    assert budget.remaining == 999
+    assert budget.reset_time.timestamp() == 1100
+    assert len(request_mocker.request_history) == 1
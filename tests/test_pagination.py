@@ -1,3 +1,5 @@
+import time
+
 import faker
 
 generator = faker.Factory.create()
@@ -44,3 +46,66 @@ def test_single_page_back(api, given, verifier):
     # verification
     projects.previous_page()
     verifier.project.queried(2, limit)
+
+
+def test_all_pages_prefetched(api, given):
+    # preconditions
+    limit = 2
+    total = 11
+    given.project.paginated_projects(limit, total)
+
+    # action
+    projects = api.projects.query(offset=0, limit=limit)
+    expected = [project.id for project in projects.all()]
+    prefetched = [project.id for project in projects.all(prefetch=3)]
+
+    # verification
+    assert len(prefetched) == total
+    assert prefetched == expected
+
+
+def test_all_pages_read_ahead(api, given):
+    # preconditions
+    limit = 2
+    total = 9
+    volume_id = 'test_volume'
+    given.volume.paginated_file_list(
+        limit=limit,
+        volume_id=volume_id,
+        num_of_files=total,
+        volume_data={'id': volume_id}
+    )
+    volume = api.volumes.get(id=volume_id)
+
+    # action
+    items = volume.list(limit=limit)
+    expected = [item.location for item in items.all()]
+    read_ahead = [item.location for item in items.all(prefetch=2)]
+
+    # verification
+    assert len(read_ahead) == total
+    assert read_ahead == expected
+
+
+def test_all_pages_requested_before_consumed(api, given, request_mocker):
+    # preconditions
+    limit = 2
+    total = 11
+    given.project.paginated_projects(limit, total)
+    projects = api.projects.query(offset=0, limit=limit)
+    loaded = request_mocker.call_count
+
+    # action
+    items = projects.all(prefetch=3)
+    next(items)
+    deadline = time.time() + 5
+    while request_mocker.call_count < loaded + 4 and time.time() < deadline:
+        time.sleep(0.01)
+    requested = request_mocker.call_count - loaded
+    rest = list(items)
+
+    # verification
+    # The first page and the three pages after it are requested before the
+    # first item is consumed
+    assert requested == 4
+    assert len(rest) == total - 1
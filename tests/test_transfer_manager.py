@@ -0,0 +1,255 @@
+import os
+import threading
+
+import faker
+import pytest
+
+from sevenbridges.errors import SbgError
+from sevenbridges.models.enums import PartSize, TransferState
+from sevenbridges.transfer.manager import TransferManager
+from sevenbridges.transfer.upload import Upload
+
+generator = faker.Factory.create()
+
+
+class FakeTransfer:
+    def __init__(self, name, size=0, started=None, gate=None, error=None,
+                 status=TransferState.COMPLETED):
+        self.name = name
+        self.status = status
+        self._file_size = size
+        self._bytes_done = 0
+        self._progress_callback = None
+        self.started = started
+        self.gate = gate
+        self.error = error
+
+    def add_progress_callback(self, callback=None):
+        self._progress_callback = callback
+
+    def run(self):
+        if self.started is not None:
+            self.started.append(self.name)
+        if self.gate is not None:
+            self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        self._bytes_done = self._file_size
+        self._progress_callback(None)
+
+
+def test_transfer_manager_uploads(api, given, request_mocker, tmpdir):
+    # preconditions
+    file_part_url = generator.url()
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    given.uploads.got_file_part(file_part_url)
+    given.uploads.got_etag(file_part_url)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    manager = TransferManager(max_transfers=2)
+    uploads = []
+    for _ in range(10):
+        path = str(tmpdir / generator.uuid4())
+        with open(path, 'wb') as fp:
+            fp.write(os.urandom(25))
+        uploads.append(Upload(
+            path, project=generator.uuid4(), part_size=10, api=api
+        ))
+
+    # action
+    futures = [manager.submit(upload) for upload in uploads]
+    manager.wait()
+
+    # verification
+    assert [f.result().status for f in futures] == (
+        [TransferState.COMPLETED] * 10
+    )
+    assert len(manager._workers) == 2
+    progress = manager.progress()
+    assert progress.parts_done == progress.num_of_parts == 10
+    assert progress.bytes_done >= progress.file_size == 250
+
+
+def test_transfer_manager_priority():
+    # preconditions
+    gate = threading.Event()
+    started = []
+    manager = TransferManager(max_transfers=1)
+    manager.submit(FakeTransfer('blocker', started=started, gate=gate))
+
+    # action
+    manager.submit(FakeTransfer('low', started=started), priority=5)
+    manager.submit(FakeTransfer('high', started=started), priority=1)
+    gate.set()
+    manager.wait()
+
+    # verification
+    assert started == ['blocker', 'high', 'low']
+
+
+def test_transfer_manager_lanes():
+    # preconditions
+    manager = TransferManager(max_transfers=2)
+    manager._spawn_worker = lambda: None
+    for index in range(3):
+        manager.submit(FakeTransfer(f'small-{index}', size=PartSize.MB))
+    manager.submit(FakeTransfer('large', size=PartSize.GB))
+    manager.submit(FakeTransfer('urgent', size=PartSize.MB), priority=-1)
+
+    # action
+    picked = [
+        manager._next(lane)[2].name
+        for lane in (manager.LARGE, manager.SMALL, manager.LARGE)
+    ]
+
+    # verification
+    assert picked == ['urgent', 'small-0', 'large']
+
+
+def test_transfer_manager_aggregate_progress_and_errors():
+    # preconditions
+    manager = TransferManager(max_transfers=2)
+    updates = []
+    manager.add_progress_callback(updates.append)
+
+    # action
+    done = manager.submit(FakeTransfer('done', size=100))
+    failed = manager.submit(FakeTransfer('failed', size=50, error=SbgError()))
+    manager.wait()
+
+    # verification
+    assert done.result().name == 'done'
+    assert isinstance(failed.exception(), SbgError)
+    assert updates[-1].parts_done == 2
+    assert manager.progress().bytes_done == 100
+    assert manager.progress().file_size == 150
+
+
+def test_transfer_manager_shutdown():
+    # preconditions
+    manager = TransferManager(max_transfers=1)
+    manager.submit(FakeTransfer('done'))
+
+    # action
+    manager.shutdown()
+
+    # verification
+    assert not any(worker.is_alive() for worker in manager._workers)
+    with pytest.raises(SbgError):
+        manager.submit(FakeTransfer('late'))
+
+
+def test_transfer_manager_creates_transfers_lazily():
+    # preconditions
+    gate = threading.Event()
+    created = []
+    manager = TransferManager(max_transfers=1)
+    manager.submit(FakeTransfer('blocker', gate=gate))
+
+    def factory(name, error=None):
+        def create():
+            created.append(name)
+            if error is not None:
+                raise error
+            return FakeTransfer(name, size=10)
+        return create
+
+    # action
+    futures = [
+        manager.submit(factory(name), size=10) for name in ('a', 'b')
+    ]
+    failed = manager.submit(factory('c', SbgError('Broken')), size=10)
+    queued = list(created)
+    gate.set()
+    manager.wait()
+
+    # verification
+    assert queued == []
+    assert created == ['a', 'b', 'c']
+    assert [future.result().name for future in futures] == ['a', 'b']
+    with pytest.raises(SbgError):
+        failed.result()
+    progress = manager.progress()
+    assert progress.parts_done == progress.num_of_parts == 4
+    assert progress.file_size == 30
+
+
+def test_transfer_manager_stops_running_upload(api, given, request_mocker,
+                                               tmpdir):
+    # preconditions
+    file_part_url = generator.url()
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    given.uploads.got_file_part(file_part_url)
+    given.uploads.got_etag(file_part_url)
+    given.uploads.reported_part()
+    given.uploads.deleted()
+    path = str(tmpdir / generator.uuid4())
+    with open(path, 'wb') as fp:
+        fp.write(os.urandom(45))
+    upload = Upload(path, project=generator.uuid4(), part_size=10, api=api)
+    paused = threading.Event()
+
+    def pause(_):
+        if not paused.is_set():
+            upload.pause()
+            paused.set()
+
+    upload.add_progress_callback(pause)
+    manager = TransferManager(max_transfers=1)
+    future = manager.submit(upload)
+    paused.wait()
+
+    # action
+    stopped = manager.cancel(future)
+
+    # verification
+    assert stopped
+    assert upload.status == TransferState.STOPPED
+    assert str(future.exception()) == 'Transfer stopped.'
+    assert [
+        r for r in request_mocker.request_history if r.method == 'DELETE'
+    ]
+    assert not manager.cancel(future)
+
+
+def test_transfer_manager_cancels_queued_transfer():
+    # preconditions
+    gate = threading.Event()
+    started = []
+    manager = TransferManager(max_transfers=1)
+    manager.submit(FakeTransfer('blocker', gate=gate))
+    queued = manager.submit(FakeTransfer('queued', started=started))
+
+    # action
+    cancelled = manager.cancel(queued)
+    gate.set()
+    manager.wait()
+
+    # verification
+    assert cancelled
+    assert queued.cancelled()
+    assert started == []
+
+
+@pytest.mark.filterwarnings(
+    'ignore::pytest.PytestUnhandledThreadExceptionWarning'
+)
+def test_transfer_manager_failed_status_and_interrupts():
+    # preconditions
+    manager = TransferManager(max_transfers=1)
+
+    # action
+    failed = manager.submit(
+        FakeTransfer('failed', status=TransferState.FAILED)
+    )
+    interrupted = manager.submit(FakeTransfer('exit', error=SystemExit()))
+    worker = manager._workers[0]
+    manager.wait()
+    worker.join()
+    done = manager.submit(FakeTransfer('done'))
+    manager.wait()
+
+    # verification
+    assert str(failed.exception()) == 'Transfer failed.'
+    assert str(interrupted.exception()) == 'Transfer interrupted.'
+    assert done.result().name == 'done'
@@ -1,15 +1,31 @@
+import hashlib
+import io
 import os
+import re
+import threading
+import zlib
 
 import faker
 import pytest
 
+from sevenbridges import Api
 from sevenbridges.errors import SbgError
+from sevenbridges.models.file import File
 from sevenbridges.models.enums import PartSize, TransferState
-from sevenbridges.transfer.upload import Upload
+from sevenbridges.transfer import utils
+from sevenbridges.transfer.journal import UploadJournal
+from sevenbridges.transfer.upload import (
+    StreamUPartedFile, StreamUpload, Upload, _ThrottledPart
+)
 
 generator = faker.Factory.create()
 
 
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(utils.time, 'sleep', lambda _: None)
+
+
 @pytest.mark.parametrize("path", [generator.uuid4(), None])
 def test_file_upload_wrong_path(api, path):
     project_id = generator.uuid4()
@@ -158,7 +174,7 @@ def test_file_upload_finalize_failed(api, given, tmpdir):
         upload.run()
 
 
-def test_file_upload_part_failed(api, given, tmpdir):
+def test_file_upload_part_failed(api, given, tmpdir, no_backoff):
     upload_id = generator.uuid4()
     project_id = generator.uuid4()
     file_part_url = generator.url()
@@ -183,7 +199,7 @@ def test_file_upload_part_failed(api, given, tmpdir):
         upload.run()
 
 
-def test_file_upload_etag_failed(api, given, tmpdir):
+def test_file_upload_etag_failed(api, given, tmpdir, no_backoff):
     upload_id = generator.uuid4()
     project_id = generator.uuid4()
     file_part_url = generator.url()
@@ -434,3 +450,606 @@ def test_file_size_too_large(api, monkeypatch, tmpdir):
                 part_size=PartSize.UPLOAD_RECOMMENDED_SIZE,
                 file_name=file_name
             )
+
+
+def stored_parts(request_mocker, url, api=None, in_flight=None):
+    parts = {}
+
+    def store(request, context):
+        part_number = len(parts) + 1
+        body = request.body
+        if hasattr(body, 'read'):
+            # Throttled parts are read as they are sent
+            body = b''.join(body)
+            assert 'Transfer-Encoding' not in request.headers
+            assert request.headers['Content-Length'] == str(len(body))
+        parts[part_number] = bytes(body)
+        if in_flight is not None:
+            in_flight.append(api.upload_in_flight.in_flight)
+        context.headers['etag'] = f'"{part_number}"'
+        return ''
+
+    request_mocker.put(url, text=store)
+    return parts
+
+
+def start_upload(api, given, tmpdir, content, part_size, **kwargs):
+    file_part_url = generator.url()
+    given.uploads.initialized_upload(
+        part_size=part_size, upload_id=generator.uuid4()
+    )
+    given.uploads.got_file_part(file_part_url)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+
+    file_path = str(tmpdir / generator.uuid4())
+    with open(file_path, 'wb') as fp:
+        fp.write(content)
+    upload = Upload(
+        file_path, project=generator.uuid4(), api=api, part_size=part_size,
+        **kwargs
+    )
+    return upload, file_part_url
+
+
+@pytest.mark.parametrize('mapped', [True, False])
+def test_file_upload_parts(api, given, request_mocker, tmpdir, monkeypatch,
+                           mapped):
+    # preconditions
+    if not mapped:
+        def unmappable(*args, **kwargs):
+            raise OSError('mmap not supported')
+        monkeypatch.setattr('mmap.mmap', unmappable)
+    content = os.urandom(95)
+    upload, url = start_upload(api, given, tmpdir, content, part_size=10)
+    parts = stored_parts(request_mocker, url)
+
+    # action
+    upload.run()
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert sorted(parts.values()) == sorted(
+        content[i:i + 10] for i in range(0, len(content), 10)
+    )
+
+
+def test_file_upload_in_flight_bytes_bounded(base_url, given, request_mocker,
+                                             tmpdir):
+    # preconditions
+    api = Api(
+        url=base_url, token=generator.uuid4(), upload_max_in_flight_bytes=20
+    )
+    content = os.urandom(100)
+    upload, url = start_upload(api, given, tmpdir, content, part_size=10)
+    in_flight = []
+    parts = stored_parts(request_mocker, url, api=api, in_flight=in_flight)
+
+    # action
+    upload.run()
+
+    # verification
+    assert len(parts) == 10
+    assert max(in_flight) <= 20
+    assert api.upload_in_flight.in_flight == 0
+
+
+def test_file_upload_bandwidth_limited(base_url, given, request_mocker,
+                                       tmpdir, monkeypatch):
+    # preconditions
+    delays = []
+    monkeypatch.setattr(utils.time, 'sleep', delays.append)
+    monkeypatch.setattr(_ThrottledPart, 'CHUNK_SIZE', 5)
+    api = Api(url=base_url, token=generator.uuid4(), upload_bandwidth=40)
+    content = os.urandom(100)
+    upload, url = start_upload(api, given, tmpdir, content, part_size=10)
+    parts = stored_parts(request_mocker, url)
+    limits = []
+    upload.add_progress_callback(
+        lambda progress: limits.append(progress.bandwidth_limit)
+    )
+
+    # action
+    upload.run()
+
+    # verification
+    assert len(parts) == 10
+    assert upload.bandwidth_limit == 40
+    assert set(limits) == {40}
+    # The first 40 bytes fit the burst, the rest waits for tokens chunk
+    # by chunk while the parts are sent
+    assert len(delays) == 12
+    assert max(delays) <= 1.5
+    # Sleeps are recorded, so every chunk adds its own share to the debt
+    delays.sort()
+    steps = [b - a for a, b in zip([0] + delays, delays)]
+    assert max(steps) <= 5 / 40
+
+
+def journaled_upload(given, tmpdir, content, part_size, parts):
+    upload_id = generator.uuid4()
+    project = generator.uuid4()
+    file_path = str(tmpdir / generator.uuid4())
+    with open(file_path, 'wb') as fp:
+        fp.write(content)
+    journal = UploadJournal(str(tmpdir / 'upload.journal'))
+    journal.start(upload_id, part_size, file_path, {
+        'name': os.path.basename(file_path),
+        'size': len(content),
+        'project': project,
+    })
+    for part_number in parts:
+        journal.part_done(part_number, str(part_number))
+    journal.close()
+    return upload_id, project, file_path, journal
+
+
+def test_file_upload_resumed_from_journal(api, given, request_mocker, tmpdir):
+    # preconditions
+    content = os.urandom(95)
+    upload_id, project, file_path, journal = journaled_upload(
+        given, tmpdir, content, part_size=10, parts=range(1, 6)
+    )
+    file_part_url = generator.url()
+    given.uploads.got_upload(upload_id)
+    given.uploads.got_file_part(file_part_url)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    parts = stored_parts(request_mocker, file_part_url)
+
+    # action
+    upload = Upload(
+        file_path, project=project, api=api, part_size=10,
+        journal=journal.path
+    )
+    upload.run()
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert sorted(parts.values()) == sorted(
+        content[i:i + 10] for i in range(50, len(content), 10)
+    )
+    assert not any(
+        r.method == 'POST' and r.path == '/upload/multipart'
+        for r in request_mocker.request_history
+    )
+    assert not os.path.exists(journal.path)
+
+
+@pytest.mark.parametrize('reason', ['file_changed', 'upload_gone'])
+def test_file_upload_journal_not_resumed(api, given, request_mocker, tmpdir,
+                                         reason):
+    # preconditions
+    content = os.urandom(95)
+    upload_id, project, file_path, journal = journaled_upload(
+        given, tmpdir, content, part_size=10, parts=range(1, 6)
+    )
+    if reason == 'file_changed':
+        with open(file_path, 'r+b') as fp:
+            fp.write(b'changed')
+    given.uploads.got_upload(upload_id, failed=reason == 'upload_gone')
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    file_part_url = generator.url()
+    given.uploads.got_file_part(file_part_url)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    parts = stored_parts(request_mocker, file_part_url)
+
+    # action
+    upload = Upload(
+        file_path, project=project, api=api, part_size=10,
+        journal=journal.path
+    )
+    upload.run()
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert len(parts) == 10
+
+
+def test_upload_journal_kept_on_failure(api, given, request_mocker, tmpdir):
+    # preconditions
+    content = os.urandom(30)
+    journal_path = str(tmpdir / 'upload.journal')
+    upload, url = start_upload(
+        api, given, tmpdir, content, part_size=10, journal=journal_path
+    )
+    stored_parts(request_mocker, url)
+    given.uploads.finalized_upload(generator.uuid4(), failed=True)
+
+    # action
+    with pytest.raises(SbgError):
+        upload.run()
+
+    # verification
+    state = UploadJournal(journal_path).load(upload._file_path, {
+        'name': upload._file_name,
+        'size': len(content),
+        'project': upload._project,
+    })
+    assert state['upload_id'] == upload._upload_id
+    assert sorted(state['parts']) == [1, 2, 3]
+    assert sorted(state['parts'].values()) == ['1', '2', '3']
+
+
+def test_file_upload_part_retried(api, given, request_mocker, tmpdir,
+                                  no_backoff):
+    # preconditions
+    content = os.urandom(30)
+    upload, url = start_upload(api, given, tmpdir, content, part_size=10)
+    parts = {}
+    failures = []
+
+    def flaky(request, context):
+        if not failures:
+            failures.append(request)
+            context.status_code = 503
+            return ''
+        parts[len(parts) + 1] = bytes(request.body)
+        context.headers['etag'] = f'"{len(parts)}"'
+        return ''
+    request_mocker.put(url, text=flaky)
+
+    # action
+    upload.run()
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert len(failures) == 1
+    assert sorted(parts.values()) == sorted(
+        content[i:i + 10] for i in range(0, len(content), 10)
+    )
+    assert sum(
+        r.method == 'PUT' for r in request_mocker.request_history
+    ) == 4
+
+
+def test_file_upload_telemetry(api, given, request_mocker, tmpdir,
+                               no_backoff):
+    # preconditions
+    content = os.urandom(95)
+    upload, url = start_upload(api, given, tmpdir, content, part_size=10)
+    failures = []
+
+    def flaky(request, context):
+        if not failures:
+            failures.append(len(request.body))
+            context.status_code = 503
+            return ''
+        context.headers['etag'] = '"etag"'
+        return ''
+    request_mocker.put(url, text=flaky)
+    updates = []
+    upload.add_progress_callback(
+        lambda progress: updates.append((progress, progress.bytes_done))
+    )
+
+    # action
+    upload.run()
+
+    # verification
+    stats = upload.stats
+    assert len({id(progress) for progress, _ in updates}) == 1
+    assert updates[-1][1] == 95
+    assert updates[-1][0].stats is stats
+    assert stats.bytes_done == 95
+    assert stats.bytes_on_wire == 95 + failures[0]
+    assert stats.retries == 1
+    assert stats.latency.count == stats.parts_done == 10
+    assert stats.api_time > 0 and stats.storage_time > 0
+    assert stats.throughput > 0
+
+
+def test_file_upload_error_budget(api, given, request_mocker, tmpdir,
+                                  no_backoff):
+    # preconditions
+    content = os.urandom(30)
+    upload, url = start_upload(
+        api, given, tmpdir, content, part_size=10, error_budget=2
+    )
+    request_mocker.put(url, status_code=503)
+
+    # action
+    with pytest.raises(SbgError):
+        upload.run()
+
+    # verification
+    assert sum(
+        r.method == 'PUT' for r in request_mocker.request_history
+    ) == 3 + 2
+
+
+def test_file_upload_parts_reported_as_they_finish(api, given, base_url,
+                                                   request_mocker, tmpdir):
+    # preconditions
+    content = os.urandom(95)
+    api.adaptive_transfer_window = False
+    upload, url = start_upload(
+        api, given, tmpdir, content, part_size=10, window=1
+    )
+    stored_parts(request_mocker, url)
+    given.uploads.finalized_upload(generator.uuid4(), failed=True)
+    url_threads = []
+
+    def part_url(request, context):
+        url_threads.append(threading.current_thread())
+        return {'url': url}
+    request_mocker.get(
+        re.compile(f'{base_url}/upload/multipart/.*/part/[0-9]+$'),
+        json=part_url
+    )
+
+    # action
+    with pytest.raises(SbgError):
+        upload.run()
+
+    # verification
+    sent = [
+        'PUT' if r.method == 'PUT' else r.json()['part_number']
+        for r in request_mocker.request_history
+        if r.method == 'PUT' or r.path.endswith('/part/')
+    ]
+    assert sent == [item for n in range(1, 11) for item in ('PUT', n)]
+    assert len(url_threads) == 10
+    assert threading.current_thread() not in url_threads
+
+
+def test_upload_directory(api, given, request_mocker, tmpdir):
+    # preconditions
+    project = generator.uuid4()
+    remote = {
+        ('project', project): [
+            {'id': 'run-folder', 'name': 'run', 'type': 'folder'},
+            {
+                'id': generator.uuid4(), 'name': 'a.txt', 'size': 3,
+                'type': 'file'
+            },
+            {
+                'id': generator.uuid4(), 'name': 'b.txt', 'size': 99,
+                'type': 'file'
+            },
+        ],
+        ('parent', 'run-folder'): [
+            {
+                'id': generator.uuid4(), 'name': 'c.txt', 'size': 4,
+                'type': 'file'
+            },
+        ],
+    }
+    listed = []
+
+    def listing(request, context):
+        key = next(
+            (k, v[0]) for k, v in request.qs.items()
+            if k in ('project', 'parent')
+        )
+        listed.append(key)
+        context.headers['x-total-matching-query'] = str(len(remote[key]))
+        return {'items': remote[key], 'links': [], 'href': request.url}
+
+    request_mocker.get('/files', json=listing)
+    request_mocker.post('/files', json={
+        'id': 'lane-folder', 'name': 'lane1', 'type': 'folder'
+    })
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    given.uploads.got_file_part(generator.url())
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    request_mocker.put(re.compile('.*'), headers={'etag': '"etag"'})
+
+    local = tmpdir.mkdir('local')
+    local.join('a.txt').write('abc')
+    local.join('b.txt').write('bbbbb')
+    local.mkdir('run').join('c.txt').write('cccc')
+    local.join('run').join('d.txt').write('d')
+    local.join('run').mkdir('lane1').join('e.txt').write('e')
+    # Links back to the uploaded directories are not followed again
+    os.symlink(str(local), str(local.join('run').join('loop')))
+    os.symlink(str(local.join('run')), str(local.join('run-link')))
+
+    # action
+    results = File.upload_directory(str(local), project=project, api=api)
+
+    # verification
+    statuses = {
+        os.path.relpath(result.path, str(local)): result.status
+        for result in results
+    }
+    assert statuses == {
+        'a.txt': TransferState.SKIPPED,
+        'b.txt': TransferState.COMPLETED,
+        os.path.join('run', 'c.txt'): TransferState.SKIPPED,
+        os.path.join('run', 'd.txt'): TransferState.COMPLETED,
+        os.path.join('run', 'lane1', 'e.txt'): TransferState.COMPLETED,
+    }
+    assert sorted(listed) == [('parent', 'run-folder'), ('project', project)]
+    created = [
+        r.json() for r in request_mocker.request_history
+        if r.method == 'POST' and r.path == '/files'
+    ]
+    assert created == [
+        {'name': 'lane1', 'type': 'folder', 'parent': 'run-folder'}
+    ]
+
+
+def numbered_parts(request_mocker, base_url, corrupted=None):
+    storage = generator.url()
+    parts = {}
+
+    def part_url(request, context):
+        return {'url': f'{storage}part/{request.path.rsplit("/", 1)[-1]}'}
+
+    def store(request, context):
+        part_number = int(request.path.rsplit('/', 1)[-1])
+        parts[part_number] = bytes(request.body or b'')
+        e_tag = hashlib.md5(parts[part_number]).hexdigest()
+        if corrupted and part_number == corrupted[0]:
+            corrupted.pop()
+            e_tag = hashlib.md5(b'corrupted').hexdigest()
+        context.headers['etag'] = f'"{e_tag}"'
+        return ''
+
+    request_mocker.get(
+        re.compile(f'{base_url}/upload/multipart/.*/part/[0-9]+$'),
+        json=part_url
+    )
+    request_mocker.put(re.compile(f'{storage}part/'), text=store)
+    return parts
+
+
+@pytest.mark.parametrize('source', ['generator', 'file', 'reader'])
+@pytest.mark.parametrize('size', [95, 100, 7, 0])
+def test_file_upload_stream(api, given, request_mocker, base_url, source,
+                            size, no_backoff):
+    # preconditions
+    content = os.urandom(size)
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    parts = numbered_parts(request_mocker, base_url)
+    if source == 'generator':
+        stream = (content[i:i + 7] for i in range(0, len(content), 7))
+    elif source == 'file':
+        stream = io.BufferedReader(io.BytesIO(content))
+    else:
+        stream = type('Reader', (), {'read': io.BytesIO(content).read})()
+
+    # action
+    upload = File.upload_stream(
+        stream, 'stream.bin', project=generator.uuid4(), part_size=10,
+        api=api
+    )
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert b''.join(parts[n] for n in sorted(parts)) == content
+    assert sorted(parts) == list(range(1, max(len(parts), 1) + 1))
+    assert all(len(parts[n]) == 10 for n in sorted(parts)[:-1])
+    init = next(
+        r for r in request_mocker.request_history
+        if r.path.endswith('/upload/multipart')
+    ).json()
+    assert init.get('size') == (size if size < 10 else None)
+
+
+def test_file_upload_stream_size_mismatch(api, given, request_mocker,
+                                          base_url):
+    # preconditions
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    numbered_parts(request_mocker, base_url)
+    upload = StreamUpload(
+        iter([os.urandom(25)]), 'stream.bin', project=generator.uuid4(),
+        size=30, part_size=10, api=api
+    )
+
+    # action
+    with pytest.raises(SbgError):
+        upload.run()
+
+    # verification
+    assert upload.status == TransferState.FAILED
+
+
+@pytest.mark.parametrize('server_part_size', [15, 10, 20])
+def test_file_upload_stream_buffers_bounded(api, given, request_mocker,
+                                            base_url, server_part_size):
+    # preconditions
+    content = os.urandom(95)
+    api.upload_in_flight = utils.ByteSemaphore(30)
+    given.uploads.initialized_upload(
+        upload_id=generator.uuid4(), part_size=server_part_size
+    )
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    parts = numbered_parts(request_mocker, base_url)
+    stream = (content[i:i + 7] for i in range(0, len(content), 7))
+    upload = StreamUpload(
+        stream, 'stream.bin', project=generator.uuid4(), part_size=15,
+        window=2, api=api
+    )
+
+    # action
+    upload.run()
+    window = upload._create_window()
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert b''.join(parts[n] for n in sorted(parts)) == content
+    assert all(len(parts[n]) == server_part_size for n in sorted(parts)[:-1])
+    assert api.upload_in_flight.in_flight == 0
+    assert not window.adaptive and window.size == 2
+
+
+def test_file_upload_stream_memory_capped(api, given, request_mocker,
+                                          base_url, monkeypatch):
+    # preconditions
+    mb = 1024 ** 2
+    content = os.urandom(33 * mb)
+    given.uploads.initialized_upload(
+        upload_id=generator.uuid4(), part_size=None
+    )
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    parts = numbered_parts(request_mocker, base_url)
+    buffers = set()
+    check_part = StreamUPartedFile._check_part
+
+    def tracked(self, view, buffer):
+        buffers.add(id(buffer))
+        return check_part(self, view, buffer)
+
+    monkeypatch.setattr(StreamUPartedFile, '_check_part', tracked)
+    stream = (content[i:i + mb] for i in range(0, len(content), mb))
+    upload = StreamUpload(
+        stream, 'stream.bin', project=generator.uuid4(), window=2,
+        max_memory=20 * mb, api=api
+    )
+
+    # action
+    upload.run()
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert upload._part_size == 6 * mb
+    assert b''.join(parts[n] for n in sorted(parts)) == content
+    assert len(buffers) * upload._part_size <= 20 * mb
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_file_upload_verified(api, given, request_mocker, base_url, tmpdir,
+                              stream, no_backoff):
+    # preconditions
+    content = os.urandom(95)
+    given.uploads.initialized_upload(upload_id=generator.uuid4(), part_size=10)
+    given.uploads.reported_part()
+    given.uploads.finalized_upload(generator.uuid4())
+    corrupted = [3]
+    parts = numbered_parts(request_mocker, base_url, corrupted=corrupted)
+    file_path = str(tmpdir / 'file.bin')
+    with open(file_path, 'wb') as fp:
+        fp.write(content)
+
+    # action
+    if stream:
+        upload = File.upload_stream(
+            iter([content]), 'file.bin', project=generator.uuid4(),
+            part_size=10, verify=True, api=api
+        )
+    else:
+        upload = File.upload(
+            file_path, project=generator.uuid4(), part_size=10,
+            verify=True, api=api
+        )
+
+    # verification
+    assert upload.status == TransferState.COMPLETED
+    assert not corrupted
+    digest = upload.digest
+    assert digest.verified is True
+    assert digest.md5 == hashlib.md5(content).hexdigest()
+    assert digest.crc32 == zlib.crc32(content)
+    assert digest.etag == hashlib.md5(b''.join(
+        hashlib.md5(parts[n]).digest() for n in sorted(parts)
+    )).hexdigest() + '-10'
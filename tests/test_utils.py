@@ -1,4 +1,17 @@
-from sevenbridges.transfer.utils import Part, Progress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sevenbridges.errors import SbgError, StorageError
+from sevenbridges.models.enums import PartSize
+from sevenbridges.transfer import utils
+from sevenbridges.transfer.utils import (
+    AutoPartSize, BandwidthLimiter, DOWNLOAD_PART_LIMITS, FixedPartSize,
+    LatencyHistogram, Part, PartRetry, PartSizePolicy, Progress, TokenBucket,
+    TransferStats, TransferWindow, UPLOAD_PART_LIMITS, iterate_parts,
+    part_size_policy, total_parts
+)
 
 
 def test_transfer_utils():
@@ -20,3 +33,305 @@ def test_transfer_utils():
     assert p.bytes_done == bytes_done
     assert p.bandwidth == 1
     assert p.progress > 0
+
+
+class FakePartedFile:
+    def __init__(self, total, window, pool, blocked=()):
+        self.total = total
+        self.window = window
+        self.pool = pool
+        self.blocked = blocked
+        self.release = threading.Event()
+        self.submitted = 0
+        self.total_submitted = 0
+        self.max_in_flight = 0
+
+    def work(self, part):
+        if part in self.blocked:
+            self.release.wait(5)
+        return part
+
+    def submit(self):
+        futures = []
+        while (self.submitted < self.window.size and
+               self.total_submitted < self.total):
+            futures.append(self.pool.submit(self.work, self.total_submitted))
+            self.submitted += 1
+            self.total_submitted += 1
+        self.max_in_flight = max(self.max_in_flight, self.submitted)
+        return futures
+
+
+def test_parts_yielded_in_completion_order():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        parted = FakePartedFile(10, TransferWindow(size=4), pool, blocked={0})
+        results = []
+        for part in iterate_parts(parted):
+            results.append(part)
+            if len(results) == 7:
+                parted.release.set()
+
+    assert sorted(results) == list(range(10))
+    assert results[0] != 0
+    assert parted.max_in_flight <= 4
+
+
+def test_window_adapts_to_throughput(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(
+        'sevenbridges.transfer.utils.time.monotonic', lambda: now[0]
+    )
+    window = TransferWindow(size=2, maximum=4, adaptive=True)
+    window.start()
+
+    # baseline, window grows to probe
+    now[0] += 1
+    window.completed(2)
+    assert window.size == 3
+
+    # throughput improved, window grows up to the maximum
+    now[0] += 1
+    window.completed(3)
+    assert window.size == 4
+    now[0] += 1
+    window.completed(4)
+    assert window.size == 4
+
+    # throughput dropped
+    now[0] += 4
+    window.completed(4)
+    assert window.size == 3
+
+
+def test_fixed_window():
+    window = TransferWindow(size=3)
+    window.start()
+    window.completed(100)
+    assert window.size == 3
+
+
+def test_auto_part_size_initial():
+    policy = AutoPartSize()
+
+    small = policy.initial(10 * PartSize.MB, UPLOAD_PART_LIMITS)
+    huge = policy.initial(PartSize.MAXIMUM_OBJECT_SIZE, UPLOAD_PART_LIMITS)
+    download = policy.initial(2 * PartSize.TB, DOWNLOAD_PART_LIMITS)
+
+    assert small == PartSize.UPLOAD_RECOMMENDED_SIZE
+    assert total_parts(PartSize.MAXIMUM_OBJECT_SIZE, huge) <= (
+        PartSize.MAXIMUM_TOTAL_PARTS
+    )
+    assert total_parts(2 * PartSize.TB, download) <= (
+        PartSize.MAXIMUM_TOTAL_PARTS
+    )
+
+
+def test_auto_part_size_adjust():
+    policy = AutoPartSize(target_duration=2)
+    part_size = 8 * PartSize.MB
+    args = dict(remaining=PartSize.GB, parts_left=1000,
+                limits=DOWNLOAD_PART_LIMITS)
+
+    faster = policy.adjust(part_size, 50 * PartSize.MB, **args)
+    slower = policy.adjust(faster, 3 * PartSize.MB, **args)
+    same = policy.adjust(part_size, 4.2 * PartSize.MB, **args)
+
+    assert faster == 100 * PartSize.MB
+    assert slower == PartSize.DOWNLOAD_MINIMUM_PART_SIZE + PartSize.MB
+    assert same == part_size
+
+
+def test_fixed_part_size():
+    policy = FixedPartSize(7 * PartSize.MB)
+
+    assert policy.initial(PartSize.TB, DOWNLOAD_PART_LIMITS) == (
+        7 * PartSize.MB
+    )
+    assert policy.adjust(
+        7 * PartSize.MB, PartSize.GB, PartSize.TB, 10, DOWNLOAD_PART_LIMITS
+    ) == 7 * PartSize.MB
+    assert part_size_policy(None).__class__ is AutoPartSize
+    assert part_size_policy(policy) is policy
+
+
+def test_part_size_policy_requires_initial():
+    class Adjusting(PartSizePolicy):
+        def adjust(self, part_size, throughput, remaining, parts_left,
+                   limits):
+            return part_size
+
+    with pytest.raises(TypeError):
+        PartSizePolicy()
+    with pytest.raises(TypeError):
+        Adjusting()
+
+
+def failing(errors):
+    calls = []
+
+    def part():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return len(calls)
+    return part, calls
+
+
+def test_part_retry_backoff(monkeypatch):
+    # preconditions
+    delays = []
+    monkeypatch.setattr(utils.time, 'sleep', delays.append)
+    retry = PartRetry(retry_count=3, backoff_factor=1, maximum_backoff=3)
+    part, calls = failing([SbgError(status=503)] * 3)
+
+    # action
+    result = retry.call(part)
+
+    # verification
+    assert result == 4
+    assert retry.errors == 3
+    assert len(delays) == 3
+    assert all(0 <= d <= limit for d, limit in zip(delays, [1, 2, 3]))
+
+
+@pytest.mark.parametrize('status', [404, 503])
+def test_part_retry_gives_up(monkeypatch, status):
+    # preconditions
+    monkeypatch.setattr(utils.time, 'sleep', lambda _: None)
+    retry = PartRetry(retry_count=3, error_budget=1)
+    part, calls = failing([SbgError(status=status)] * 3)
+
+    # action
+    with pytest.raises(SbgError):
+        retry.call(part)
+
+    # verification
+    assert len(calls) == (1 if status == 404 else 2)
+
+
+@pytest.mark.parametrize('storage', [True, False])
+def test_part_retry_expired_only_for_storage(monkeypatch, storage):
+    # preconditions
+    monkeypatch.setattr(utils.time, 'sleep', lambda _: None)
+    retry = PartRetry(retry_count=3)
+    error = StorageError(status=403) if storage else SbgError(status=403)
+    part, calls = failing([error])
+    refreshed = []
+
+    # action
+    if storage:
+        retry.call(part, refresh=lambda: refreshed.append(True))
+    else:
+        with pytest.raises(SbgError):
+            retry.call(part, refresh=lambda: refreshed.append(True))
+
+    # verification
+    assert len(calls) == (2 if storage else 1)
+    assert refreshed == ([True] if storage else [])
+
+
+def test_token_bucket(monkeypatch):
+    # preconditions
+    clock = [100.0]
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        clock[0] += delay
+
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(utils.time, 'sleep', sleep)
+    bucket = TokenBucket(rate=100)
+
+    # action
+    bucket.consume(100)
+    bucket.consume(50)
+    clock[0] += 10
+    bucket.consume(150)
+    bucket.rate = 200
+    bucket.consume(100)
+    bucket.rate = None
+    bucket.consume(10 ** 9)
+
+    # verification
+    assert delays == [0.5, 0.5, 0.5]
+    assert bucket.burst == 0
+
+
+def test_bandwidth_limiter():
+    # preconditions
+    limiter = BandwidthLimiter(upload=PartSize.MB)
+
+    # action
+    limiter.set_limits(download=2 * PartSize.MB)
+    progress = Progress(1, 1, 10, 10, 1, bandwidth_limit=PartSize.MB)
+
+    # verification
+    assert limiter.upload.rate is None
+    assert limiter.download.rate == 2 * PartSize.MB
+    assert progress.bandwidth_limit == PartSize.MB
+
+
+def test_latency_histogram():
+    # preconditions
+    histogram = LatencyHistogram()
+
+    # action
+    for seconds in [0.0005, 0.001, 0.003, 0.003, 0.1, 2000]:
+        histogram.record(seconds)
+
+    # verification
+    assert histogram.counts[:3] == [2, 0, 2]
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(50) == 0.004
+    assert histogram.percentile(100) == 2000
+    assert histogram.buckets[7] == (0.128, 1)
+    assert histogram.mean == pytest.approx(2000.1075 / 6)
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_transfer_stats(monkeypatch):
+    # preconditions
+    clock = [100.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: clock[0])
+    retry = PartRetry()
+    stats = TransferStats(retry=retry, window=2)
+
+    # action
+    assert stats.throughput is None
+    for _ in range(4):
+        stats.transferred(100)
+        clock[0] += 1
+    throughput = stats.throughput
+    with stats.timed('api'):
+        clock[0] += 0.5
+    with stats.timed('storage'):
+        clock[0] += 1.5
+    stats.part_done(400, 4)
+    retry.retries = 2
+
+    # verification
+    assert stats.bytes_on_wire == 400
+    assert stats.bytes_done == 400
+    assert stats.api_time == 0.5
+    assert stats.storage_time == 1.5
+    assert stats.retries == 2
+    assert stats.latency.count == 1
+    assert throughput == 100
+    assert stats.throughput == 0
+
+
+def test_progress_update():
+    # preconditions
+    stats = TransferStats()
+    progress = Progress(10, 1, 100, 1000, 1, stats=stats)
+
+    # action
+    updated = progress.update(10, 2, 200, 1000, 2, bandwidth_limit=10)
+
+    # verification
+    assert updated is progress
+    assert progress.parts_done == 2
+    assert progress.bytes_done == 200
+    assert progress.bandwidth_limit == 10
+    assert progress.stats is stats